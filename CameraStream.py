@@ -0,0 +1,139 @@
+import time
+import threading
+import cv2
+
+
+class LatestFrameGrabber:
+    """
+    Hilo de captura que solo conserva el frame más reciente de una cámara.
+
+    Lee la cámara sin parar, así los frames no se acumulan en el buffer del
+    driver aunque la inferencia sea más lenta que la cámara. Quien consume
+    siempre recibe el último frame; los que se sustituyen sin haberse leído
+    se cuentan en `dropped`.
+    """
+
+    def __init__(self, cap, name="camera-capture", new_frame_event=None):
+        """
+        Inicia el hilo de captura.
+
+        Args:
+            cap (cv2.VideoCapture): Cámara ya abierta.
+            name (str): Nombre del hilo.
+            new_frame_event (threading.Event): Se activa con cada frame nuevo o fallo de la cámara;
+                varias cámaras pueden compartirlo para esperar a la primera que tenga algo.
+        """
+        self.cap = cap
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Sin efecto en algunos backends; el hilo lo compensa
+        self.condition = threading.Condition()
+        self.frame = None
+        self.captured_at = 0.0  # time.perf_counter() del frame actual
+        self.sequence = 0  # Número del frame actual
+        self.last_read = 0  # Número del último frame entregado
+        self.captured = 0
+        self.dropped = 0
+        self.running = True
+        self.failed = False
+        self.new_frame_event = new_frame_event
+        self.started_at = time.perf_counter()
+        self.thread = threading.Thread(target=self._capture_loop, name=name, daemon=True)
+        self.thread.start()
+
+    def _capture_loop(self):
+        while self.running:
+            ret, frame = self.cap.read()
+            captured_at = time.perf_counter()
+            with self.condition:
+                if not ret:
+                    self.failed = True
+                    self.condition.notify_all()
+                    self._signal()
+                    return
+                if self.sequence > self.last_read:
+                    self.dropped += 1  # El frame anterior no llegó a leerse
+                self.frame = frame
+                self.captured_at = captured_at
+                self.sequence += 1
+                self.captured += 1
+                self.condition.notify_all()
+            self._signal()
+
+    def _signal(self):
+        if self.new_frame_event is not None:
+            self.new_frame_event.set()
+
+    def read(self, timeout=1.0):
+        """
+        Espera a un frame más nuevo que el último entregado y lo devuelve.
+
+        Args:
+            timeout (float): Segundos máximos de espera.
+
+        Returns:
+            tuple: (ok, frame, captured_at); ok es False si la cámara falla, se detuvo o no hubo frame a tiempo.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.sequence > self.last_read or self.failed or not self.running,
+                                           timeout=timeout):
+                return False, None, 0.0
+            if self.sequence <= self.last_read:
+                return False, None, 0.0
+            self.last_read = self.sequence
+            return True, self.frame, self.captured_at
+
+    def capture_fps(self):
+        """Frames por segundo que entrega la cámara."""
+        elapsed = time.perf_counter() - self.started_at
+        return self.captured / elapsed if elapsed > 0 else 0.0
+
+    def stop(self):
+        """Detiene el hilo de captura (la cámara no se libera)."""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if threading.current_thread() is not self.thread:
+            self.thread.join(timeout=2.0)
+
+    def release(self):
+        """Detiene el hilo y libera la cámara."""
+        self.stop()
+        self.cap.release()
+
+
+class FpsMeter:
+    """Frames por segundo con media móvil exponencial."""
+
+    def __init__(self, smoothing=0.9):
+        self.smoothing = smoothing
+        self.fps = 0.0
+        self.last = None
+
+    def tick(self):
+        """Registra un frame y devuelve los FPS actuales."""
+        now = time.perf_counter()
+        if self.last is not None and now > self.last:
+            instant = 1.0 / (now - self.last)
+            self.fps = instant if self.fps == 0.0 else self.smoothing * self.fps + (1 - self.smoothing) * instant
+        self.last = now
+        return self.fps
+
+
+def draw_stream_overlay(frame, lines, origin=(10, 30)):
+    """
+    Escribe líneas de estado (latencia, FPS...) sobre el frame, con fondo para que se lean.
+
+    Args:
+        frame (np.ndarray): Imagen BGR (se modifica en el sitio).
+        lines (list): Textos, uno por línea.
+        origin (tuple): Posición de la primera línea.
+
+    Returns:
+        np.ndarray: El mismo frame.
+    """
+    x, y = origin
+    for line in lines:
+        (text_w, text_h), baseline = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
+        cv2.rectangle(frame, (x - 4, y - text_h - 4), (x + text_w + 4, y + baseline), (0, 0, 0), -1)
+        cv2.putText(frame, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2, cv2.LINE_AA)
+        y += text_h + baseline + 10
+    return frame
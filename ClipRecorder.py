@@ -0,0 +1,196 @@
+import os
+import time
+import queue
+import tempfile
+import threading
+from collections import deque
+import cv2
+
+
+class ClipRecorder:
+    """
+    Grabación de video en un hilo propio, con un buffer previo (pre-roll).
+
+    El bucle de la cámara solo llama a `push`, que encola el frame sin
+    bloquear (si la cola está llena el frame se descarta y se cuenta en
+    `dropped`). El hilo codificador guarda, mientras no se graba, los frames
+    de los últimos `preroll_seconds` segundos como JPEG; se descartan por su
+    marca de tiempo, así el buffer cubre esos segundos sea cual sea el ritmo
+    al que llegan los frames. Al empezar a grabar los escribe primero, así el
+    clip incluye lo ocurrido justo antes. El tamaño se toma del primer frame y
+    los FPS de los tiempos reales de los frames. El clip se escribe en un
+    archivo temporal que `stop` (o `stop_async`) entrega para moverlo a su destino.
+    """
+
+    _STOP_THREAD = object()
+
+    def __init__(self, fps=30.0, preroll_seconds=5.0, max_queue=128, jpeg_quality=85, fourcc='mp4v',
+                 suffix='.mp4', temp_dir=None):
+        """
+        Inicia el hilo codificador.
+
+        Args:
+            fps (float): FPS estimados de los frames (se usan en el clip hasta medir los reales).
+            preroll_seconds (float): Segundos que se guardan antes de empezar a grabar (0 = sin buffer previo).
+            max_queue (int): Frames en espera del codificador.
+            jpeg_quality (int): Calidad JPEG de los frames del buffer previo.
+            fourcc (str): Códec del clip.
+            suffix (str): Extensión del archivo temporal (define el contenedor).
+            temp_dir (str): Carpeta de los archivos temporales (por defecto, la del sistema).
+        """
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.preroll_seconds = preroll_seconds
+        self.preroll = deque() if preroll_seconds > 0 else None  # (marca de tiempo, JPEG), del más antiguo al más nuevo
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.jpeg_quality = jpeg_quality
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.suffix = suffix
+        self.temp_dir = temp_dir
+        self.recording = False  # Estado pedido desde fuera; el hilo lo aplica en orden con los frames
+        self.writer = None
+        self.pending_start = False  # Hay que abrir el clip con el siguiente frame
+        self.current_path = None
+        self.last_path = None  # Último clip terminado, por si el hilo ya se detuvo al llamar a `stop`
+        self.recent = deque(maxlen=120)  # Tiempos de los últimos frames, para medir los FPS reales
+        self.frames_written = 0
+        self.dropped = 0
+        self.error = None
+        self.thread = threading.Thread(target=self._encode_loop, name="clip-recorder", daemon=True)
+        self.thread.start()
+
+    def push(self, frame, timestamp=None):
+        """
+        Ofrece un frame al grabador sin bloquear. Se puede llamar desde cualquier hilo.
+
+        Args:
+            frame (np.ndarray): Frame BGR; no debe modificarse después.
+            timestamp (float): time.perf_counter() de la captura (por defecto, ahora).
+        """
+        try:
+            self.queue.put_nowait(('frame', frame, timestamp if timestamp is not None else time.perf_counter()))
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        """Empieza un clip nuevo (con el buffer previo al principio)."""
+        self.recording = True
+        self.queue.put(('start',))
+
+    def stop_async(self, callback):
+        """
+        Termina el clip actual sin esperar a que se escriba.
+
+        Args:
+            callback (callable): Recibe la ruta del archivo temporal con el clip (o None si no se
+                escribió nada). Se llama desde el hilo codificador, no desde el de la interfaz.
+        """
+        self.recording = False
+        if not self.thread.is_alive():
+            path, self.last_path = self.last_path, None
+            callback(path)
+            return
+        self.queue.put(('stop', callback))
+
+    def stop(self, timeout=10.0):
+        """
+        Termina el clip actual y espera a que se escriba.
+
+        Returns:
+            str: Ruta del archivo temporal con el clip, o None si no se escribió nada.
+        """
+        done = threading.Event()
+        result = {}
+
+        def deliver(path):
+            result['path'] = path
+            done.set()
+
+        self.stop_async(deliver)
+        done.wait(timeout)
+        return result.get('path')
+
+    def close(self):
+        """
+        Detiene el hilo codificador, cerrando el clip en curso si lo hay.
+
+        Returns:
+            str: Ruta del último clip terminado (se puede recuperar después con `stop`).
+        """
+        self.queue.put(self._STOP_THREAD)
+        self.thread.join(timeout=10.0)
+        return self.last_path
+
+    def _encode_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is self._STOP_THREAD:
+                self._finish()
+                return
+            try:
+                if item[0] == 'frame':
+                    self._handle_frame(item[1], item[2])
+                elif item[0] == 'start':
+                    self._finish()
+                    self.frames_written = 0
+                    self.pending_start = True
+                elif item[0] == 'stop':
+                    path = self._finish()
+                    self.last_path = None  # Ya entregado
+                    item[1](path)
+            except Exception as e:
+                self.error = e
+                print(f"Recording error: {e}")
+                if item[0] == 'stop':
+                    item[1](None)
+
+    def _handle_frame(self, frame, timestamp):
+        self.recent.append(timestamp)
+        if self.pending_start:
+            self.pending_start = False
+            self._open_writer(frame)
+        if self.writer is not None:
+            self.writer.write(frame)
+            self.frames_written += 1
+        elif self.preroll is not None:
+            ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if ok:
+                self.preroll.append((timestamp, encoded))
+            # Solo los últimos preroll_seconds segundos, según la marca de tiempo de captura
+            while self.preroll and self.preroll[0][0] < timestamp - self.preroll_seconds:
+                self.preroll.popleft()
+
+    def _measured_fps(self):
+        """FPS reales de los últimos frames recibidos (o el valor estimado si hay pocos)."""
+        if len(self.recent) < 2:
+            return self.fps
+        span = self.recent[-1] - self.recent[0]
+        return (len(self.recent) - 1) / span if span > 0 else self.fps
+
+    def _open_writer(self, frame):
+        fd, self.current_path = tempfile.mkstemp(prefix='recording_', suffix=self.suffix, dir=self.temp_dir)
+        os.close(fd)
+        height, width = frame.shape[:2]
+        self.writer = cv2.VideoWriter(self.current_path, self.fourcc, self._measured_fps(), (width, height))
+        if not self.writer.isOpened():
+            raise IOError(f"Could not open video writer for {self.current_path}")
+
+        # Primero lo que pasó antes de pulsar grabar
+        if self.preroll is not None:
+            for _, encoded in self.preroll:
+                previous = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+                if previous is not None and previous.shape[:2] == (height, width):
+                    self.writer.write(previous)
+                    self.frames_written += 1
+            self.preroll.clear()
+
+    def _finish(self):
+        """Cierra el clip en curso y devuelve su ruta."""
+        self.pending_start = False
+        if self.writer is None:
+            return None
+        self.writer.release()
+        self.writer = None
+        path, self.current_path = self.current_path, None
+        self.last_path = path
+        print(f"Recording finished: {self.frames_written} frames written, {self.dropped} dropped")
+        return path
@@ -0,0 +1,120 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Columnas del archivo de detecciones, en orden
+EXPORT_COLUMNS = ['frame', 'timestamp', 'track_id', 'cls', 'conf', 'x1', 'y1', 'x2', 'y2']
+EMPTY_TRACK_ID = -1  # track_id (y cls) de la fila que marca un frame procesado sin detecciones
+
+
+class DetectionExporter:
+    """
+    Escribe las detecciones de cada frame de un video a medida que se procesan.
+
+    Las filas se acumulan en un buffer de como mucho `chunk_rows` filas y se
+    escriben por bloques: en Parquet cada bloque es un row group; en CSV se
+    añaden al final del archivo. Si pyarrow no está instalado, el formato
+    Parquet recurre a CSV.
+
+    Un frame sin detecciones se guarda como una fila con `track_id` y `cls`
+    -1 y `conf` y coordenadas NaN, así cada frame procesado aparece en el
+    archivo y los huecos se distinguen de los frames vacíos.
+    """
+
+    OUTPUT_FORMATS = ('parquet', 'csv')
+
+    def __init__(self, output_path, fps=30.0, output_format='parquet', chunk_rows=50000):
+        """
+        Abre el archivo de salida.
+
+        Args:
+            output_path (str): Ruta del archivo, sin extensión o con ella (se ajusta al formato final).
+            fps (float): Frames por segundo del video, para calcular `timestamp` (segundos).
+            output_format (str): 'parquet' o 'csv'.
+            chunk_rows (int): Filas por bloque escrito.
+        """
+        if output_format not in self.OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported export format: {output_format}")
+
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.chunk_rows = chunk_rows
+        self.buffer = []  # Arrays (N, 9) pendientes de escribir
+        self.buffered_rows = 0
+        self.rows = 0
+        self.arrow_writer = None
+
+        if output_format == 'parquet':
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet
+            except ImportError:
+                print("pyarrow is not installed, exporting detections as CSV instead.")
+                output_format = 'csv'
+        self.output_format = output_format
+        self.output_path = os.path.splitext(output_path)[0] + '.' + output_format
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+        if output_format == 'parquet':
+            self.schema = pa.schema([('frame', pa.int64()), ('timestamp', pa.float64()), ('track_id', pa.int64()),
+                                     ('cls', pa.int64()), ('conf', pa.float32()), ('x1', pa.float32()),
+                                     ('y1', pa.float32()), ('x2', pa.float32()), ('y2', pa.float32())])
+            self.arrow_writer = pa.parquet.ParquetWriter(self.output_path, self.schema)
+        else:
+            pd.DataFrame(columns=EXPORT_COLUMNS).to_csv(self.output_path, index=False)
+
+    def add(self, frame_index, detections):
+        """
+        Añade las detecciones de un frame.
+
+        Args:
+            frame_index (int): Posición del frame en el video.
+            detections (np.ndarray): Array (N, 7) x1, y1, x2, y2, track_id, conf, cls (ver TrackInterpolation).
+                Si está vacío se escribe una fila de relleno (ver EMPTY_TRACK_ID).
+        """
+        if len(detections) == 0:
+            rows = np.full((1, 9), np.nan)
+            rows[:, 2:4] = EMPTY_TRACK_ID
+        else:
+            rows = np.empty((len(detections), 9), dtype=np.float64)
+            rows[:, 2] = detections[:, 4]
+            rows[:, 3] = detections[:, 6]
+            rows[:, 4] = detections[:, 5]
+            rows[:, 5:9] = detections[:, :4]
+        rows[:, 0] = frame_index
+        rows[:, 1] = frame_index / self.fps
+        self.buffer.append(rows)
+        self.buffered_rows += len(rows)
+        if self.buffered_rows >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """Escribe las filas del buffer."""
+        if not self.buffer:
+            return
+        rows = np.concatenate(self.buffer)
+        self.buffer = []
+        self.buffered_rows = 0
+
+        df = pd.DataFrame(rows, columns=EXPORT_COLUMNS)
+        df = df.astype({'frame': 'int64', 'track_id': 'int64', 'cls': 'int64', 'conf': 'float32',
+                        'x1': 'float32', 'y1': 'float32', 'x2': 'float32', 'y2': 'float32'})
+        if self.arrow_writer is not None:
+            import pyarrow as pa
+            self.arrow_writer.write_table(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+        else:
+            df.to_csv(self.output_path, mode='a', index=False, header=False)
+        self.rows += len(df)
+
+    def close(self):
+        """Escribe lo pendiente y cierra el archivo."""
+        self.flush()
+        if self.arrow_writer is not None:
+            self.arrow_writer.close()
+            self.arrow_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,86 @@
+import queue
+from collections import namedtuple
+
+# Eventos que los hilos de trabajo envían a la interfaz
+ProgressEvent = namedtuple('ProgressEvent', ['stage', 'done', 'total'])
+PreviewEvent = namedtuple('PreviewEvent', ['image'])
+LogEvent = namedtuple('LogEvent', ['message'])
+StageDoneEvent = namedtuple('StageDoneEvent', ['stage', 'info'])
+ErrorEvent = namedtuple('ErrorEvent', ['stage', 'message'])
+StreamStartedEvent = namedtuple('StreamStartedEvent', ['source'])
+
+
+class EventBus:
+    """
+    Canal de eventos entre los hilos de trabajo y el bucle principal de Tk.
+
+    Los hilos de trabajo solo llaman a `publish`, que nunca bloquea ni toca
+    widgets. La interfaz vacía la cola con `after()` y entrega cada evento a
+    su manejador. En cada vaciado solo se entrega el último progreso de cada
+    etapa y la última vista previa; los logs, fin de etapa y errores se
+    entregan todos y en orden.
+    """
+
+    def __init__(self):
+        self.queue = queue.SimpleQueue()
+        self.master = None
+        self.handlers = {}
+        self.interval_ms = 50
+        self.after_id = None
+
+    def publish(self, event):
+        """
+        Envía un evento a la interfaz. Se puede llamar desde cualquier hilo.
+
+        Args:
+            event: Uno de ProgressEvent, PreviewEvent, LogEvent, StageDoneEvent, ErrorEvent o StreamStartedEvent.
+        """
+        self.queue.put(event)
+
+    def attach(self, master, handlers, interval_ms=50):
+        """
+        Empieza a vaciar la cola desde el bucle principal de Tk.
+
+        Args:
+            master (tk.Widget): Widget cuyo `after()` se usa para vaciar la cola.
+            handlers (dict): Tipo de evento -> función que lo recibe.
+            interval_ms (int): Milisegundos entre dos vaciados.
+        """
+        self.master = master
+        self.handlers = handlers
+        self.interval_ms = interval_ms
+        self.after_id = self.master.after(self.interval_ms, self._drain)
+
+    def detach(self):
+        """Deja de vaciar la cola."""
+        if self.after_id is not None:
+            self.master.after_cancel(self.after_id)
+            self.after_id = None
+
+    def _drain(self):
+        ordered = []  # Eventos que se entregan todos, en orden de llegada
+        latest_progress = {}  # Etapa -> último ProgressEvent
+        latest_preview = None
+        while True:
+            try:
+                event = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(event, ProgressEvent):
+                latest_progress[event.stage] = event
+            elif isinstance(event, PreviewEvent):
+                latest_preview = event
+            else:
+                ordered.append(event)
+
+        # El progreso y la vista previa van primero: un fin de etapa puede abrir un diálogo modal
+        events = list(latest_progress.values())
+        if latest_preview is not None:
+            events.append(latest_preview)
+        events.extend(ordered)
+
+        self.after_id = self.master.after(self.interval_ms, self._drain)
+        for event in events:
+            handler = self.handlers.get(type(event))
+            if handler is not None:
+                handler(event)
@@ -0,0 +1,77 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PrefetchImageLoader:
+    """
+    Cargador de imágenes con prelectura en paralelo.
+
+    Un pool de hilos decodifica y redimensiona las siguientes imágenes mientras
+    el modelo procesa la actual. Como mucho hay `prefetch` imágenes en vuelo,
+    de modo que la memoria se mantiene acotada aunque la carpeta sea grande.
+    Las imágenes se entregan en el mismo orden que `image_files`.
+    """
+
+    def __init__(self, input_folder, image_files, load_image, num_workers=4, prefetch=8):
+        """
+        Inicializa el cargador.
+
+        Args:
+            input_folder (str): Carpeta con las imágenes de entrada.
+            image_files (list): Nombres de archivo a cargar, en orden.
+            load_image (callable): Función que recibe una ruta y devuelve el array de la imagen.
+            num_workers (int): Número de hilos de decodificación.
+            prefetch (int): Máximo de imágenes decodificadas o en decodificación a la vez.
+        """
+        if num_workers < 1 or prefetch < 1:
+            raise ValueError("num_workers and prefetch must be at least 1.")
+
+        self.input_folder = input_folder
+        self.image_files = list(image_files)
+        self.load_image = load_image
+        self.num_workers = num_workers
+        self.prefetch = prefetch
+
+    def __len__(self):
+        return len(self.image_files)
+
+    def __iter__(self):
+        """
+        Recorre las imágenes en orden.
+
+        Yields:
+            tuple: (image_file, image). Las imágenes que no se pueden leer se
+            informan por consola y se omiten.
+        """
+        pending = deque()  # Cola acotada de futuros, en el orden de los archivos
+        files = iter(self.image_files)
+        executor = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="image-loader")
+        try:
+            for image_file in files:
+                pending.append(self._submit(executor, image_file))
+                if len(pending) >= self.prefetch:
+                    break
+
+            while pending:
+                image_file, future = pending.popleft()
+
+                # Reponer la cola antes de esperar para mantener los hilos ocupados
+                next_file = next(files, None)
+                if next_file is not None:
+                    pending.append(self._submit(executor, next_file))
+
+                try:
+                    image = future.result()
+                except Exception as e:
+                    print(f"Error loading image {os.path.join(self.input_folder, image_file)}: {e}")
+                    continue
+
+                yield image_file, image
+        finally:
+            # Si el consumidor se detiene antes de tiempo, descartar lo pendiente
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, executor, image_file):
+        image_path = os.path.join(self.input_folder, image_file)
+        return image_file, executor.submit(self.load_image, image_path)
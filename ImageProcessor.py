@@ -1,12 +1,19 @@
 import os
+import json
 import cv2
 import numpy as np
 import pandas as pd
-from PIL import Image
-from YOLOv8ObjectDetector import YOLOv8ObjectDetector  # Asegúrate de que este import sea correcto
+from SegmentationEngine import SegmentationEngine
+from ProgressSink import progress_for
+from Instrumentation import MASK_ANALYTICS
 
 class ImageProcessor:
-    def __init__(self, model_path, input_folder, output_folder, main_window):
+    manifest_key = 'mask_areas'  # Key of this view in the run manifest (older 'masks' entries held contour areas)
+    span_name = MASK_ANALYTICS  # Timing span of handle_result (see SegmentationEngine.run)
+    COLUMNS = ['Image', 'Detection', 'Mask', 'Mask_Area_px']  # Mask_Area_px: mask pixel count
+    DTYPES = {'Image': 'str', 'Detection': 'int', 'Mask': 'str', 'Mask_Area_px': 'int'}  # See MergeDF
+
+    def __init__(self, model_path, input_folder, output_folder, main_window=None, compute_polygons=False):
         """
         Initialize the ImageProcessor.
 
@@ -14,106 +21,149 @@ class ImageProcessor:
             model_path (str): Path to the YOLOv8 model checkpoint file.
             input_folder (str): Path to the folder containing input images.
             output_folder (str): Path to the folder where masks will be saved.
+            compute_polygons (bool): Extract the external contour polygons of each mask
+                and save them to `all_mask_polygons.json`.
         """
         self.model_path = model_path
         self.input_folder = input_folder
         self.output_folder = output_folder
+        os.makedirs(self.output_folder, exist_ok=True)
         self.main_window = main_window
-        self.model = YOLOv8ObjectDetector(self.model_path, self.input_folder, self.output_folder, self.main_window)
+        self.compute_polygons = compute_polygons
+        if compute_polygons:
+            # Rows saved without polygons cannot be restored into a polygon run: use another manifest key
+            self.manifest_key = 'mask_polygons'
         self.area_data = []  # Inicializar la lista de datos de área
+        self.polygon_data = {}  # Máscara -> lista de polígonos (solo con compute_polygons)
+        self.last_rows = {'areas': [], 'polygons': {}}  # Filas de la última imagen, para el manifiesto
 
-    def process_images(self):
+    def process_images(self, batch_size=1, resume=True):
         """
         Process each image in the input folder and generate masks.
 
+        Args:
+            batch_size (int): Number of images grouped in each `predict` call.
+            resume (bool): Skip unchanged images according to the output folder's run manifest.
+
         Returns:
             None
         """
         if not self.input_folder or not self.output_folder:
             raise ValueError("Input and output folders must be specified.")
 
-        total_images = len([f for f in os.listdir(self.input_folder) if f.endswith(('.jpg', '.jpeg', '.png'))])
-
-        for i, image_file in enumerate(os.listdir(self.input_folder)):
-            if image_file.endswith(('.jpg', '.jpeg', '.png')):
-                # Inicializar datos de área para la imagen actual
-                area_data = []
-
-                image_path = os.path.join(self.input_folder, image_file)
-                original_image = Image.open(image_path)
-                resized_image = original_image.resize((800, 608))
-                resized_image_array = np.array(resized_image)
-                resized_image_array = cv2.cvtColor(resized_image_array, cv2.COLOR_RGBA2RGB)  # Convertir a RGB
-
-                new_results = self.model.model.predict(resized_image_array, conf=0.3)
-
-                if not new_results:  # Verificar si new_results está vacío o es None
-                    print(f"No results for {image_file}, skipping...")
-                    continue
-
-                new_result = new_results[0]
+        engine = SegmentationEngine(self.model_path, self.input_folder, progress_for(self.main_window), batch_size=batch_size,
+                                    output_folder=self.output_folder if resume else None)
+        engine.run([self])
 
-                if new_result.masks is None:
-                    print(f"No masks found for {image_file}")
-                    continue
-
-                # Inicializar un array para almacenar las máscaras
-                all_masks = np.zeros_like(resized_image_array[:, :, 0], dtype=np.uint8)
-
-                for idx, mask in enumerate(new_result.masks.data.cpu().numpy()):
-                    binary_mask = (mask > 0).astype(np.uint8) * 255
-
-                    # Guardar la máscara binaria para cada máscara por separado
-                    output_image_path = os.path.join(self.output_folder, f"{image_file.split('.')[0]}_mask_{idx}.png")
-                    cv2.imwrite(output_image_path, binary_mask)  # Cambié plt.imsave a cv2.imwrite
-                    print(f"Saved the result image as {output_image_path}")
-
-                    # Calcular el área de contorno para la máscara actual
-                    contours, _ = cv2.findContours(binary_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                    total_contour_area_mask = 0  # Inicializar el área de contorno total para la máscara actual
-                    for contour in contours:
-                        contour_area = cv2.contourArea(contour)
-                        total_contour_area_mask += contour_area
+    def handle_result(self, image_file, image, result, writer):
+        """
+        Save the masks and mask areas (pixel counts) of one image from the engine result.
 
-                    # Añadir los datos de área de contorno a la lista para la máscara actual
-                    area_data.append({'Mask': f"{image_file.split('.')[0]}_mask_{idx}.png",
-                                     'Total_Contour_Area': total_contour_area_mask})
+        Args:
+            image_file (str): Name of the image file.
+            image (np.ndarray): Resized image that was fed to the model.
+            result (ultralytics.engine.results.Results): Inference result.
+            writer (AsyncImageWriter): Writer pool where the mask images are queued.
 
-                    # Actualizar el array all_masks con la máscara actual
-                    all_masks += binary_mask
+        Returns:
+            np.ndarray or None: Combined mask to display, or None if there are no masks.
+        """
+        self.last_rows = {'areas': [], 'polygons': {}}
+        if result.masks is None:
+            print(f"No masks found for {image_file}")
+            return None
+
+        # Umbralizar todas las máscaras a la vez, en el dispositivo del modelo
+        binary_masks = (result.masks.data > 0).cpu().numpy()
+        mask_areas, all_masks, combined_area = self.analyze_masks(binary_masks)
+        masks_u8 = binary_masks.view(np.uint8) * 255
+
+        image_name = image_file.split('.')[0]
+        area_data = []
+        polygons = {}
+        for idx, mask_area in enumerate(mask_areas):
+            mask_name = f"{image_name}_mask_{idx}.png"
+
+            # Guardar la máscara binaria para cada máscara por separado
+            output_image_path = os.path.join(self.output_folder, mask_name)
+            writer.write(output_image_path, masks_u8[idx], tag=image_file)  # Escritura en segundo plano
+            print(f"Saved the result image as {output_image_path}")
+
+            area_data.append({'Image': image_file, 'Detection': idx, 'Mask': mask_name,
+                              'Mask_Area_px': int(mask_area)})
+
+            if self.compute_polygons:
+                contours, _ = cv2.findContours(masks_u8[idx], cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+                polygons[mask_name] = [contour.reshape(-1, 2).tolist() for contour in contours]
+
+        # Guardar la imagen combinada de máscaras
+        output_image_path = os.path.join(self.output_folder, f"{image_name}_masks.png")
+        writer.write(output_image_path, all_masks, tag=image_file)  # Escritura en segundo plano
+        print(f"Saved the result image as {output_image_path} (combined area: {combined_area} px)")
+
+        # Extender el atributo de la clase con los datos de área de la imagen actual
+        self.area_data.extend(area_data)
+        self.polygon_data.update(polygons)
+        self.last_rows = {'areas': area_data, 'polygons': polygons}
+
+        return all_masks
+
+    @staticmethod
+    def analyze_masks(binary_masks):
+        """
+        Compute the per-mask and combined areas of a stack of binary masks.
 
-                # Guardar la imagen combinada de máscaras
-                output_image_path = os.path.join(self.output_folder, f"{image_file.split('.')[0]}_masks.png")
-                cv2.imwrite(output_image_path, all_masks)  # Cambié plt.imsave a cv2.imwrite
-                print(f"Saved the result image as {output_image_path}")
+        Areas are pixel counts. The union is built with a single reduction, so
+        overlapping masks are counted once instead of wrapping around in uint8.
 
-                # Calcular el área de contorno para la máscara combinada
-                contours_combined, _ = cv2.findContours(all_masks, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                total_contour_area_combined = 0  # Inicializar el área de contorno total para la máscara combinada
-                for contour_combined in contours_combined:
-                    contour_area_combined = cv2.contourArea(contour_combined)
-                    total_contour_area_combined += contour_area_combined
+        Args:
+            binary_masks (np.ndarray): Boolean array of shape (N, H, W).
 
-                # Extender el atributo de la clase con los datos de área de la imagen actual
-                self.area_data.extend(area_data)
+        Returns:
+            tuple: (per-mask areas of shape (N,), uint8 union mask of shape (H, W), combined area).
+        """
+        mask_areas = np.count_nonzero(binary_masks.reshape(len(binary_masks), -1), axis=1)
+        union = np.any(binary_masks, axis=0)
+        combined_area = int(np.count_nonzero(union))
+        return mask_areas, union.view(np.uint8) * 255, combined_area
 
-                # Mostrar la máscara combinada en el canvas de la ventana principal de Tkinter
-                self.main_window.display_image_on_canvas(all_masks)
+    def manifest_rows(self):
+        """
+        Return the area rows and polygons of the last processed image.
+        """
+        return self.last_rows
 
-                # Actualizar la barra de progreso
-                progress_value = (i + 1) / total_images * 100
-                self.main_window.progress_var.set(progress_value)
-                self.main_window.master.update_idletasks()
+    def restore_rows(self, image_file, rows):
+        """
+        Reuse the area rows and polygons saved in the run manifest for an unchanged image.
+        """
+        self.area_data.extend(rows['areas'])
+        self.polygon_data.update(rows['polygons'])
 
+    def finish(self):
+        """
+        Called by the engine once the whole folder has been processed.
+        """
         # Guardar los datos de área en un archivo CSV al final
         self.save_contour_areas()
+        if self.compute_polygons:
+            self.save_polygons()
+
+    def save_polygons(self):
+        """
+        Save the external contour polygons of every mask to a JSON file.
+        """
+        json_path = os.path.join(self.output_folder, "all_mask_polygons.json")
+        with open(json_path, 'w') as f:
+            json.dump(self.polygon_data, f)
+        print(f"Saved JSON file with all mask polygons: {json_path}")
 
     def save_contour_areas(self):
         """
         Save the area data to a CSV file.
         """
         # Convertir la lista de datos de área extendida a un DataFrame
-        df = pd.DataFrame(self.area_data)
+        df = pd.DataFrame(self.area_data, columns=self.COLUMNS)
         csv_path = os.path.join(self.output_folder, "all_contour_areas.csv")
         df.to_csv(csv_path, index=False)
         print(df)
@@ -0,0 +1,118 @@
+import queue
+import threading
+import cv2
+from Instrumentation import NULL_INSTRUMENTATION, DISK_WRITE
+
+
+class AsyncImageWriter:
+    """
+    Pool de escritura de imágenes en segundo plano.
+
+    Las vistas encolan las imágenes a guardar y un pool de hilos se encarga de
+    la codificación PNG, que libera el GIL dentro de OpenCV. La cola está
+    acotada: si los hilos no dan abasto, `write` espera en lugar de acumular
+    imágenes en memoria.
+    """
+
+    _STOP = object()  # Marca para terminar los hilos
+
+    def __init__(self, num_workers=2, max_queue=32, png_compression=1, instrumentation=None):
+        """
+        Inicializa el pool de escritura.
+
+        Args:
+            num_workers (int): Número de hilos de escritura.
+            max_queue (int): Máximo de imágenes pendientes de escribir.
+            png_compression (int): Nivel de compresión PNG de 0 (rápido) a 9 (más pequeño).
+            instrumentation (Instrumentation): Mide cada escritura como tramo 'disk_write'.
+        """
+        if not 0 <= png_compression <= 9:
+            raise ValueError("PNG compression level must be between 0 and 9.")
+
+        self.png_compression = png_compression
+        self.instrumentation = instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.errors = []  # Tuplas (ruta, mensaje, etiqueta) de las escrituras fallidas
+        self.errors_lock = threading.Lock()
+        self.closed = False
+        self.workers = []
+        for i in range(num_workers):
+            worker = threading.Thread(target=self._worker, name=f"image-writer-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def write(self, path, image, rgb=False, tag=None):
+        """
+        Encola una imagen para guardarla.
+
+        La imagen no debe modificarse después de encolarla.
+
+        Args:
+            path (str): Ruta de destino.
+            image (np.ndarray): Imagen en escala de grises, BGR o RGB.
+            rgb (bool): True si la imagen está en orden RGB (como espera `plt.imsave`).
+            tag: Identificador que se devuelve con el error si la escritura falla
+                (por ejemplo, el nombre de la imagen de entrada).
+        """
+        if self.closed:
+            raise RuntimeError("The image writer has already been closed.")
+        self.queue.put((path, image, rgb, tag))
+
+    def flush(self):
+        """
+        Espera a que se escriban todas las imágenes encoladas.
+
+        Returns:
+            list: Tuplas (ruta, mensaje, etiqueta) de las escrituras que fallaron desde el último `flush`.
+        """
+        self.queue.join()
+        with self.errors_lock:
+            errors, self.errors = self.errors, []
+
+        for path, message, _ in errors:
+            print(f"Error writing {path}: {message}")
+        if errors:
+            print(f"{len(errors)} images could not be written.")
+        return errors
+
+    def close(self):
+        """
+        Vacía la cola y detiene los hilos de escritura.
+
+        Returns:
+            list: Tuplas (ruta, mensaje, etiqueta) de las escrituras que fallaron.
+        """
+        if self.closed:
+            return []
+        errors = self.flush()
+        self.closed = True
+        for _ in self.workers:
+            self.queue.put(self._STOP)
+        for worker in self.workers:
+            worker.join()
+        return errors
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _worker(self):
+        params = [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression]
+        while True:
+            item = self.queue.get()
+            try:
+                if item is self._STOP:
+                    return
+                path, image, rgb, tag = item
+                with self.instrumentation.span(DISK_WRITE):
+                    if rgb and image.ndim == 3:
+                        image = cv2.cvtColor(image, cv2.COLOR_RGBA2BGRA if image.shape[2] == 4 else cv2.COLOR_RGB2BGR)
+                    if not cv2.imwrite(path, image, params if path.lower().endswith('.png') else []):
+                        raise IOError("cv2.imwrite returned False")
+            except Exception as e:
+                with self.errors_lock:
+                    self.errors.append((path, str(e), tag))
+            finally:
+                self.queue.task_done()
@@ -0,0 +1,226 @@
+import os
+import json
+import shutil
+import tempfile
+from collections import namedtuple
+import numpy as np
+
+# Formato del modelo que hace la inferencia: 'eager' es el .pt de PyTorch tal cual
+BACKENDS = ('eager', 'torchscript', 'onnx')
+EXTENSIONS = {'torchscript': '.torchscript', 'onnx': '.onnx'}
+FIXED_BATCH = ('torchscript',)  # Se exportan con la forma fija del calentamiento: un solo frame por llamada
+DEFAULT_IMGSZ = 640  # Tamaño de entrada por defecto de ultralytics
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ai_analyzer', 'exports')
+
+BackendOptions = namedtuple('BackendOptions', ['format', 'imgsz', 'int8'])
+EAGER = BackendOptions('eager', None, False)
+
+
+def backend_options(format='eager', imgsz=None, int8=False):
+    """
+    Valida y normaliza las opciones del backend de inferencia.
+
+    Args:
+        format (str): 'eager', 'torchscript' u 'onnx'.
+        imgsz (int): Tamaño de entrada con el que se exporta (None = 640). Se ignora en 'eager'.
+        int8 (bool): Cuantización dinámica int8 con onnxruntime (solo 'onnx').
+
+    Returns:
+        BackendOptions: Opciones listas para usar como parte de una clave de caché.
+    """
+    if format not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{format}', expected one of {', '.join(BACKENDS)}.")
+    if int8 and format != 'onnx':
+        raise ValueError("int8 quantization requires the onnx backend.")
+    if format == 'eager':
+        return EAGER
+    return BackendOptions(format, int(imgsz) if imgsz else DEFAULT_IMGSZ, bool(int8))
+
+
+def max_batch_size(options):
+    """
+    Lote máximo que admite un backend en cada llamada a `predict`.
+
+    TorchScript se traza con un lote de 1 y no acepta otro tamaño; ONNX se
+    exporta con ejes dinámicos y PyTorch no tiene límite.
+
+    Args:
+        options (BackendOptions): Backend (ver `backend_options`).
+
+    Returns:
+        int or None: 1 para los formatos de forma fija, None si no hay límite.
+    """
+    return 1 if options.format in FIXED_BATCH else None
+
+
+def model_backend(model):
+    """
+    Backend con el que se cargó realmente un modelo.
+
+    `load_model` lo guarda en el modelo: si la exportación falló y se usa el
+    .pt, es EAGER aunque se pidiera otro backend.
+
+    Args:
+        model: Modelo devuelto por `load_model` (o cualquier otro, que se considera eager).
+
+    Returns:
+        BackendOptions: Backend del modelo.
+    """
+    return getattr(model, 'inference_backend', EAGER)
+
+
+class ExportCache:
+    """
+    Modelos exportados guardados en disco.
+
+    Cada artefacto se identifica por el hash de los pesos, el formato, el
+    tamaño de entrada y la cuantización, así que se exporta una sola vez y
+    se reutiliza entre ejecuciones y procesos. Junto a cada artefacto se
+    guarda un JSON con la tarea del modelo, que el formato exportado no
+    siempre permite deducir.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        """
+        Args:
+            cache_dir (str): Carpeta de los artefactos exportados.
+        """
+        self.cache_dir = cache_dir
+
+    def artifact_path(self, weights_hash, options):
+        """Ruta del artefacto de unos pesos y unas opciones (exista o no)."""
+        name = f"{weights_hash[:16]}_{options.format}_{options.imgsz}{'_int8' if options.int8 else ''}"
+        return os.path.join(self.cache_dir, name + EXTENSIONS[options.format])
+
+    def lookup(self, weights_hash, options):
+        """
+        Returns:
+            tuple: (ruta del artefacto, metadatos), o None si no está en la caché.
+        """
+        path = self.artifact_path(weights_hash, options)
+        if not (os.path.exists(path) and os.path.exists(path + '.json')):
+            return None
+        with open(path + '.json', encoding='utf-8') as f:
+            return path, json.load(f)
+
+    def discard(self, weights_hash, options):
+        """Borra un artefacto que no se pudo usar, para que se vuelva a exportar."""
+        path = self.artifact_path(weights_hash, options)
+        for stale in (path, path + '.json'):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+    def export(self, model_path, weights_hash, options, loader, task=None):
+        """
+        Exporta los pesos con ultralytics y guarda el artefacto en la caché.
+
+        La exportación se hace sobre una copia de los pesos en una carpeta
+        temporal, así no se pisan archivos junto al .pt original, y el
+        artefacto se mueve a la caché al final (otro proceso nunca ve uno a medias).
+
+        Args:
+            model_path (str): Ruta a los pesos (.pt).
+            weights_hash (str): Hash de los pesos (ver ModelRegistry.file_hash).
+            options (BackendOptions): Formato, tamaño de entrada y cuantización.
+            loader (callable): Carga el .pt (normalmente `ultralytics.YOLO`).
+            task (str): Tarea de ultralytics, o None para tomarla del modelo.
+
+        Returns:
+            tuple: (ruta del artefacto, metadatos).
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix='export_', dir=self.cache_dir) as work_dir:
+            weights_copy = os.path.join(work_dir, 'model.pt')
+            shutil.copyfile(model_path, weights_copy)
+            model = loader(weights_copy, task=task)
+            print(f"Exporting {os.path.basename(model_path)} to {options.format} (imgsz {options.imgsz}), "
+                  f"this is done only once...")
+            exported = model.export(format=options.format, imgsz=options.imgsz, device='cpu', half=False,
+                                    dynamic=options.format == 'onnx', simplify=False)
+            if options.int8:
+                exported = quantize_onnx(exported, os.path.join(work_dir, 'model_int8.onnx'))
+
+            metadata = {'source': os.path.abspath(model_path), 'sha1': weights_hash, 'task': model.task,
+                        **options._asdict()}
+            path = self.artifact_path(weights_hash, options)
+            with open(path + '.json', 'w', encoding='utf-8') as f:
+                json.dump(metadata, f, indent=2)
+            os.replace(exported, path)
+        print(f"Exported model cached at {path}")
+        return path, metadata
+
+
+def quantize_onnx(source_path, output_path):
+    """
+    Cuantiza dinámicamente (pesos int8) un modelo ONNX con onnxruntime.
+
+    Los pesos de las convoluciones se guardan como uint8: onnxruntime en CPU
+    no implementa ConvInteger con pesos int8 con signo. Los metadatos de
+    ultralytics (clases, tamaño de entrada, stride) se copian del original.
+
+    Args:
+        source_path (str): Modelo ONNX en float32.
+        output_path (str): Destino del modelo cuantizado.
+
+    Returns:
+        str: `output_path`.
+    """
+    import onnx
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(source_path, output_path, weight_type=QuantType.QUInt8)
+    source = onnx.load(source_path)
+    quantized = onnx.load(output_path)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(source.metadata_props)
+    onnx.save(quantized, output_path)
+    return output_path
+
+
+def load_model(model_path, weights_hash, options, loader, task=None, cache=None):
+    """
+    Carga el modelo con el backend pedido, exportándolo la primera vez.
+
+    El modelo exportado se prueba con una inferencia de calentamiento; si la
+    exportación, la carga o esa inferencia fallan, se avisa y se usa el
+    modelo de PyTorch sin exportar, así la aplicación funciona igual aunque
+    falten onnx/onnxruntime o el modelo no se pueda exportar.
+
+    Args:
+        model_path (str): Ruta a los pesos (.pt).
+        weights_hash (str): Hash de los pesos.
+        options (BackendOptions): Backend pedido (ver `backend_options`).
+        loader (callable): Recibe (ruta, task=...) y devuelve el modelo (normalmente `ultralytics.YOLO`).
+        task (str): Tarea de ultralytics, o None para deducirla.
+        cache (ExportCache): Caché de artefactos (por defecto, la de la carpeta del usuario).
+
+    Returns:
+        Modelo con la interfaz de `ultralytics.YOLO` (predict, track, names), con el backend que
+        se usó finalmente en `inference_backend` (ver `model_backend`).
+    """
+    if options.format == 'eager':
+        return _tag(loader(model_path, task=task), EAGER)
+
+    cache = cache if cache is not None else ExportCache()
+    try:
+        cached = cache.lookup(weights_hash, options)
+        if cached is None:
+            cached = cache.export(model_path, weights_hash, options, loader, task=task)
+        path, metadata = cached
+        model = loader(path, task=task or metadata['task'])
+        # Calentamiento: onnxruntime y TorchScript solo fallan al ejecutar, no al cargar
+        model.predict(np.zeros((options.imgsz, options.imgsz, 3), dtype=np.uint8), imgsz=options.imgsz,
+                      device='cpu', verbose=False)
+        return _tag(model, options)
+    except Exception as e:
+        print(f"Could not use the {options.format} backend ({e}); falling back to the PyTorch model.")
+        try:
+            cache.discard(weights_hash, options)
+        except OSError:
+            pass
+        return _tag(loader(model_path, task=task), EAGER)
+
+
+def _tag(model, options):
+    model.inference_backend = options
+    return model
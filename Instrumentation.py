@@ -0,0 +1,201 @@
+import os
+import json
+import math
+import time
+import threading
+from contextlib import nullcontext
+
+# Nombres de los tramos que miden los pipelines
+DECODE = 'decode'
+RESIZE = 'resize'
+INFERENCE = 'inference'
+POSTPROCESS = 'postprocess'  # Dibujo de las detecciones (plot) y extracción de cajas
+MASK_ANALYTICS = 'mask_analytics'
+DISK_WRITE = 'disk_write'
+GUI_UPDATE = 'gui_update'
+
+SUMMARY_NAME = 'timings.json'  # Nombre del resumen que se guarda junto a las salidas
+
+_NULL_SPAN = nullcontext()  # Un único contexto vacío compartido: desactivado no se crea nada por llamada
+
+
+class StreamingHistogram:
+    """
+    Histograma de duraciones con memoria constante.
+
+    Las duraciones se agrupan en cubos logarítmicos (cada cubo es un
+    `growth` mayor que el anterior), así los percentiles tienen un error
+    relativo acotado sin guardar cada muestra. El mínimo, el máximo y la
+    media son exactos.
+    """
+
+    def __init__(self, min_seconds=1e-6, growth=1.05):
+        """
+        Args:
+            min_seconds (float): Límite inferior del primer cubo; las duraciones menores caen en él.
+            growth (float): Razón entre los límites de dos cubos consecutivos (error relativo de los percentiles).
+        """
+        self.min_seconds = min_seconds
+        self.log_growth = math.log(growth)
+        self.growth = growth
+        self.buckets = {}  # Índice del cubo -> muestras
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, seconds):
+        """Registra una duración en segundos."""
+        seconds = float(seconds)
+        index = int(math.log(seconds / self.min_seconds) / self.log_growth) if seconds > self.min_seconds else 0
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """
+        Devuelve una estimación del percentil `q` (0-1) en segundos.
+
+        Se toma el punto medio geométrico del cubo, acotado por el mínimo y el máximo observados.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                value = self.min_seconds * self.growth ** (index + 0.5)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        """
+        Returns:
+            dict: Muestras, total (s), media, p50, p95, p99 y máximo en milisegundos, y muestras por
+                segundo si el tramo fuera el único trabajo.
+        """
+        if not self.count:
+            return {'count': 0}
+        return {'count': self.count, 'total_s': round(self.total, 4),
+                'mean_ms': round(self.total / self.count * 1000, 3),
+                'p50_ms': round(self.quantile(0.50) * 1000, 3),
+                'p95_ms': round(self.quantile(0.95) * 1000, 3),
+                'p99_ms': round(self.quantile(0.99) * 1000, 3),
+                'max_ms': round(self.max * 1000, 3),
+                'per_second': round(self.count / self.total, 2) if self.total > 0 else 0.0}
+
+
+class NullInstrumentation:
+    """Instrumentación desactivada: `span` devuelve un contexto vacío compartido y nada se mide."""
+
+    enabled = False
+
+    def span(self, name):
+        """
+        Mide el bloque `with` como una muestra del tramo `name`.
+
+        Args:
+            name (str): Nombre del tramo (DECODE, INFERENCE...).
+        """
+        return _NULL_SPAN
+
+    def record(self, name, seconds):
+        """
+        Registra una duración ya medida (por ejemplo, por un StageStats).
+
+        Args:
+            name (str): Nombre del tramo.
+            seconds (float): Duración en segundos.
+        """
+
+    def summary(self, **info):
+        return {}
+
+    def write_summary(self, path, **info):
+        """
+        Guarda el resumen en JSON.
+
+        Args:
+            path (str): Archivo de destino, o una carpeta donde se crea `timings.json`.
+            **info: Datos adicionales del resumen (entrada, imágenes procesadas...).
+
+        Returns:
+            str: Ruta del archivo escrito, o None si no se escribió.
+        """
+        return None
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
+
+
+class _Span:
+    __slots__ = ('instrumentation', 'name', 'start')
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.instrumentation.record(self.name, time.perf_counter() - self.start)
+
+
+class Instrumentation(NullInstrumentation):
+    """
+    Tiempos por tramo (decodificación, inferencia, escritura...) de una ejecución.
+
+    Cada tramo alimenta un StreamingHistogram; se puede medir desde varios
+    hilos a la vez (cargadores, escritores, pipeline de video). Al acabar,
+    `write_summary` guarda p50/p95/p99 y el rendimiento de cada tramo junto a
+    las salidas.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started_at = time.perf_counter()
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def record(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = StreamingHistogram()
+            histogram.add(seconds)
+
+    def summary(self, **info):
+        """
+        Returns:
+            dict: Tiempo total, datos adicionales y el histograma resumido de cada tramo.
+        """
+        wall_seconds = time.perf_counter() - self.started_at
+        with self.lock:
+            spans = {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+        return {'wall_seconds': round(wall_seconds, 3), **info, 'spans': spans}
+
+    def write_summary(self, path, **info):
+        if os.path.isdir(path):
+            path = os.path.join(path, SUMMARY_NAME)
+        summary = self.summary(**info)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, default=str)
+        print("Timings (p50/p95/p99 ms): " + ", ".join(
+            f"{name} {values['p50_ms']}/{values['p95_ms']}/{values['p99_ms']}"
+            for name, values in summary['spans'].items() if values.get('count')))
+        print(f"Timings saved to {path}")
+        return path
+
+
+def instrumentation_for(enabled):
+    """Devuelve una instrumentación nueva si está activada, o la nula compartida."""
+    return Instrumentation() if enabled else NULL_INSTRUMENTATION
@@ -4,29 +4,173 @@ Created on Sat Sep 28 18:40:31 2024
 
 @author: Jedi Rosero
 """
+import os
+import math
+import tempfile
 import pandas as pd
+from pandas.api.types import is_numeric_dtype
+from YOLOv8BBOX import YOLOv8BBOX
+from ImageProcessor import ImageProcessor
+
+# Tipo de pandas de cada tipo de columna; los enteros admiten vacíos (detecciones solo en una tabla)
+PANDAS_DTYPES = {'int': 'Int64', 'float': 'float64', 'str': 'string'}
 
 class MergeDF:
-    def __init__(self, bbox_csv_path, contour_areas_csv_path, output_csv_path):
+    KEY_COLUMNS = ['Image', 'Detection']  # Cada detección se identifica por imagen e índice
+    OUTPUT_FORMATS = ('csv', 'parquet', 'feather')
+
+    def __init__(self, bbox_csv_path, contour_areas_csv_path, output_csv_path, output_format=None,
+                 chunksize=100000, partition_bytes=64 * 1024 * 1024, bbox_dtypes=None, contour_dtypes=None):
+        """
+        Join the bbox and contour area tables on (Image, Detection).
+
+        Args:
+            bbox_csv_path (str): CSV written by YOLOv8BBOX.
+            contour_areas_csv_path (str): CSV written by ImageProcessor.
+            output_csv_path (str): Path of the merged output.
+            output_format (str): 'csv', 'parquet' or 'feather'. Inferred from the extension if None.
+            chunksize (int): Rows read from each CSV at a time.
+            partition_bytes (int): Approximate input size of each on-disk partition joined in memory.
+            bbox_dtypes (dict): Column -> 'int', 'float' or 'str' of the bbox table (default: YOLOv8BBOX.DTYPES).
+            contour_dtypes (dict): Column types of the mask area table (default: ImageProcessor.DTYPES).
+        """
         self.bbox_csv_path = bbox_csv_path
         self.contour_areas_csv_path = contour_areas_csv_path
         self.output_csv_path = output_csv_path
+        if output_format is None:
+            output_format = os.path.splitext(output_csv_path)[1].lstrip('.').lower() or 'csv'
+        if output_format not in self.OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        self.output_format = output_format
+        self.chunksize = chunksize
+        self.partition_bytes = partition_bytes
+        self.bbox_dtypes = bbox_dtypes if bbox_dtypes is not None else YOLOv8BBOX.DTYPES
+        self.contour_dtypes = contour_dtypes if contour_dtypes is not None else ImageProcessor.DTYPES
 
     def merge_csv_files(self):
-        # Read CSV files
-        bbox_df = pd.read_csv(self.bbox_csv_path)
-        contour_areas_df = pd.read_csv(self.contour_areas_csv_path)
-
-        # Merge based on row index
-        merged_df = pd.concat([bbox_df, contour_areas_df.iloc[:, -1]], axis=1)
-        
-        # Display or use the merged dataframe as needed
-        print("Merged DataFrame:")
-        print(merged_df)
-
-        # Save the merged DataFrame to CSV
-        merged_df.to_csv(self.output_csv_path, index=False)
-        
+        """
+        Stream both CSVs into hash partitions by image and join each partition in memory.
+
+        Memory stays bounded by the size of one partition, and the merged rows are
+        written partition by partition. Within a partition rows are sorted by
+        (Image, Detection). Detections present in only one table are kept with
+        empty values for the other table's columns.
+
+        Returns:
+            int: Number of merged rows written.
+        """
+        bbox_dtypes = self._read_dtypes(self.bbox_csv_path, self.bbox_dtypes)
+        contour_dtypes = self._read_dtypes(self.contour_areas_csv_path, self.contour_dtypes)
+        # La columna de máscara solo aporta su nombre y su área; el resto se toma de la tabla de cajas
+        contour_dtypes = {column: dtype for column, dtype in contour_dtypes.items()
+                          if column in self.KEY_COLUMNS or column not in bbox_dtypes}
+        output_dtypes = {**bbox_dtypes, **contour_dtypes}
+
+        total_bytes = os.path.getsize(self.bbox_csv_path) + os.path.getsize(self.contour_areas_csv_path)
+        num_partitions = max(1, math.ceil(total_bytes / self.partition_bytes))
+
+        output_dir = os.path.dirname(os.path.abspath(self.output_csv_path))
+        total_rows = 0
+        with tempfile.TemporaryDirectory(dir=output_dir, prefix="merge_") as tmp_dir:
+            self._partition(self.bbox_csv_path, list(bbox_dtypes), 'bbox', num_partitions, tmp_dir)
+            self._partition(self.contour_areas_csv_path, list(contour_dtypes), 'contour', num_partitions, tmp_dir)
+
+            writer = self._open_writer(output_dtypes)
+            try:
+                for partition in range(num_partitions):
+                    bbox_df = self._read_partition(tmp_dir, 'bbox', partition, bbox_dtypes)
+                    contour_df = self._read_partition(tmp_dir, 'contour', partition, contour_dtypes)
+                    if bbox_df.empty and contour_df.empty:
+                        continue
+
+                    merged_df = bbox_df.merge(contour_df, on=self.KEY_COLUMNS, how='outer')
+                    merged_df = merged_df.sort_values(self.KEY_COLUMNS, kind='stable')
+                    merged_df = self._normalize(merged_df, output_dtypes)
+                    writer(merged_df)
+                    total_rows += len(merged_df)
+            finally:
+                writer.close()
+
+        print(f"Merged {total_rows} rows from {num_partitions} partition(s).")
         print(f"Merged DataFrame saved to {self.output_csv_path}")
 
-        return merged_df
+        return total_rows
+
+    def _read_dtypes(self, csv_path, declared):
+        """
+        Return the column types of a CSV and check the join keys.
+
+        Declared columns keep their declared type whatever the data looks like (a
+        header-only table has the same schema as a full one). Only columns that
+        are not declared have their type guessed from the first chunk.
+        """
+        sample = pd.read_csv(csv_path, nrows=1000)
+        missing = [column for column in self.KEY_COLUMNS if column not in sample.columns]
+        if missing:
+            raise ValueError(f"{csv_path} is missing the key columns {missing}; "
+                             "regenerate it with the current pipeline.")
+        return {column: declared.get(column) or ('float' if is_numeric_dtype(sample[column]) and len(sample)
+                                                 else 'str')
+                for column in sample.columns}
+
+    def _partition(self, csv_path, columns, name, num_partitions, tmp_dir):
+        """Split a CSV into hash partitions by image so that each image lands in a single partition."""
+        for chunk in pd.read_csv(csv_path, usecols=columns, chunksize=self.chunksize):
+            partitions = pd.util.hash_pandas_object(chunk['Image'], index=False) % num_partitions
+            for partition, group in chunk.groupby(partitions.to_numpy()):
+                partition_path = os.path.join(tmp_dir, f"{name}_{partition}.csv")
+                group.to_csv(partition_path, mode='a', index=False, header=not os.path.exists(partition_path))
+
+    def _read_partition(self, tmp_dir, name, partition, dtypes):
+        partition_path = os.path.join(tmp_dir, f"{name}_{partition}.csv")
+        pandas_dtypes = {column: PANDAS_DTYPES[dtype] for column, dtype in dtypes.items()}
+        if not os.path.exists(partition_path):
+            return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in pandas_dtypes.items()})
+        return pd.read_csv(partition_path, dtype=pandas_dtypes)
+
+    @staticmethod
+    def _normalize(df, dtypes):
+        """Give every partition the same column order and types, so columnar writers share one schema."""
+        df = df[list(dtypes)].copy()
+        for column, dtype in dtypes.items():
+            df[column] = df[column].astype(PANDAS_DTYPES[dtype])
+        return df
+
+    def _open_writer(self, dtypes):
+        """Return a callable that appends a DataFrame to the output, with a `close` attribute."""
+        if os.path.exists(self.output_csv_path):
+            os.remove(self.output_csv_path)
+
+        if self.output_format == 'csv':
+            state = {'header': True}
+
+            def write(df):
+                df.to_csv(self.output_csv_path, mode='a', index=False, header=state['header'])
+                state['header'] = False
+
+            def close():
+                if state['header']:  # Sin filas: dejar al menos la cabecera
+                    pd.DataFrame(columns=list(dtypes)).to_csv(self.output_csv_path, index=False)
+
+            write.close = close
+            return write
+
+        try:
+            import pyarrow as pa
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError(f"Writing {self.output_format} output requires pyarrow (pip install pyarrow).")
+
+        arrow_types = {'int': pa.int64(), 'float': pa.float64(), 'str': pa.string()}
+        schema = pa.schema([(column, arrow_types[dtype]) for column, dtype in dtypes.items()])
+        if self.output_format == 'parquet':
+            arrow_writer = pa.parquet.ParquetWriter(self.output_csv_path, schema)
+        else:
+            arrow_writer = pa.ipc.new_file(self.output_csv_path, schema)  # Feather v2
+
+        def write(df):
+            arrow_writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+
+        write.close = arrow_writer.close
+        return write
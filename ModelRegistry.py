@@ -0,0 +1,273 @@
+import os
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from InferenceBackend import EAGER, backend_options, load_model
+
+
+def load_yolo(model_path, task=None):
+    """Cargador por defecto: `ultralytics.YOLO` (importado aquí, así el modelo simulado no lo necesita)."""
+    from ultralytics import YOLO
+    return YOLO(model_path, task=task)
+
+
+class ModelRegistry:
+    """
+    Caché de modelos YOLO compartida por todo el proceso.
+
+    Los modelos se identifican por la ruta del archivo de pesos, su fecha de
+    modificación y su hash, la tarea y el backend de inferencia (ver
+    InferenceBackend). Si el archivo cambia en disco la clave cambia y el
+    modelo se vuelve a cargar.
+    Cuando se supera `max_models` se descarta el modelo usado hace más tiempo.
+
+    La carga (y la exportación, que puede tardar minutos) se hace fuera del
+    lock de la caché: mientras tanto las demás ventanas siguen obteniendo sus
+    modelos, y quien pida la misma clave espera a esa carga en lugar de
+    repetirla.
+
+    Los modelos de ultralytics no son seguros entre hilos, así que quien los
+    use desde varios hilos debe proteger la inferencia con `lock_for(model)`.
+
+    Solo se comparten los modelos de `predict`. Con `persist=True`, `track`
+    guarda el estado del tracker (y sus callbacks) en el propio modelo, así
+    que cada consumidor de seguimiento (una cámara, un VideoProcessor) recibe
+    un modelo propio que no pasa por la caché; si no, los tracks de una
+    ventana se mezclarían con los de otra o se borrarían al empezar otro video.
+    Cada consumidor guarda el suyo en un TrackingModelSlot para no volver a
+    cargarlo en cada uso.
+    """
+
+    def __init__(self, max_models=2, loader=None):
+        """
+        Inicializa la caché.
+
+        Args:
+            max_models (int): Número máximo de modelos cargados a la vez.
+            loader (callable): Recibe (ruta, task=...) y devuelve el modelo; por defecto `load_yolo`.
+                El banco de pruebas lo sustituye por un modelo simulado.
+        """
+        if max_models < 1:
+            raise ValueError("max_models must be at least 1.")
+        self.max_models = max_models
+        self.loader = loader if loader is not None else load_yolo
+        self.backend = EAGER  # Backend de los modelos que se carguen a partir de ahora
+        self.models = OrderedDict()  # Clave -> modelo, del menos al más reciente
+        self.loading = {}  # Clave -> threading.Event de la carga en curso
+        self.locks = weakref.WeakKeyDictionary()  # Modelo -> lock de inferencia
+        self.hashes = {}  # (ruta, mtime, tamaño) -> hash de los pesos
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+
+    def file_hash(self, model_path):
+        """
+        Calcula el hash SHA-1 del archivo de pesos, reutilizándolo mientras no cambie.
+
+        Args:
+            model_path (str): Ruta al archivo de pesos.
+
+        Returns:
+            str: Hash hexadecimal del archivo.
+        """
+        model_path = os.path.abspath(model_path)
+        stat = os.stat(model_path)
+        file_key = (model_path, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if file_key in self.hashes:
+                return self.hashes[file_key]
+
+        sha1 = hashlib.sha1()
+        with open(model_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(chunk)
+
+        with self.lock:
+            self.hashes[file_key] = sha1.hexdigest()
+        return self.hashes[file_key]
+
+    def set_backend(self, format='eager', imgsz=None, int8=False):
+        """
+        Elige el backend de inferencia de los modelos que se carguen a partir de ahora.
+
+        Los modelos ya cargados no cambian; quien pida de nuevo un modelo recibe
+        el del backend nuevo (exportado una sola vez y guardado en disco).
+
+        Args:
+            format (str): 'eager' (el .pt de PyTorch), 'torchscript' u 'onnx'.
+            imgsz (int): Tamaño de entrada de la exportación (None = 640).
+            int8 (bool): Cuantización dinámica int8 (solo 'onnx').
+
+        Returns:
+            BackendOptions: Opciones normalizadas.
+        """
+        options = backend_options(format, imgsz, int8)
+        with self.lock:
+            self.backend = options
+        return options
+
+    def get(self, model_path, task=None, purpose='predict', backend=None, imgsz=None):
+        """
+        Devuelve el modelo de la caché o lo carga si no está.
+
+        Args:
+            model_path (str): Ruta al archivo de pesos (.pt).
+            task (str): Tarea de ultralytics ('detect', 'segment'...), o None para deducirla.
+            purpose (str): 'predict' (modelo compartido) o 'track' (modelo nuevo, propio de quien lo pide).
+            backend (BackendOptions): Backend de inferencia; por defecto el elegido con `set_backend`.
+            imgsz (int): Tamaño de entrada con el que se va a predecir. Los modelos exportados
+                tienen un tamaño fijo, así que se exportan a este tamaño (None = el del backend).
+
+        Returns:
+            ultralytics.YOLO: Modelo listo para inferencia (exportado o, si no se pudo, el .pt).
+        """
+        if not model_path or not os.path.exists(model_path):
+            raise ValueError("Invalid YOLO model file path.")
+
+        backend = backend if backend is not None else self.backend
+        if imgsz and backend.format != 'eager':
+            backend = backend._replace(imgsz=int(imgsz))
+
+        model_path = os.path.abspath(model_path)
+        weights_hash = self.file_hash(model_path)
+        if purpose == 'track':
+            # El tracker vive en el modelo: un modelo nuevo por consumidor, fuera de la caché
+            print(f"Loading a private tracking model: {os.path.basename(model_path)} ({backend.format})")
+            return load_model(model_path, weights_hash, backend, self.loader, task=task)
+
+        key = (model_path, os.stat(model_path).st_mtime_ns, weights_hash, task, purpose, backend)
+
+        while True:
+            with self.lock:
+                if key in self.models:
+                    self.hits += 1
+                    self.models.move_to_end(key)
+                    print(f"Model cache hit: {os.path.basename(model_path)} ({purpose}, {backend.format})")
+                    return self.models[key]
+
+                in_flight = self.loading.get(key)
+                if in_flight is None:
+                    in_flight = self.loading[key] = threading.Event()
+                    self.misses += 1
+                    break
+
+            # Otro hilo está cargando esta clave: esperar y volver a mirar (si falló, se reintenta aquí)
+            in_flight.wait()
+
+        try:
+            print(f"Model cache miss, loading: {os.path.basename(model_path)} ({purpose}, {backend.format})")
+            model = load_model(model_path, weights_hash, backend, self.loader, task=task)
+            with self.lock:
+                self.models[key] = model
+                while len(self.models) > self.max_models:
+                    evicted_key, _ = self.models.popitem(last=False)
+                    print(f"Model cache full, evicted: {os.path.basename(evicted_key[0])} ({evicted_key[4]})")
+            return model
+        finally:
+            with self.lock:
+                del self.loading[key]
+            in_flight.set()
+
+    def lock_for(self, model):
+        """
+        Devuelve el lock que serializa la inferencia sobre un modelo compartido.
+
+        Args:
+            model: Modelo devuelto por `get`.
+
+        Returns:
+            threading.Lock: Lock del modelo, que vive mientras viva el modelo.
+        """
+        with self.lock:
+            if model not in self.locks:
+                self.locks[model] = threading.Lock()
+            return self.locks[model]
+
+    def stats(self):
+        """
+        Devuelve los contadores de la caché.
+
+        Returns:
+            dict: Aciertos, fallos y modelos cargados.
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'loaded': len(self.models), 'max_models': self.max_models}
+
+    def clear(self):
+        """Descarta todos los modelos cargados."""
+        with self.lock:
+            self.models.clear()
+
+
+# Caché compartida por todas las ventanas y pipelines del proceso
+model_registry = ModelRegistry()
+
+
+def reset_tracker(model):
+    """
+    Descarta el estado del tracker que `track(persist=True)` guarda en el modelo.
+
+    Args:
+        model: Modelo de seguimiento (propio de quien lo usa, ver ModelRegistry.get).
+    """
+    predictor = getattr(model, 'predictor', None)
+    if predictor is not None and hasattr(predictor, 'trackers'):
+        with model_lock(model):
+            del predictor.trackers
+
+
+class TrackingModelSlot:
+    """
+    Modelo de seguimiento propio de un consumidor, reutilizado entre usos.
+
+    Una ventana guarda aquí su modelo de `track`: mientras no cambien los
+    pesos, el backend ni el tamaño de entrada, `get` devuelve el mismo modelo
+    (con el tracker vacío) en lugar de cargarlo y calentarlo de nuevo.
+    """
+
+    def __init__(self, registry=None):
+        """
+        Args:
+            registry (ModelRegistry): Registro con el que se cargan los modelos (por defecto, el global).
+        """
+        self.registry = registry if registry is not None else model_registry
+        self.key = None
+        self.model = None
+        self.backend = None  # Backend con el que se cargó `model`
+
+    def get(self, model_path, task=None, backend=None, imgsz=None):
+        """
+        Devuelve el modelo de seguimiento, cargándolo solo si cambió algo de la clave.
+
+        Args:
+            model_path (str): Ruta al archivo de pesos (.pt).
+            task (str): Tarea de ultralytics, o None para deducirla.
+            backend (BackendOptions): Backend de inferencia; por defecto el del registro.
+            imgsz (int): Tamaño de entrada con el que se va a predecir.
+
+        Returns:
+            ultralytics.YOLO: Modelo propio de este consumidor, sin tracks de usos anteriores.
+        """
+        if not model_path or not os.path.exists(model_path):
+            raise ValueError("Invalid YOLO model file path.")
+        backend = backend if backend is not None else self.registry.backend
+        key = (os.path.abspath(model_path), os.stat(model_path).st_mtime_ns, task, backend, imgsz)
+        if key != self.key:
+            self.model = self.registry.get(model_path, task=task, purpose='track', backend=backend, imgsz=imgsz)
+            self.key, self.backend = key, backend
+        else:
+            print(f"Reusing the tracking model: {os.path.basename(model_path)} ({backend.format})")
+            reset_tracker(self.model)
+        return self.model
+
+
+def get_model(model_path, task=None, purpose='predict', backend=None, imgsz=None):
+    """Atajo para `model_registry.get`."""
+    return model_registry.get(model_path, task=task, purpose=purpose, backend=backend, imgsz=imgsz)
+
+
+def model_lock(model):
+    """Atajo para `model_registry.lock_for`."""
+    return model_registry.lock_for(model)
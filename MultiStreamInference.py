@@ -0,0 +1,214 @@
+import time
+import threading
+import numpy as np
+import cv2
+from ModelRegistry import model_lock
+from InferenceBackend import max_batch_size, model_backend
+from CameraStream import LatestFrameGrabber, FpsMeter, draw_stream_overlay
+from TrackInterpolation import draw_detections
+from EventBus import ErrorEvent
+
+
+def create_tracker(tracker_cfg='bytetrack.yaml', frame_rate=30):
+    """
+    Crea un tracker de ultralytics independiente (BYTETracker o BOTSORT).
+
+    `model.track` guarda un único tracker en el predictor del modelo, así que
+    varias cámaras sobre el mismo modelo mezclarían sus tracks; cada cámara
+    usa en su lugar su propio tracker.
+
+    Args:
+        tracker_cfg (str): Configuración del tracker ('bytetrack.yaml', 'botsort.yaml' o una ruta).
+        frame_rate (int): FPS de la cámara (define cuánto tiempo sobrevive un track perdido).
+
+    Returns:
+        Tracker con `update(boxes, frame)`.
+    """
+    from ultralytics.utils import IterableSimpleNamespace, yaml_load
+    from ultralytics.utils.checks import check_yaml
+    from ultralytics.trackers.byte_tracker import BYTETracker
+    from ultralytics.trackers.bot_sort import BOTSORT
+
+    cfg = IterableSimpleNamespace(**yaml_load(check_yaml(tracker_cfg)))
+    tracker_class = BOTSORT if cfg.tracker_type == 'botsort' else BYTETracker
+    return tracker_class(args=cfg, frame_rate=frame_rate)
+
+
+class CameraStreamState:
+    """Estado de una cámara dentro de MultiStreamInference."""
+
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self.grabber = None
+        self.tracker = None
+        self.fps_meter = FpsMeter()
+        self.fps = 0.0
+        self.latency_ms = 0.0
+        self.frames = 0
+        self.tracks = 0
+
+
+class MultiStreamInference:
+    """
+    Detección con seguimiento sobre varias cámaras con un único modelo.
+
+    Cada cámara tiene su hilo de captura (LatestFrameGrabber) y su propio
+    tracker. Un solo hilo de inferencia reúne el último frame de cada cámara
+    que tenga uno nuevo, los pasa al modelo en un único lote y actualiza el
+    tracker de cada cámara con sus detecciones (en varias llamadas si el
+    backend no admite lotes, como TorchScript). Cada cámara tiene su propia
+    ventana de vista previa y sus propios FPS y latencia. Si la inferencia
+    falla, el error se guarda en `error`, se publica como ErrorEvent y se
+    liberan las cámaras.
+    """
+
+    def __init__(self, model, sources, conf=0.3, tracker_cfg='bytetrack.yaml', width=None, height=None,
+                 display=True, events=None, backend=None):
+        """
+        Inicializa el motor (las cámaras se abren en `start`).
+
+        Args:
+            model (ultralytics.YOLO): Modelo compartido (ver ModelRegistry).
+            sources (dict): Nombre de la cámara -> índice USB o URL.
+            conf (float): Umbral de confianza.
+            tracker_cfg (str): Configuración del tracker de cada cámara.
+            width (int): Ancho pedido a las cámaras (None = el de la cámara).
+            height (int): Alto pedido a las cámaras.
+            display (bool): Mostrar una ventana de OpenCV por cámara.
+            events (EventBus): Canal al que se envía el ErrorEvent si la inferencia falla (opcional).
+            backend (BackendOptions): Backend con el que se cargó el modelo (por defecto, el que
+                guardó `load_model` en el propio modelo).
+        """
+        self.model = model
+        self.streams = [CameraStreamState(name, source) for name, source in sources.items()]
+        self.conf = conf
+        self.tracker_cfg = tracker_cfg
+        self.width = width
+        self.height = height
+        self.display = display
+        self.events = events
+        self.max_batch = max_batch_size(backend if backend is not None else model_backend(model))
+        self.running = False
+        self.error = None  # Excepción que detuvo el hilo de inferencia, si la hubo
+        self.thread = None
+        self.batches = 0
+        self.batched_frames = 0
+        self.lock = threading.Lock()  # Protege las estadísticas que lee la interfaz
+        self.frame_ready = threading.Event()  # Lo activa cualquier cámara al capturar un frame
+
+    def start(self):
+        """Abre las cámaras e inicia el hilo de inferencia."""
+        for stream in self.streams:
+            cap = cv2.VideoCapture(stream.source)
+            if not cap.isOpened():
+                self.stop()
+                raise IOError(f"Could not open camera {stream.name} ({stream.source})")
+            if self.width and self.height:
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+            frame_rate = int(round(cap.get(cv2.CAP_PROP_FPS))) or 30
+            stream.tracker = create_tracker(self.tracker_cfg, frame_rate=frame_rate)
+            stream.grabber = LatestFrameGrabber(cap, name=f"capture-{stream.name}", new_frame_event=self.frame_ready)
+
+        self.running = True
+        self.thread = threading.Thread(target=self._inference_loop, name="multi-stream-inference", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Detiene la inferencia y libera las cámaras."""
+        self.running = False
+        if self.thread is not None and threading.current_thread() is not self.thread:
+            self.thread.join(timeout=5.0)
+        for stream in self.streams:
+            if stream.grabber is not None:
+                stream.grabber.release()
+                stream.grabber = None
+
+    def is_running(self):
+        return self.running
+
+    def stats(self):
+        """
+        Devuelve las estadísticas de cada cámara.
+
+        Returns:
+            dict: Nombre -> fps, latencia (ms), frames procesados, frames descartados en la captura y tracks activos.
+        """
+        with self.lock:
+            stats = {stream.name: {'fps': round(stream.fps, 1), 'latency_ms': round(stream.latency_ms, 1),
+                                   'frames': stream.frames, 'tracks': stream.tracks,
+                                   'dropped': stream.grabber.dropped if stream.grabber is not None else 0}
+                     for stream in self.streams}
+            stats['batch'] = {'batches': self.batches,
+                              'mean_size': round(self.batched_frames / self.batches, 2) if self.batches else 0.0}
+        return stats
+
+    def _collect_batch(self):
+        """Último frame nuevo de cada cámara; si ninguna tiene uno, espera al de cualquiera de ellas."""
+        # Se desactiva antes de mirar: un frame que llegue mientras tanto la vuelve a activar
+        self.frame_ready.clear()
+        batch = []
+        for stream in self.streams:
+            ok, frame, captured_at = stream.grabber.read(timeout=0)
+            if ok:
+                batch.append((stream, frame, captured_at))
+        if not batch:
+            # Sin ocupar la CPU, aunque alguna cámara haya fallado; el tope deja ver `running` a menudo
+            self.frame_ready.wait(timeout=0.1)
+        return batch
+
+    def _inference_loop(self):
+        names = self.model.names
+        try:
+            while self.running:
+                if all(stream.grabber.failed for stream in self.streams):
+                    break
+                batch = self._collect_batch()
+                if not batch:
+                    continue
+
+                # Un único lote con el último frame de cada cámara (troceado si el backend tiene límite)
+                frames = [frame for _, frame, _ in batch]
+                step = self.max_batch or len(frames)
+                results = []
+                with model_lock(self.model):
+                    for start in range(0, len(frames), step):
+                        results.extend(self.model.predict(frames[start:start + step], conf=self.conf, verbose=False))
+
+                for (stream, frame, captured_at), result in zip(batch, results):
+                    boxes = result.boxes.cpu().numpy()
+                    detections = np.zeros((0, 7), dtype=np.float32)
+                    if len(boxes):
+                        tracks = stream.tracker.update(boxes, frame)
+                        if len(tracks):
+                            detections = tracks[:, :7].astype(np.float32)  # xyxy, id, conf, cls
+
+                    annotated = draw_detections(frame.copy(), detections, names)
+                    fps = stream.fps_meter.tick()
+                    latency_ms = (time.perf_counter() - captured_at) * 1000
+                    with self.lock:
+                        stream.fps, stream.latency_ms = fps, latency_ms
+                        stream.frames += 1
+                        stream.tracks = len(detections)
+                    if self.display:
+                        draw_stream_overlay(annotated, [f"{stream.name}", f"Latency: {latency_ms:.0f} ms",
+                                                        f"FPS: {fps:.1f}", f"Dropped: {stream.grabber.dropped}"])
+                        cv2.imshow(f"Camera {stream.name}", annotated)
+
+                with self.lock:
+                    self.batches += 1
+                    self.batched_frames += len(batch)
+
+                # Salir al presionar 'q' en cualquiera de las ventanas
+                if self.display and cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+        except Exception as e:
+            self.error = e
+            print(f"Multi-camera inference error: {e}")
+            if self.events is not None:
+                self.events.publish(ErrorEvent('inference', f"Multi-camera inference stopped: {e}"))
+        finally:
+            self.stop()  # Desde el propio hilo no espera: solo marca el fin y libera las cámaras
+            if self.display:
+                cv2.destroyAllWindows()
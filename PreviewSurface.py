@@ -0,0 +1,109 @@
+import threading
+import cv2
+
+
+class PreviewSurface:
+    """
+    Vista previa de imágenes sobre una figura de matplotlib embebida en Tkinter.
+
+    Mantiene un único `AxesImage` y solo actualiza sus datos, en lugar de
+    limpiar la figura y crear ejes nuevos en cada imagen. Los hilos de trabajo
+    llaman a `submit`, que solo guarda la última imagen; el bucle principal de
+    Tk la dibuja como mucho `max_fps` veces por segundo y descarta las que
+    llegan entre dos redibujados.
+    """
+
+    def __init__(self, master, fig, canvas, max_fps=5):
+        """
+        Inicializa la vista previa.
+
+        Args:
+            master (tk.Widget): Ventana cuyo bucle principal dibuja la vista previa.
+            fig (matplotlib.figure.Figure): Figura donde se dibuja.
+            canvas (FigureCanvasTkAgg): Canvas de la figura.
+            max_fps (float): Máximo de redibujados por segundo.
+        """
+        if max_fps <= 0:
+            raise ValueError("max_fps must be positive.")
+
+        self.master = master
+        self.fig = fig
+        self.canvas = canvas
+        self.interval_ms = max(1, int(1000 / max_fps))
+        self.lock = threading.Lock()
+        self.pending = None  # Última imagen recibida y aún no dibujada
+        self.artist = None
+        self.ax = None
+        self.dropped = 0  # Imágenes descartadas por llegar entre dos redibujados
+        self.drawn = 0
+        self.after_id = self.master.after(self.interval_ms, self._poll)
+
+    def submit(self, image):
+        """
+        Ofrece una imagen para mostrar. Se puede llamar desde cualquier hilo.
+
+        Args:
+            image (np.ndarray): Imagen RGB o en escala de grises (uint8).
+        """
+        with self.lock:
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = image
+
+    def clear(self):
+        """Vacía la vista previa. Debe llamarse desde el hilo de Tk."""
+        with self.lock:
+            self.pending = None
+        self.fig.clear()
+        self.ax = None
+        self.artist = None
+        self.canvas.draw_idle()
+
+    def close(self):
+        """Detiene el redibujado periódico."""
+        if self.after_id is not None:
+            self.master.after_cancel(self.after_id)
+            self.after_id = None
+
+    def _poll(self):
+        with self.lock:
+            image, self.pending = self.pending, None
+        if image is not None:
+            self._draw(image)
+        self.after_id = self.master.after(self.interval_ms, self._poll)
+
+    def _fit_to_widget(self, image):
+        """Reducir la imagen al tamaño del widget; matplotlib no necesita más píxeles."""
+        widget = self.canvas.get_tk_widget()
+        width, height = widget.winfo_width(), widget.winfo_height()
+        if width <= 1 or height <= 1:  # El widget aún no se ha dibujado
+            return image
+
+        scale = min(width / image.shape[1], height / image.shape[0])
+        if scale >= 1:
+            return image
+        size = (max(1, int(image.shape[1] * scale)), max(1, int(image.shape[0] * scale)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    def _draw(self, image):
+        image = self._fit_to_widget(image)
+        height, width = image.shape[:2]
+
+        previous_shape = None if self.artist is None else self.artist.get_array().shape
+        if previous_shape is None or len(previous_shape) != image.ndim:
+            # Primera imagen, o cambio entre color y escala de grises: crear el artista
+            self.fig.clear()
+            self.ax = self.fig.add_subplot(111)
+            if image.ndim == 2:
+                self.artist = self.ax.imshow(image, cmap='gray', vmin=0, vmax=255)
+            else:
+                self.artist = self.ax.imshow(image)
+        else:
+            self.artist.set_data(image)
+            if previous_shape[:2] != (height, width):
+                self.artist.set_extent((-0.5, width - 0.5, height - 0.5, -0.5))
+                self.ax.set_xlim(-0.5, width - 0.5)
+                self.ax.set_ylim(height - 0.5, -0.5)
+
+        self.canvas.draw_idle()
+        self.drawn += 1
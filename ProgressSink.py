@@ -0,0 +1,181 @@
+import sys
+import json
+import time
+from EventBus import ProgressEvent, PreviewEvent, LogEvent, StageDoneEvent
+
+
+class NullProgress:
+    """Destino de progreso que lo descarta todo (sin coste por imagen); los mensajes de `log` van a la consola."""
+
+    def update(self, stage, done, total):
+        """
+        Informa del avance de una etapa.
+
+        Args:
+            stage (str): Nombre de la etapa ('segmentation', nombre del video...).
+            done (int): Elementos terminados.
+            total (int): Elementos totales (0 si se desconoce).
+        """
+
+    def preview(self, image):
+        """
+        Ofrece una imagen de vista previa (RGB o escala de grises).
+
+        Args:
+            image (np.ndarray): Imagen a mostrar.
+        """
+
+    def log(self, message):
+        """
+        Escribe un mensaje del pipeline para el usuario.
+
+        Args:
+            message (str): Línea de texto.
+        """
+        print(message)
+
+    def stage_done(self, stage, **info):
+        """
+        Informa de que una etapa ha terminado.
+
+        Args:
+            stage (str): Nombre de la etapa.
+            **info: Datos adicionales (salidas, tiempos...).
+        """
+
+
+class StderrProgress(NullProgress):
+    """Escribe el progreso en stderr, como mucho una línea por punto porcentual."""
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stderr
+        self.last_percent = {}
+
+    def update(self, stage, done, total):
+        percent = int(done * 100 / total) if total else done
+        if self.last_percent.get(stage) == percent:
+            return
+        self.last_percent[stage] = percent
+        if total:
+            self.stream.write(f"[{stage}] {done}/{total} ({percent}%)\n")
+        else:
+            self.stream.write(f"[{stage}] {done}\n")
+        self.stream.flush()
+
+    def stage_done(self, stage, **info):
+        details = " ".join(f"{key}={value}" for key, value in info.items())
+        self.stream.write(f"[{stage}] done {details}\n".rstrip() + "\n")
+        self.stream.flush()
+
+
+class JsonLinesProgress(NullProgress):
+    """
+    Escribe cada evento de progreso como una línea JSON, para otras herramientas.
+
+    Por defecto usa stderr para no mezclarse con los mensajes que los
+    pipelines y ultralytics escriben en stdout.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stderr
+
+    def _emit(self, event):
+        event['time'] = time.time()
+        self.stream.write(json.dumps(event, default=str) + "\n")
+        self.stream.flush()
+
+    def update(self, stage, done, total):
+        self._emit({'event': 'progress', 'stage': stage, 'done': done, 'total': total})
+
+    def stage_done(self, stage, **info):
+        self._emit({'event': 'stage_done', 'stage': stage, **info})
+
+
+class TkProgress(NullProgress):
+    """Envía el progreso a una ventana de Tkinter (barra de progreso y canvas)."""
+
+    def __init__(self, window):
+        """
+        Args:
+            window: Ventana con `display_image_on_canvas`, `progress_var` y `master`.
+        """
+        self.window = window
+
+    def update(self, stage, done, total):
+        if total:
+            self.window.progress_var.set(done / total * 100)
+        self.window.master.update_idletasks()
+
+    def preview(self, image):
+        self.window.display_image_on_canvas(image)
+
+
+class BusProgress(NullProgress):
+    """Publica el progreso en un EventBus; la interfaz lo recoge desde su bucle principal."""
+
+    def __init__(self, bus):
+        """
+        Args:
+            bus (EventBus): Canal de eventos de la ventana.
+        """
+        self.bus = bus
+
+    def update(self, stage, done, total):
+        self.bus.publish(ProgressEvent(stage, done, total))
+
+    def preview(self, image):
+        self.bus.publish(PreviewEvent(image))
+
+    def log(self, message):
+        self.bus.publish(LogEvent(message))
+
+    def stage_done(self, stage, **info):
+        self.bus.publish(StageDoneEvent(stage, info))
+
+
+class QueueProgress(NullProgress):
+    """
+    Envía el progreso de un proceso hijo al padre a través de una cola.
+
+    Las vistas previas no se envían: copiar imágenes entre procesos costaría
+    más que mostrarlas. El padre entrega los mensajes a su propio destino
+    con `replay_progress`.
+    """
+
+    def __init__(self, queue):
+        """
+        Args:
+            queue: Cola compartida entre procesos (por ejemplo, de `multiprocessing.Manager`).
+        """
+        self.queue = queue
+
+    def update(self, stage, done, total):
+        self.queue.put(('update', stage, done, total))
+
+    def log(self, message):
+        self.queue.put(('log', message))
+
+    def stage_done(self, stage, **info):
+        self.queue.put(('stage_done', stage, info))
+
+
+def replay_progress(message, progress):
+    """Entrega a `progress` un mensaje recibido de un QueueProgress."""
+    if message[0] == 'update':
+        progress.update(*message[1:])
+    elif message[0] == 'log':
+        progress.log(message[1])
+    elif message[0] == 'stage_done':
+        progress.stage_done(message[1], **message[2])
+
+
+PROGRESS_SINKS = {'none': NullProgress, 'stderr': StderrProgress, 'jsonl': JsonLinesProgress}
+
+
+def progress_for(main_window):
+    """Devuelve el destino de progreso de una ventana, o uno nulo si no hay ventana."""
+    if main_window is None:
+        return NullProgress()
+    if getattr(main_window, 'events', None) is not None:
+        return BusProgress(main_window.events)
+    return TkProgress(main_window)
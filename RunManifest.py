@@ -0,0 +1,122 @@
+import os
+import json
+
+
+class RunManifest:
+    """
+    Manifiesto persistente de una carpeta de salida.
+
+    Guarda, por cada imagen procesada, las filas que generó cada vista. Una
+    entrada solo se reutiliza si coinciden la ruta, el tamaño y la fecha de
+    modificación de la imagen, el hash del modelo y el umbral de confianza.
+
+    El archivo es JSON Lines y solo se le añaden líneas, de modo que una
+    ejecución interrumpida conserva todo lo registrado hasta ese momento y la
+    siguiente continúa donde se quedó. `compact` lo reescribe al terminar.
+    """
+
+    FILENAME = "run_manifest.jsonl"
+
+    def __init__(self, output_folder, model_hash, conf):
+        """
+        Carga el manifiesto de la carpeta de salida, si existe.
+
+        Args:
+            output_folder (str): Carpeta donde se guardan las salidas y el manifiesto.
+            model_hash (str): Hash de los pesos del modelo.
+            conf (float): Umbral de confianza de la predicción.
+        """
+        self.path = os.path.join(output_folder, self.FILENAME)
+        self.model_hash = model_hash
+        self.conf = conf
+        self.entries = {}  # Ruta absoluta de la imagen -> entrada
+        self.load()
+
+    def load(self):
+        """Lee el manifiesto, ignorando una última línea incompleta."""
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Línea cortada por una ejecución interrumpida
+                self.entries[entry['key']['path']] = entry
+
+    def image_key(self, image_path):
+        """
+        Construye la clave de una imagen con su estado actual en disco.
+
+        Args:
+            image_path (str): Ruta a la imagen.
+
+        Returns:
+            dict: Ruta, tamaño, fecha de modificación, hash del modelo y umbral.
+        """
+        stat = os.stat(image_path)
+        return {'path': os.path.abspath(image_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                'model_hash': self.model_hash, 'conf': self.conf}
+
+    def lookup(self, image_path, view_keys):
+        """
+        Devuelve las filas guardadas de una imagen si siguen siendo válidas.
+
+        Args:
+            image_path (str): Ruta a la imagen.
+            view_keys (list): Claves de las vistas que deben estar presentes.
+
+        Returns:
+            dict or None: Filas por vista, o None si hay que procesar la imagen.
+        """
+        entry = self.entries.get(os.path.abspath(image_path))
+        if entry is None or entry['key'] != self.image_key(image_path):
+            return None
+        if not all(view_key in entry['rows'] for view_key in view_keys):
+            return None
+        return entry['rows']
+
+    def record(self, items):
+        """
+        Añade entradas al manifiesto y las lleva a disco.
+
+        Si la imagen ya tenía una entrada válida, las filas nuevas se combinan
+        con las de las otras vistas en lugar de reemplazarlas.
+
+        Args:
+            items (list): Pares (image_path, filas por vista).
+        """
+        if not items:
+            return
+
+        # Cerrar una línea cortada por una ejecución interrumpida antes de añadir más
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                broken_line = f.read(1) != b"\n"
+        else:
+            broken_line = False
+
+        with open(self.path, 'a') as f:
+            if broken_line:
+                f.write("\n")
+            for image_path, rows in items:
+                key = self.image_key(image_path)
+                previous = self.entries.get(key['path'])
+                if previous is not None and previous['key'] == key:
+                    rows = {**previous['rows'], **rows}
+                entry = {'key': key, 'rows': rows}
+                self.entries[entry['key']['path']] = entry
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self):
+        """Reescribe el manifiesto con una sola entrada por imagen que aún existe."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            for path, entry in self.entries.items():
+                if os.path.exists(path):
+                    f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,331 @@
+import os
+import time
+import numpy as np
+from PIL import Image
+from ImageLoader import PrefetchImageLoader
+from ImageWriter import AsyncImageWriter
+from ModelRegistry import get_model, model_lock, model_registry
+from RunManifest import RunManifest
+from InferenceBackend import max_batch_size, model_backend
+from ProgressSink import NullProgress
+from Instrumentation import NULL_INSTRUMENTATION, DECODE, RESIZE, INFERENCE, POSTPROCESS, DISK_WRITE, GUI_UPDATE
+
+
+class SegmentationEngine:
+    """
+    Motor de segmentación de una sola pasada.
+
+    Decodifica cada imagen una vez, ejecuta la inferencia una vez y entrega el
+    mismo objeto `Results` a todas las vistas registradas (detector, máscaras,
+    bounding boxes). Cada vista construye sus propias salidas a partir de ese
+    resultado, evitando recorrer la carpeta y cargar el modelo varias veces.
+    """
+
+    SUPPORTED_FORMATS = ('.jpg', '.jpeg', '.png')  # Formatos de imagen soportados
+    IMAGE_SIZE = (800, 608)  # Tamaño (ancho, alto) de entrada al modelo
+
+    STAGE = 'segmentation'  # Nombre de la etapa en los informes de progreso
+
+    def __init__(self, model_path, input_folder, progress=None, conf=0.3, batch_size=1,
+                 loader_workers=4, prefetch=8, writer_workers=2, png_compression=1,
+                 output_folder=None, checkpoint_every=32, verbose=True, instrumentation=None):
+        """
+        Inicializa el motor de segmentación.
+
+        Args:
+            model_path (str): Ruta al archivo del modelo YOLOv8.
+            input_folder (str): Carpeta con las imágenes de entrada.
+            progress: Destino del progreso y de la vista previa (ver ProgressSink); nulo por defecto.
+            conf (float): Umbral de confianza de la predicción.
+            batch_size (int): Número de imágenes agrupadas en cada llamada a `predict`
+                (se reduce al máximo que admita el backend, p. ej. 1 con TorchScript).
+            loader_workers (int): Hilos que decodifican y redimensionan las imágenes.
+            prefetch (int): Imágenes que se preparan por adelantado mientras el modelo trabaja.
+            writer_workers (int): Hilos que codifican y guardan las imágenes de salida.
+            png_compression (int): Nivel de compresión PNG de las salidas (0-9).
+            output_folder (str): Carpeta de salida donde se guarda el manifiesto de la ejecución.
+                Si se indica, las imágenes que no han cambiado se saltan y se reutilizan sus filas.
+            checkpoint_every (int): Imágenes procesadas entre dos escrituras del manifiesto.
+            verbose (bool): Mostrar la salida por imagen de ultralytics.
+            instrumentation (Instrumentation): Tiempos por tramo; su resumen se guarda junto a las salidas.
+                Desactivada por defecto.
+        """
+        if not model_path or not os.path.exists(model_path):
+            raise ValueError("Invalid YOLO model file path.")
+
+        if not input_folder or not os.path.exists(input_folder):
+            raise ValueError("Invalid input folder path.")
+
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1.")
+
+        self.model_path = model_path
+        self.progress = progress if progress is not None else NullProgress()
+        self.model = get_model(self.model_path, backend=model_registry.backend)
+        self.backend = model_backend(self.model)  # El que se cargó de verdad (eager si la exportación falló)
+        self.max_batch = max_batch_size(self.backend)
+        if self.max_batch is not None and batch_size > self.max_batch:
+            self.progress.log(f"Warning: the {self.backend.format} backend only accepts batches of {self.max_batch}; "
+                              f"using batch size {self.max_batch} instead of {batch_size}.")
+            batch_size = self.max_batch
+        self.input_folder = input_folder
+        self.conf = conf
+        self.batch_size = batch_size
+        self.loader_workers = loader_workers
+        # Al menos un lote completo debe estar listo cuando termine la inferencia anterior
+        self.prefetch = max(prefetch, batch_size)
+        self.writer_workers = writer_workers
+        self.png_compression = png_compression
+        self.output_folder = output_folder
+        self.checkpoint_every = checkpoint_every
+        self.verbose = verbose
+        self.instrumentation = instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
+
+    def list_images(self):
+        """
+        Lista los archivos de imagen soportados de la carpeta de entrada.
+
+        Returns:
+            list: Nombres de archivo en el orden de `os.listdir`.
+        """
+        return [f for f in os.listdir(self.input_folder) if f.endswith(self.SUPPORTED_FORMATS)]
+
+    def load_image(self, image_path):
+        """
+        Decodifica y redimensiona una imagen al tamaño de entrada del modelo.
+
+        Args:
+            image_path (str): Ruta a la imagen.
+
+        Returns:
+            np.ndarray: Imagen RGB de tamaño `IMAGE_SIZE`.
+        """
+        with self.instrumentation.span(DECODE):
+            original_image = Image.open(image_path).convert('RGB')  # Descarta el canal alfa de los PNG
+        with self.instrumentation.span(RESIZE):
+            resized_image = original_image.resize(self.IMAGE_SIZE)
+            return np.array(resized_image)
+
+    def iter_batches(self, image_files):
+        """
+        Decodifica las imágenes en segundo plano y las agrupa en lotes de `batch_size`.
+
+        Args:
+            image_files (list): Nombres de archivo a procesar.
+
+        Yields:
+            list: Pares (image_file, image); el último lote puede ser más corto.
+        """
+        loader = PrefetchImageLoader(self.input_folder, image_files, self.load_image,
+                                     num_workers=self.loader_workers, prefetch=self.prefetch)
+        batch = []
+        for image_file, image in loader:
+            batch.append((image_file, image))
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+    def predict_batch(self, batch):
+        """
+        Ejecuta una sola llamada a `predict` para todo el lote.
+
+        Args:
+            batch (list): Pares (image_file, image).
+
+        Returns:
+            list: Un `Results` por imagen, en el mismo orden que el lote.
+        """
+        images = [image for _, image in batch]
+        with model_lock(self.model), self.instrumentation.span(INFERENCE):
+            return self.model.predict(images, conf=self.conf, verbose=self.verbose)
+
+    def run(self, views):
+        """
+        Recorre la carpeta una sola vez y entrega cada resultado a las vistas.
+
+        Cada vista implementa `handle_result(image_file, image, result, writer)`,
+        que encola sus imágenes en `writer` y puede devolver una imagen para
+        mostrar en el canvas, y `finish()`, que se llama al terminar la carpeta,
+        una vez escritas todas las imágenes.
+
+        Si la vista tiene `span_name`, su trabajo se mide con ese nombre de tramo
+        en lugar de 'postprocess'.
+
+        Para el manifiesto, cada vista tiene además una clave `manifest_key`,
+        `manifest_rows()`, que devuelve las filas de la última imagen procesada,
+        y `restore_rows(image_file, rows)`, que recupera las filas guardadas.
+
+        Args:
+            views (list): Vistas que consumen los resultados de la inferencia.
+        """
+        image_files = self.list_images()
+        total_images = len(image_files)
+
+        if total_images == 0:
+            self.progress.log("No se encontraron imágenes en la carpeta.")
+            return
+
+        manifest = None
+        processed = 0
+        if self.output_folder is not None:
+            # Un backend exportado (sobre todo int8) puede dar resultados algo distintos: cuenta como otro modelo
+            model_hash = model_registry.file_hash(self.model_path)
+            if self.backend.format != 'eager':
+                model_hash += f"-{self.backend.format}{self.backend.imgsz}{'-int8' if self.backend.int8 else ''}"
+            manifest = RunManifest(self.output_folder, model_hash, self.conf)
+            image_files = self.restore_unchanged(manifest, image_files, views)
+            processed = total_images - len(image_files)
+            if processed:
+                self.progress.log(f"Skipping {processed} unchanged images found in {manifest.path}")
+
+        pending = []  # Imágenes procesadas que aún no están en el manifiesto
+        start_time = time.perf_counter()
+        writer = AsyncImageWriter(num_workers=self.writer_workers, png_compression=self.png_compression,
+                                  instrumentation=self.instrumentation)
+        try:
+            for batch in self.iter_batches(image_files):
+                # Una única inferencia por lote para todas las vistas
+                results = self.predict_batch(batch)
+                if not results:
+                    self.progress.log(f"No results for batch starting at {batch[0][0]}, skipping...")
+                    processed += len(batch)
+                    continue
+
+                preview = None
+                for (image_file, image), result in zip(batch, results):
+                    for view in views:
+                        with self.instrumentation.span(getattr(view, 'span_name', POSTPROCESS)):
+                            view_preview = view.handle_result(image_file, image, result, writer)
+                        if view_preview is not None:
+                            preview = view_preview
+                    if manifest is not None:
+                        pending.append((image_file, {view.manifest_key: view.manifest_rows() for view in views}))
+
+                # Registrar en el manifiesto solo lo que ya está escrito en disco
+                if manifest is not None and len(pending) >= self.checkpoint_every:
+                    self.record_pending(manifest, pending, writer.flush())
+                    pending = []
+
+                processed += len(batch)
+                # Una sola vista previa por lote, con la salida de la última vista
+                with self.instrumentation.span(GUI_UPDATE):
+                    if preview is not None:
+                        self.progress.preview(preview)
+                    self.progress.update(self.STAGE, processed, total_images)
+        finally:
+            # Barrera: todas las imágenes quedan en disco antes de cerrar la etapa
+            errors = writer.close()
+            if manifest is not None:
+                self.record_pending(manifest, pending, errors)
+
+        if manifest is not None:
+            manifest.compact()
+
+        elapsed = time.perf_counter() - start_time
+        self.progress.log(f"Processed {processed} images in {elapsed:.1f}s "
+                          f"({processed / max(elapsed, 1e-9):.2f} images/s, batch size {self.batch_size})")
+
+        for view in views:
+            with self.instrumentation.span(DISK_WRITE):  # Los CSV y JSON de cada vista
+                view.finish()
+
+        summary_folder = self.output_folder or getattr(views[0], 'output_folder', None)
+        if summary_folder is not None:
+            self.instrumentation.write_summary(summary_folder, input_folder=self.input_folder, images=processed,
+                                               batch_size=self.batch_size)
+        self.progress.stage_done(self.STAGE, images=processed, seconds=round(elapsed, 3))
+
+    def restore_unchanged(self, manifest, image_files, views):
+        """
+        Entrega a las vistas las filas guardadas de las imágenes que no han cambiado.
+
+        Args:
+            manifest (RunManifest): Manifiesto de la carpeta de salida.
+            image_files (list): Nombres de archivo de la carpeta.
+            views (list): Vistas de la ejecución.
+
+        Returns:
+            list: Nombres de archivo que hay que procesar.
+        """
+        view_keys = [view.manifest_key for view in views]
+        remaining = []
+        for image_file in image_files:
+            rows = manifest.lookup(os.path.join(self.input_folder, image_file), view_keys)
+            if rows is None:
+                remaining.append(image_file)
+                continue
+            for view in views:
+                view.restore_rows(image_file, rows[view.manifest_key])
+        return remaining
+
+    def record_pending(self, manifest, pending, errors):
+        """
+        Registra en el manifiesto las imágenes cuyas salidas se escribieron bien.
+
+        Args:
+            manifest (RunManifest): Manifiesto de la carpeta de salida.
+            pending (list): Pares (image_file, filas por vista).
+            errors (list): Escrituras fallidas devueltas por `AsyncImageWriter`.
+        """
+        failed = {tag for _, _, tag in errors}
+        manifest.record([(os.path.join(self.input_folder, image_file), rows)
+                         for image_file, rows in pending if image_file not in failed])
+
+    def benchmark_batch_sizes(self, batch_sizes=(1, 2, 4, 8), max_images=32):
+        """
+        Mide el rendimiento de la inferencia (imágenes/s) para varios tamaños de lote.
+
+        Solo se cronometra `predict`; las imágenes se decodifican antes y se
+        descarta una primera llamada de calentamiento.
+
+        Args:
+            batch_sizes (tuple): Tamaños de lote a probar.
+            max_images (int): Número máximo de imágenes de la carpeta a usar.
+
+        Returns:
+            dict: Imágenes/s por tamaño de lote.
+        """
+        if self.max_batch is not None:
+            batch_sizes = [size for size in batch_sizes if size <= self.max_batch] or [self.max_batch]
+        images = []
+        for image_file in self.list_images()[:max_images]:
+            images.append(self.load_image(os.path.join(self.input_folder, image_file)))
+
+        if not images:
+            self.progress.log("No se encontraron imágenes en la carpeta.")
+            return {}
+
+        throughput = {}
+        with model_lock(self.model):
+            self.model.predict(images[0], conf=self.conf, verbose=False)  # Calentamiento
+
+            for batch_size in batch_sizes:
+                start_time = time.perf_counter()
+                for start in range(0, len(images), batch_size):
+                    self.model.predict(images[start:start + batch_size], conf=self.conf, verbose=False)
+                elapsed = time.perf_counter() - start_time
+                throughput[batch_size] = len(images) / max(elapsed, 1e-9)
+                self.progress.log(f"Batch size {batch_size}: {throughput[batch_size]:.2f} images/s")
+
+        return throughput
+
+    def choose_batch_size(self, batch_sizes=(1, 2, 4, 8), max_images=32):
+        """
+        Mide los tamaños de lote con `benchmark_batch_sizes` y usa el más rápido en `run`.
+
+        Args:
+            batch_sizes (tuple): Tamaños de lote a probar.
+            max_images (int): Número máximo de imágenes de la carpeta a usar.
+
+        Returns:
+            int: Tamaño de lote elegido (el actual si no hay imágenes que medir).
+        """
+        throughput = self.benchmark_batch_sizes(batch_sizes, max_images)
+        if throughput:
+            self.batch_size = max(throughput, key=throughput.get)
+            self.prefetch = max(self.prefetch, self.batch_size)
+            self.progress.log(f"Using batch size {self.batch_size}")
+        return self.batch_size
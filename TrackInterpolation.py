@@ -0,0 +1,277 @@
+import numpy as np
+import cv2
+
+# Columnas de las detecciones por frame: x1, y1, x2, y2, track_id (-1 sin id), conf, cls
+DETECTION_COLUMNS = ['x1', 'y1', 'x2', 'y2', 'track_id', 'conf', 'cls']
+
+
+def detections_from_result(result):
+    """
+    Convierte un resultado de YOLO en un array (N, 7) con las columnas de DETECTION_COLUMNS.
+
+    Args:
+        result (ultralytics.engine.results.Results): Resultado de `predict` o `track`.
+
+    Returns:
+        np.ndarray: Detecciones del frame (float32); vacío si no hay cajas.
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return np.zeros((0, 7), dtype=np.float32)
+
+    detections = np.empty((len(boxes), 7), dtype=np.float32)
+    detections[:, :4] = boxes.xyxy.cpu().numpy()
+    detections[:, 4] = boxes.id.cpu().numpy() if boxes.id is not None else -1
+    detections[:, 5] = boxes.conf.cpu().numpy()
+    detections[:, 6] = boxes.cls.cpu().numpy()
+    return detections
+
+
+def _color_for(track_id, cls):
+    """Color estable por track (o por clase si no hay id), para que la caja no parpadee."""
+    seed = int(track_id) if track_id >= 0 else int(cls)
+    rng = np.random.default_rng(seed + 1)
+    return tuple(int(c) for c in rng.integers(64, 256, size=3))
+
+
+def draw_detections(frame, detections, names=None, line_width=2, polygons=None):
+    """
+    Dibuja cajas, clase, id y confianza sobre el frame (en el sitio).
+
+    Args:
+        frame (np.ndarray): Imagen BGR.
+        detections (np.ndarray): Array (N, 7) como el de `detections_from_result`.
+        names (dict): Índice de clase -> nombre (`model.names`).
+        line_width (int): Grosor de las cajas.
+        polygons (list): Contornos de las máscaras (arrays (K, 2)), en el mismo orden y coordenadas que las cajas.
+
+    Returns:
+        np.ndarray: El mismo frame, con las detecciones dibujadas.
+    """
+    for i, (x1, y1, x2, y2, track_id, conf, cls) in enumerate(detections):
+        color = _color_for(track_id, cls)
+        if polygons is not None and i < len(polygons) and len(polygons[i]):
+            cv2.polylines(frame, [np.round(polygons[i]).astype(np.int32)], True, color, line_width, cv2.LINE_AA)
+        label = names.get(int(cls), str(int(cls))) if names else str(int(cls))
+        if track_id >= 0:
+            label = f"id:{int(track_id)} {label}"
+        label = f"{label} {conf:.2f}"
+
+        p1, p2 = (int(x1), int(y1)), (int(x2), int(y2))
+        cv2.rectangle(frame, p1, p2, color, line_width, cv2.LINE_AA)
+        (text_w, text_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        top = max(p1[1], text_h + 4)
+        cv2.rectangle(frame, (p1[0], top - text_h - 4), (p1[0] + text_w, top), color, -1, cv2.LINE_AA)
+        cv2.putText(frame, label, (p1[0], top - 2), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1, cv2.LINE_AA)
+    return frame
+
+
+def interpolate_detections(start, end, t):
+    """
+    Interpola linealmente las detecciones entre dos frames con detección.
+
+    Los tracks presentes en ambos extremos se interpolan por id. Los que solo
+    están en uno (o no tienen id) se mantienen desde el extremo más cercano,
+    así un objeto que entra o sale no aparece ni desaparece antes de tiempo.
+
+    Args:
+        start (np.ndarray): Detecciones del frame con detección anterior.
+        end (np.ndarray): Detecciones del frame con detección siguiente.
+        t (float): Posición entre ambos (0 = start, 1 = end).
+
+    Returns:
+        np.ndarray: Detecciones (N, 7) del frame intermedio.
+    """
+    start_ids = start[:, 4]
+    end_ids = end[:, 4]
+    common = np.intersect1d(start_ids[start_ids >= 0], end_ids[end_ids >= 0])
+
+    start_common = start[np.isin(start_ids, common)]
+    end_common = end[np.isin(end_ids, common)]
+    start_common = start_common[np.argsort(start_common[:, 4])]
+    end_common = end_common[np.argsort(end_common[:, 4])]
+
+    interpolated = start_common.copy()
+    interpolated[:, :4] = (1 - t) * start_common[:, :4] + t * end_common[:, :4]
+    interpolated[:, 5] = (1 - t) * start_common[:, 5] + t * end_common[:, 5]
+
+    # Tracks sin pareja (o sin id): se toman del extremo más cercano
+    unmatched = start[~np.isin(start_ids, common)] if t < 0.5 else end[~np.isin(end_ids, common)]
+    return np.concatenate([interpolated, unmatched])
+
+
+def _motion(start, end, gap):
+    """Desplazamiento medio por frame de los tracks comunes, relativo al tamaño de su caja."""
+    common = np.intersect1d(start[start[:, 4] >= 0, 4], end[end[:, 4] >= 0, 4])
+    if len(common) == 0 or gap <= 0:
+        return 0.0
+    a = start[np.isin(start[:, 4], common)]
+    b = end[np.isin(end[:, 4], common)]
+    a = a[np.argsort(a[:, 4])]
+    b = b[np.argsort(b[:, 4])]
+    centers_a = (a[:, :2] + a[:, 2:4]) / 2
+    centers_b = (b[:, :2] + b[:, 2:4]) / 2
+    size = np.maximum(np.hypot(a[:, 2] - a[:, 0], a[:, 3] - a[:, 1]), 1.0)
+    return float(np.mean(np.hypot(*(centers_b - centers_a).T) / size) / gap)
+
+
+class StrideTracker:
+    """
+    Ejecuta el detector solo en uno de cada `stride` frames e interpola el resto.
+
+    Los frames intermedios se retienen hasta el siguiente frame con detección
+    y entonces se entregan todos, en orden, con sus cajas interpoladas por id
+    de track. Así cada frame del video tiene sus detecciones. Con
+    `adaptive=True` el paso se reduce a la mitad cuando cambia el número de
+    tracks o hay mucho movimiento, y crece de uno en uno hasta `max_stride`
+    cuando la escena está quieta.
+    """
+
+    def __init__(self, detect, stride=1, adaptive=False, max_stride=None,
+                 motion_high=0.05, motion_low=0.01):
+        """
+        Inicializa el interpolador.
+
+        Args:
+            detect (callable): Recibe un frame y devuelve (detecciones (N, 7), resultado de YOLO).
+            stride (int): Frames entre dos detecciones (1 = detectar en todos).
+            adaptive (bool): Ajustar el paso según el movimiento y el número de tracks.
+            max_stride (int): Paso máximo en modo adaptativo (por defecto, `stride`).
+            motion_high (float): Movimiento por frame (relativo a la caja) a partir del cual se reduce el paso.
+            motion_low (float): Movimiento por frame por debajo del cual se aumenta el paso.
+        """
+        if stride < 1:
+            raise ValueError("stride must be at least 1.")
+
+        self.detect = detect
+        self.stride = stride
+        self.adaptive = adaptive
+        self.max_stride = max(max_stride or stride, stride)
+        self.motion_high = motion_high
+        self.motion_low = motion_low
+        self.keyframe = None  # (frame_index, detecciones) del último frame con detección
+        self.pending = []  # (frame_index, frame) retenidos hasta el siguiente frame con detección
+        self.detections_run = 0
+
+    def push(self, frame_index, frame, source=None):
+        """
+        Recibe el siguiente frame del video.
+
+        Args:
+            frame_index (int): Posición del frame en el video.
+            frame (np.ndarray): Frame que se entregará para codificar.
+            source (np.ndarray): Imagen sobre la que detectar, si no es el propio frame
+                (por ejemplo, una versión reducida para la inferencia).
+
+        Returns:
+            list: Tuplas (frame_index, frame, detecciones, resultado) listas para codificar;
+            `resultado` es el de YOLO en los frames con detección y None en los interpolados.
+        """
+        if self.keyframe is not None and frame_index - self.keyframe[0] < self.stride:
+            self.pending.append((frame_index, frame))
+            return []
+
+        detections, result = self.detect(frame if source is None else source)
+        self.detections_run += 1
+        ready = []
+        if self.keyframe is not None:
+            start_index, start = self.keyframe
+            gap = frame_index - start_index
+            for index, pending_frame in self.pending:
+                t = (index - start_index) / gap
+                ready.append((index, pending_frame, interpolate_detections(start, detections, t), None))
+            if self.adaptive:
+                self._adapt(start, detections, gap)
+        self.pending = []
+        self.keyframe = (frame_index, detections)
+        ready.append((frame_index, frame, detections, result))
+        return ready
+
+    def flush(self):
+        """Entrega los frames retenidos al final del video, con las últimas detecciones."""
+        ready = [(index, frame, self.keyframe[1].copy(), None) for index, frame in self.pending]
+        self.pending = []
+        return ready
+
+    def _adapt(self, start, end, gap):
+        tracks_changed = len(start) != len(end)
+        motion = _motion(start, end, gap)
+        if tracks_changed or motion > self.motion_high:
+            self.stride = max(1, self.stride // 2)
+        elif motion < self.motion_low:
+            self.stride = min(self.max_stride, self.stride + 1)
+
+
+def box_iou(a, b):
+    """
+    IoU entre dos conjuntos de cajas xyxy.
+
+    Args:
+        a (np.ndarray): Cajas (N, 4).
+        b (np.ndarray): Cajas (M, 4).
+
+    Returns:
+        np.ndarray: Matriz (N, M) de IoU.
+    """
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:4], b[None, :, 2:4])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:4] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:4] - b[:, :2], axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+
+def stitch_track_ids(previous, current, local_ids, next_id, iou_threshold=0.5):
+    """
+    Traduce los ids de track de un segmento a los ids globales del segmento anterior.
+
+    En los frames de solapamiento ambos segmentos tienen detecciones. Cada caja
+    del segmento actual vota por el id global de la caja del anterior con la
+    que más se solapa (misma clase, IoU >= `iou_threshold`); cada id local se
+    queda con el id global más votado y los ids sin pareja reciben ids nuevos.
+
+    Args:
+        previous (list): Detecciones (N, 7) del segmento anterior en los frames de solapamiento, ya con ids globales.
+        current (list): Detecciones (N, 7) del segmento actual en los mismos frames.
+        local_ids (iterable): Todos los ids locales que aparecen en el segmento actual.
+        next_id (int): Primer id global libre.
+        iou_threshold (float): IoU mínimo para emparejar dos cajas.
+
+    Returns:
+        tuple: (dict id local -> id global, siguiente id global libre).
+    """
+    votes = {}
+    for prev_frame, cur_frame in zip(previous, current):
+        prev_frame = prev_frame[prev_frame[:, 4] >= 0]
+        cur_frame = cur_frame[cur_frame[:, 4] >= 0]
+        if len(prev_frame) == 0 or len(cur_frame) == 0:
+            continue
+        iou = box_iou(cur_frame[:, :4], prev_frame[:, :4])
+        iou[cur_frame[:, 6][:, None] != prev_frame[:, 6][None, :]] = 0
+        for i, j in enumerate(iou.argmax(axis=1)):
+            if iou[i, j] >= iou_threshold:
+                pair = (int(cur_frame[i, 4]), int(prev_frame[j, 4]))
+                votes[pair] = votes.get(pair, 0) + 1
+
+    mapping = {}
+    used = set()
+    for (local_id, global_id), _ in sorted(votes.items(), key=lambda item: -item[1]):
+        if local_id not in mapping and global_id not in used:
+            mapping[local_id] = global_id
+            used.add(global_id)
+
+    for local_id in sorted(int(i) for i in local_ids):
+        if local_id not in mapping:
+            mapping[local_id] = next_id
+            next_id += 1
+    return mapping, next_id
+
+
+def remap_track_ids(detections, mapping):
+    """Devuelve una copia de las detecciones (N, 7) con los ids traducidos según `mapping`."""
+    remapped = detections.copy()
+    for row in remapped:
+        if row[4] >= 0:
+            row[4] = mapping.get(int(row[4]), row[4])
+    return remapped
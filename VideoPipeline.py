@@ -0,0 +1,220 @@
+import time
+import queue
+import threading
+import cv2
+from Instrumentation import NULL_INSTRUMENTATION, DECODE
+
+
+class StageStats:
+    """Contador de frames y tiempo ocupado de una etapa del pipeline."""
+
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.busy_seconds = 0.0  # Tiempo trabajando, sin contar esperas en las colas
+
+    def add(self, seconds, frames=1):
+        self.frames += frames
+        self.busy_seconds += seconds
+
+    def fps(self):
+        """Frames por segundo que la etapa podría sostener por sí sola."""
+        return self.frames / self.busy_seconds if self.busy_seconds > 0 else 0.0
+
+    def as_dict(self):
+        return {'frames': self.frames, 'busy_seconds': round(self.busy_seconds, 3), 'fps': round(self.fps(), 2)}
+
+
+class FrameRange:
+    """
+    Vista de un rango de frames [start, stop) de un video, con la interfaz `read()` de VideoCapture.
+
+    Busca el primer frame con CAP_PROP_POS_FRAMES; si el contenedor no permite
+    una búsqueda exacta, vuelve al principio y descarta frames con `grab()`.
+    """
+
+    def __init__(self, video_path, start, stop):
+        """
+        Abre el video y se sitúa en `start`.
+
+        Args:
+            video_path (str): Ruta del video.
+            start (int): Primer frame del rango.
+            stop (int): Frame siguiente al último del rango.
+        """
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open video file: {video_path}")
+        self.start = start
+        self.stop = stop
+        self.position = start
+
+        if start > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            if int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)) != start:
+                self.cap.release()
+                self.cap = cv2.VideoCapture(video_path)
+                for _ in range(start):
+                    if not self.cap.grab():
+                        break
+
+    def read(self):
+        if self.position >= self.stop:
+            return False, None
+        ret, frame = self.cap.read()
+        if ret:
+            self.position += 1
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class VideoPipeline:
+    """
+    Pipeline de tres etapas para procesar un video: decodificación → inferencia → codificación.
+
+    La decodificación y la inferencia corren en hilos propios y la codificación
+    (y la visualización opcional) en el hilo que llama a `run`, que es el único
+    que debe usar las ventanas de OpenCV. Las etapas se comunican con colas
+    acotadas, así que la memoria no crece aunque una etapa sea más lenta.
+    Hay un solo hilo de inferencia, de modo que el tracker recibe los frames
+    en orden.
+
+    `infer` devuelve una lista de elementos para `encode`: normalmente uno por
+    frame, pero puede retener frames (lista vacía) y entregarlos más tarde,
+    por ejemplo para interpolar entre dos frames con detección. Los que
+    queden retenidos al final del video los devuelve `finish`.
+    """
+
+    _END = object()  # Marca de fin de video
+
+    def __init__(self, cap, infer, encode, queue_size=8, finish=None, instrumentation=None):
+        """
+        Inicializa el pipeline.
+
+        Args:
+            cap (cv2.VideoCapture): Video ya abierto.
+            infer (callable): Recibe (frame_index, frame) y devuelve una lista de elementos para `encode`.
+            encode (callable): Recibe un elemento; devuelve False para detener el video.
+            queue_size (int): Capacidad de cada cola entre etapas.
+            finish (callable): Sin argumentos; devuelve los elementos retenidos al acabar el video.
+            instrumentation (Instrumentation): Recibe el tiempo de cada frame decodificado como tramo 'decode'.
+        """
+        self.cap = cap
+        self.infer = infer
+        self.encode = encode
+        self.finish = finish
+        self.instrumentation = instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
+        self.decoded = queue.Queue(maxsize=queue_size)
+        self.inferred = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.errors = []
+        self.stats = {name: StageStats(name) for name in ('decode', 'inference', 'encode')}
+
+    def stop(self):
+        """Pide a todas las etapas que terminen."""
+        self.stop_event.set()
+
+    def _put(self, out_queue, item):
+        """Encolar sin quedarse bloqueado para siempre si el pipeline se detiene."""
+        while not self.stop_event.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, in_queue):
+        while not self.stop_event.is_set():
+            try:
+                return in_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return self._END
+
+    def _decode_loop(self):
+        stats = self.stats['decode']
+        index = 0
+        try:
+            while not self.stop_event.is_set():
+                start = time.perf_counter()
+                ret, frame = self.cap.read()
+                elapsed = time.perf_counter() - start
+                stats.add(elapsed, frames=1 if ret else 0)
+                if not ret:
+                    break
+                self.instrumentation.record(DECODE, elapsed)
+                if not self._put(self.decoded, (index, frame)):
+                    return
+                index += 1
+        except Exception as e:
+            self.errors.append(e)
+            self.stop()
+        finally:
+            self._put(self.decoded, self._END)
+
+    def _inference_loop(self):
+        stats = self.stats['inference']
+        try:
+            while True:
+                item = self._get(self.decoded)
+                if item is self._END:
+                    break
+                start = time.perf_counter()
+                outputs = self.infer(*item)
+                stats.add(time.perf_counter() - start)
+                for output in outputs:
+                    if not self._put(self.inferred, output):
+                        return
+
+            if self.finish is not None and not self.stop_event.is_set():
+                for output in self.finish():
+                    if not self._put(self.inferred, output):
+                        return
+        except Exception as e:
+            self.errors.append(e)
+            self.stop()
+        finally:
+            self._put(self.inferred, self._END)
+
+    def run(self):
+        """
+        Procesa el video completo (o hasta que `encode` devuelva False).
+
+        Returns:
+            dict: Estadísticas por etapa (frames, tiempo ocupado y fps).
+        """
+        threads = [threading.Thread(target=self._decode_loop, name="video-decode", daemon=True),
+                   threading.Thread(target=self._inference_loop, name="video-inference", daemon=True)]
+        for thread in threads:
+            thread.start()
+
+        stats = self.stats['encode']
+        wall_start = time.perf_counter()
+        try:
+            while True:
+                item = self._get(self.inferred)
+                if item is self._END:
+                    break
+                start = time.perf_counter()
+                keep_going = self.encode(item)
+                stats.add(time.perf_counter() - start)
+                if keep_going is False:
+                    break
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join()
+
+        if self.errors:
+            raise self.errors[0]
+
+        wall_seconds = time.perf_counter() - wall_start
+        summary = {name: stage.as_dict() for name, stage in self.stats.items()}
+        summary['wall'] = {'frames': stats.frames, 'seconds': round(wall_seconds, 3),
+                           'fps': round(stats.frames / wall_seconds, 2) if wall_seconds > 0 else 0.0}
+        print("Pipeline throughput: " + ", ".join(f"{name} {values['fps']:.1f} fps"
+                                                  for name, values in summary.items()))
+        return summary
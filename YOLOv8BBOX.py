@@ -1,92 +1,100 @@
-from ultralytics import YOLO
 import os
 import cv2
-import pandas as pd
 import numpy as np
-from PIL import Image
+import pandas as pd
+from SegmentationEngine import SegmentationEngine
+from ProgressSink import progress_for
 
 class YOLOv8BBOX:
-    def __init__(self, model_path, input_folder, output_folder, main_window):
+    manifest_key = 'bbox'  # Key of this view in the run manifest
+    COLUMNS = ['Image', 'Detection', 'BBox_Width', 'BBox_Height', 'Confidence', 'Class']
+    # Type of each column in all_bbox_data.csv ('int' columns are nullable after the merge, see MergeDF)
+    DTYPES = {'Image': 'str', 'Detection': 'int', 'BBox_Width': 'float', 'BBox_Height': 'float',
+              'Confidence': 'float', 'Class': 'int'}
+
+    def __init__(self, model_path, input_folder, output_folder, main_window=None):
         self.model_path = model_path
-        self.model = YOLO(self.model_path)
+        self.input_folder = input_folder
         self.output_folder = output_folder
         os.makedirs(self.output_folder, exist_ok=True)
         self.main_window = main_window
+        self.bbox_batches = []  # Columnas por imagen, concatenadas al final
+        self.last_batch = None  # Columnas de la última imagen, para el manifiesto
 
-    def predict_and_save_bbox(self, image_folder):
-        if not self.model_path or not os.path.exists(self.model_path):
-            raise ValueError("Invalid YOLO model file path.")
-
-        if not os.path.exists(image_folder):
-            raise ValueError("Invalid input folder path.")
-
-        total_images = len([f for f in os.listdir(image_folder) if f.endswith(('.jpg', '.jpeg', '.png'))])
-        bbox_data = []
+    def predict_and_save_bbox(self, image_folder, batch_size=1, resume=True):
+        engine = SegmentationEngine(self.model_path, image_folder, progress_for(self.main_window), batch_size=batch_size,
+                                    output_folder=self.output_folder if resume else None)
+        engine.run([self])
 
-        for i, image_file in enumerate(os.listdir(image_folder)):
-            if image_file.endswith(('.jpg', '.jpeg', '.png')):
-                image_path = os.path.join(image_folder, image_file)
-                
-                try:
-                    original_image = Image.open(image_path)
-                except Exception as e:
-                    print(f"Error loading image {image_path}: {e}")
-                    continue
+    def handle_result(self, image_file, image, result, writer):
+        """Draw and save the bounding boxes of one image from the engine result."""
+        self.last_batch = None
+        if not hasattr(result, 'boxes'):
+            return None
 
-                resized_image = original_image.resize((800, 608))
-                resized_image_array = np.array(resized_image)
+        # Una sola copia al CPU por imagen: columnas xyxy, (track id), conf, cls
+        detections = result.boxes.data.cpu().numpy()
+        xyxy = detections[:, :4]
 
-                # Predict and ensure new_results_list is structured correctly
-                new_results_list = self.model.predict(resized_image_array, conf=0.3)
-                if not new_results_list:
-                    print(f"No detections for {image_file}.")
-                    continue
+        # Guardar las columnas de la imagen como un lote
+        self.last_batch = {
+            'Image': np.full(len(detections), image_file, dtype=object),
+            'Detection': np.arange(len(detections)),  # Mismo índice que la máscara de ImageProcessor
+            'BBox_Width': xyxy[:, 2] - xyxy[:, 0],
+            'BBox_Height': xyxy[:, 3] - xyxy[:, 1],
+            'Confidence': detections[:, -2],
+            'Class': detections[:, -1].astype(np.int64),
+        }
+        self.bbox_batches.append(self.last_batch)
 
-                new_result = new_results_list[0]
+        visualized_image = image.copy()
+        for idx, (x1, y1, x2, y2) in enumerate(xyxy.astype(np.int32).tolist()):
+            cv2.rectangle(
+                visualized_image,
+                (x1, y1),
+                (x2, y2),
+                color=(255, 0, 0),  # Red color
+                thickness=2
+            )
+            cv2.putText(
+                visualized_image,
+                str(idx),
+                (x1, y1),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (255, 255, 255),
+                2
+            )
 
-                if hasattr(new_result, 'boxes'):
-                    for box in new_result.boxes.xyxy:
-                        bbox_width = (box[2] - box[0]).item()
-                        bbox_height = (box[3] - box[1]).item()
-                        bbox_data.append({
-                            'Image': image_file,
-                            'BBox_Width': bbox_width,
-                            'BBox_Height': bbox_height
-                        })
+        output_image_path = os.path.join(self.output_folder, f"{image_file.split('.')[0]}_bbox.png")
+        writer.write(output_image_path, visualized_image, tag=image_file)  # Guardar la imagen visualizada en segundo plano
+        print(f"Saved the result image as {output_image_path}")
 
-                    visualized_image = resized_image_array.copy()
-                    for idx, box in enumerate(new_result.boxes.xyxy):
-                        cv2.rectangle(
-                            visualized_image,
-                            (int(box[0].item()), int(box[1].item())),
-                            (int(box[2].item()), int(box[3].item())),
-                            color=(255, 0, 0),  # Red color
-                            thickness=2
-                        )
-                        cv2.putText(
-                            visualized_image,
-                            str(idx),
-                            (int(box[0].item()), int(box[1].item())),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            0.5,
-                            (255, 255, 255),
-                            2
-                        )
+        # Imagen con cuadros delimitadores para el canvas de la ventana principal de Tkinter
+        return cv2.cvtColor(visualized_image, cv2.COLOR_BGR2RGB)
 
-                    # Mostrar la imagen con cuadros delimitadores en el canvas de la ventana principal de Tkinter
-                    self.main_window.display_image_on_canvas(cv2.cvtColor(visualized_image, cv2.COLOR_BGR2RGB))
+    def manifest_rows(self):
+        """Return the bbox columns of the last processed image as plain lists."""
+        if self.last_batch is None:
+            return {}
+        return {column: values.tolist() for column, values in self.last_batch.items()}
 
-                    output_image_path = os.path.join(self.output_folder, f"{image_file.split('.')[0]}_bbox.png")
-                    cv2.imwrite(output_image_path, visualized_image)  # Guardar la imagen visualizada
-                    print(f"Saved the result image as {output_image_path}")
+    def restore_rows(self, image_file, rows):
+        """Reuse the bbox columns saved in the run manifest for an unchanged image."""
+        if rows:
+            self.bbox_batches.append({column: np.asarray(values, dtype=object if column == 'Image' else None)
+                                      for column, values in rows.items()})
 
-                # Update progress bar
-                progress_value = (i + 1) / total_images * 100
-                self.main_window.progress_var.set(progress_value)
-                self.main_window.master.update_idletasks()
+    def bbox_dataframe(self):
+        """Concatenate the per-image column batches into a single DataFrame."""
+        if not self.bbox_batches:
+            return pd.DataFrame(columns=self.COLUMNS)
+        return pd.DataFrame({column: np.concatenate([batch[column] for batch in self.bbox_batches])
+                             for column in self.COLUMNS})
 
+    def finish(self):
         # Save the collected bbox data
-        bbox_df = pd.DataFrame(bbox_data)
+        bbox_df = self.bbox_dataframe()
         csv_path = os.path.join(self.output_folder, "all_bbox_data.csv")
         bbox_df.to_csv(csv_path, index=False)
         print(f"Saved CSV file with all bbox data: {csv_path}")
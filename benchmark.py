@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Banco de pruebas de rendimiento con datos sintéticos.
+
+Genera carpetas de imágenes y videos sintéticos de varios tamaños y mide cada
+pipeline (segmentación de imágenes, video con salida y video de solo
+análisis) con un modelo real (.pt) o con un modelo simulado determinista que
+devuelve un número fijo de cajas y máscaras, así corre sin red y en CPU.
+Cada caso se ejecuta en un proceso nuevo para medir su pico de memoria.
+
+Por caso se guardan los elementos por segundo (imágenes o frames), el pico de
+memoria (RSS), los bytes escritos y los tiempos por tramo (ver
+Instrumentation). Los resultados se pueden guardar como línea base y
+comparar con ella: si algún caso empeora más que el umbral, el programa
+termina con código 1.
+
+Ejemplos:
+    python benchmark.py --save-baseline
+    python benchmark.py --baseline benchmark_baseline.json --threshold 0.15
+    python benchmark.py --model last.pt --sizes 1280x720 --images 32 --frames 120
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import cv2
+
+try:
+    import resource  # Solo en Unix; en Windows el pico de memoria no se mide
+except ImportError:
+    resource = None
+
+STAGES = ('segmentation', 'video', 'video_analysis')
+DEFAULT_SIZES = ('640x480', '1280x720', '1920x1080')
+
+# Métricas comparadas con la línea base y si más es mejor
+METRICS = {'items_per_second': True, 'peak_rss_mb': False, 'output_bytes': False}
+
+
+class _StubArray(np.ndarray):
+    """Array de NumPy con `cpu()` y `numpy()`, como los tensores de los resultados de ultralytics."""
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return np.asarray(self)
+
+
+def _stub_array(values, dtype=np.float32):
+    return np.asarray(values, dtype=dtype).view(_StubArray)
+
+
+class StubBoxes:
+    """Cajas de un StubResult, con las columnas de `Results.boxes.data` de ultralytics."""
+
+    def __init__(self, data, tracked):
+        self.data = _stub_array(data)
+        self.tracked = tracked
+
+    def __len__(self):
+        return len(self.data)
+
+    xyxy = property(lambda self: self.data[:, :4])
+    id = property(lambda self: self.data[:, 4] if self.tracked else None)
+    conf = property(lambda self: self.data[:, -2])
+    cls = property(lambda self: self.data[:, -1])
+
+
+class StubMasks:
+    """Máscaras de un StubResult: `data` (N, H, W) y los polígonos `xy` en píxeles."""
+
+    def __init__(self, data, xy):
+        self.data = _stub_array(data, dtype=np.uint8)
+        self.xy = xy
+
+
+class StubResult:
+    """Resultado de StubModel con la parte de `ultralytics.engine.results.Results` que usan los pipelines."""
+
+    def __init__(self, image, boxes, masks):
+        self.orig_img = image
+        self.orig_shape = image.shape[:2]
+        self.boxes = boxes
+        self.masks = masks
+        self.speed = {'preprocess': 0.0, 'inference': 0.0, 'postprocess': 0.0}
+
+    def plot(self):
+        annotated = np.ascontiguousarray(self.orig_img).copy()
+        for x1, y1, x2, y2 in self.boxes.xyxy.astype(np.int32).tolist():
+            cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 0, 255), 2)
+        return annotated
+
+
+class StubModel:
+    """
+    Modelo simulado y determinista para el banco de pruebas.
+
+    Devuelve siempre `boxes` cajas (las `masks` primeras con máscara) que se
+    desplazan un poco en cada llamada, con ids de track estables. No hace
+    inferencia, así que mide el coste de los pipelines sin el del modelo.
+    """
+
+    names = {0: 'ship'}
+
+    def __init__(self, boxes=5, masks=5, seed=0):
+        """
+        Args:
+            boxes (int): Cajas por imagen.
+            masks (int): Cuántas de esas cajas llevan máscara (0 = `masks` es None).
+            seed (int): Semilla de las posiciones, tamaños y confianzas.
+        """
+        rng = np.random.default_rng(seed)
+        self.anchors = rng.uniform([0.1, 0.1, 0.05, 0.05], [0.9, 0.9, 0.2, 0.2], (boxes, 4))  # cx, cy, w, h
+        self.velocity = rng.uniform(-0.004, 0.004, (boxes, 2))
+        self.confidences = rng.uniform(0.4, 0.95, boxes)
+        self.mask_count = min(masks, boxes)
+        self.calls = 0
+        self.predictor = None  # Como YOLO antes de la primera llamada (ver VideoProcessor._reset_tracker)
+
+    @classmethod
+    def load(cls, model_path, task=None):
+        """Crea el modelo a partir de su archivo de configuración JSON (cargador de ModelRegistry)."""
+        with open(model_path, encoding='utf-8') as f:
+            return cls(**json.load(f))
+
+    def _result(self, image, tracked):
+        height, width = image.shape[:2]
+        centers = (self.anchors[:, :2] + self.velocity * self.calls) % 1.0
+        half = self.anchors[:, 2:] / 2
+        xyxy = (np.concatenate([centers - half, centers + half], axis=1).clip(0, 1)
+                * [width, height, width, height])
+        self.calls += 1
+
+        columns = [xyxy]
+        if tracked:
+            columns.append(np.arange(1, len(xyxy) + 1)[:, None])
+        columns += [self.confidences[:, None], np.zeros((len(xyxy), 1))]
+        boxes = StubBoxes(np.concatenate(columns, axis=1), tracked)
+
+        masks = None
+        if self.mask_count:
+            data = np.zeros((self.mask_count, height, width), dtype=np.uint8)
+            polygons = []
+            for index, (x1, y1, x2, y2) in enumerate(xyxy[:self.mask_count].astype(np.int32).tolist()):
+                data[index, y1:y2, x1:x2] = 1
+                polygons.append(np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.float32))
+            masks = StubMasks(data, polygons)
+        return StubResult(image, boxes, masks)
+
+    def predict(self, source, **kwargs):
+        images = source if isinstance(source, list) else [source]
+        return [self._result(image, tracked=False) for image in images]
+
+    def track(self, source, **kwargs):
+        return [self._result(source, tracked=True)]
+
+
+def parse_size(text):
+    """Convierte '1280x720' en (1280, 720)."""
+    try:
+        width, height = (int(value) for value in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid size '{text}', expected WIDTHxHEIGHT")
+    return width, height
+
+
+def synthetic_frame(rng, size, index):
+    """Fondo con degradado y ruido y varios rectángulos que se mueven con `index`."""
+    width, height = size
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = np.linspace(40, 160, width, dtype=np.uint8)[None, :, None]
+    frame += rng.integers(0, 24, (height, width, 3), dtype=np.uint8)
+    for k in range(4):
+        x = int((0.1 + 0.2 * k) * width + 3 * index) % width
+        y = int((0.2 + 0.15 * k) * height)
+        cv2.rectangle(frame, (x, y), (x + width // 10, y + height // 12), (230, 230, 230), -1)
+    return frame
+
+
+def make_image_folder(folder, size, count, seed=0):
+    """Crea `count` imágenes JPEG sintéticas de tamaño `size` (siempre las mismas para la misma semilla)."""
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    for index in range(count):
+        cv2.imwrite(os.path.join(folder, f"image_{index:04d}.jpg"), synthetic_frame(rng, size, index * 10))
+    return folder
+
+
+def make_video(path, size, frames, fps=30.0, seed=0):
+    """Crea un video AVI (XVID) sintético de `frames` frames."""
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'XVID'), fps, size)
+    if not writer.isOpened():
+        raise IOError(f"Could not open video writer for {path}")
+    for index in range(frames):
+        writer.write(synthetic_frame(rng, size, index))
+    writer.release()
+    return path
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso en MB (None si no se puede medir)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _folder_bytes(folder, exclude=()):
+    return sum(entry.stat().st_size for entry in os.scandir(folder) if entry.is_file() and entry.name not in exclude)
+
+
+def _read_summary(path):
+    """Resumen de tiempos que el pipeline guardó junto a sus salidas (vacío si no hay)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _run_segmentation(model_path, source, output_folder, batch_size):
+    from Instrumentation import Instrumentation, SUMMARY_NAME
+    from SegmentationEngine import SegmentationEngine
+    from YOLOv8ObjectDetector import YOLOv8ObjectDetector
+    from ImageProcessor import ImageProcessor
+    from YOLOv8BBOX import YOLOv8BBOX
+
+    shutil.rmtree(output_folder, ignore_errors=True)
+    os.makedirs(output_folder)
+    engine = SegmentationEngine(model_path, source, batch_size=batch_size, verbose=False,
+                                instrumentation=Instrumentation())
+    views = [YOLOv8ObjectDetector(model_path, source, output_folder),
+             ImageProcessor(model_path, source, output_folder),
+             YOLOv8BBOX(model_path, source, output_folder)]
+    start = time.perf_counter()
+    engine.run(views)
+    seconds = time.perf_counter() - start
+    summary = _read_summary(os.path.join(output_folder, SUMMARY_NAME))
+    return (summary.get('images', len(engine.list_images())), seconds,
+            _folder_bytes(output_folder, exclude=(SUMMARY_NAME,)), summary.get('spans', {}))
+
+
+def _run_video(model_path, source, analysis_only):
+    from processing_videos import VideoProcessor
+
+    processor = VideoProcessor(model_path, display=False, record_timings=True, analysis_only=analysis_only,
+                               export_format='csv')
+    start = time.perf_counter()
+    output_path = processor.process_single_video(source)
+    seconds = time.perf_counter() - start
+    summary = _read_summary(os.path.splitext(source)[0] + '_timings.json')
+    output_bytes = os.path.getsize(output_path) if output_path and os.path.exists(output_path) else 0
+    return summary.get('frames', 0), seconds, output_bytes, summary.get('spans', {})
+
+
+def _run_case(stage, model_path, stub, source, output_folder, batch_size, verbose, backend):
+    """Ejecuta un caso en el proceso de trabajo y devuelve sus métricas."""
+    from ModelRegistry import model_registry
+    if stub:
+        model_registry.loader = StubModel.load
+    model_registry.set_backend(backend.replace('-int8', ''), int8=backend.endswith('-int8'))
+
+    devnull = None
+    if not verbose:
+        # Los pipelines escriben una línea por imagen; solo interesan las métricas
+        devnull = open(os.devnull, 'w')
+        sys.stdout = devnull
+    try:
+        if stage == 'segmentation':
+            items, seconds, output_bytes, spans = _run_segmentation(model_path, source, output_folder, batch_size)
+        else:
+            items, seconds, output_bytes, spans = _run_video(model_path, source, stage == 'video_analysis')
+    finally:
+        if devnull is not None:
+            sys.stdout = sys.__stdout__
+            devnull.close()
+
+    return {'items': items, 'seconds': round(seconds, 3),
+            'items_per_second': round(items / seconds, 2) if seconds > 0 else 0.0,
+            'peak_rss_mb': peak_rss_mb(), 'output_bytes': output_bytes, 'spans': spans}
+
+
+def run_benchmark(args):
+    """
+    Genera los datos sintéticos y mide todos los casos.
+
+    Returns:
+        dict: Configuración, entorno y métricas por caso ('etapa@ANCHOxALTO').
+    """
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='benchmark_')
+    os.makedirs(work_dir, exist_ok=True)
+
+    stub = args.model == 'stub'
+    model_path = args.model
+    if stub:
+        model_path = os.path.join(work_dir, 'stub_model.pt')  # Configuración del modelo simulado
+        with open(model_path, 'w', encoding='utf-8') as f:
+            json.dump({'boxes': args.boxes, 'masks': args.masks, 'seed': args.seed}, f)
+
+    cases = {}
+    context = multiprocessing.get_context('spawn')
+    for width, height in args.sizes:
+        size_name = f"{width}x{height}"
+        images = make_image_folder(os.path.join(work_dir, f"images_{size_name}"), (width, height), args.images,
+                                   seed=args.seed) if 'segmentation' in args.stages else None
+        video = make_video(os.path.join(work_dir, f"video_{size_name}.avi"), (width, height), args.frames,
+                           seed=args.seed) if set(args.stages) - {'segmentation'} else None
+
+        for stage in args.stages:
+            name = f"{stage}@{size_name}"
+            source = images if stage == 'segmentation' else video
+            runs = []
+            for _ in range(args.repeat):
+                # Un proceso nuevo por repetición: el pico de memoria es solo el de este caso
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    runs.append(executor.submit(_run_case, stage, model_path, stub, source,
+                                                os.path.join(work_dir, f"output_{size_name}"),
+                                                args.batch_size, args.verbose, args.backend).result())
+            best = max(runs, key=lambda run: run['items_per_second'])
+            cases[name] = best
+            print(f"{name:>28}: {best['items_per_second']:8.2f} items/s  {best['peak_rss_mb']} MB peak  "
+                  f"{best['output_bytes'] / 1e6:8.2f} MB written")
+
+    if args.work_dir is None and not args.keep_data:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    config = {'model': 'stub' if stub else os.path.basename(args.model), 'backend': args.backend, 'sizes': [f"{w}x{h}" for w, h in args.sizes],
+              'images': args.images, 'frames': args.frames, 'batch_size': args.batch_size,
+              'repeat': args.repeat, 'seed': args.seed}
+    if stub:
+        config.update(boxes=args.boxes, masks=args.masks)
+    environment = {'python': platform.python_version(), 'platform': platform.platform(),
+                   'cpu_count': os.cpu_count(), 'numpy': np.__version__, 'opencv': cv2.__version__}
+    return {'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'config': config, 'environment': environment,
+            'cases': cases}
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """
+    Compara las métricas de cada caso con las de la línea base.
+
+    Args:
+        results (dict): Resultado de `run_benchmark`.
+        baseline (dict): Resultado guardado anteriormente.
+        threshold (float): Empeoramiento relativo tolerado (0.1 = 10 %).
+
+    Returns:
+        list: Tuplas (caso, métrica, base, actual, cambio relativo) de las regresiones.
+    """
+    if baseline.get('config') != results['config']:
+        print("Warning: the baseline was recorded with a different configuration; the comparison may not be fair.")
+
+    regressions = []
+    for name, case in results['cases'].items():
+        base = baseline.get('cases', {}).get(name)
+        if base is None:
+            print(f"{name}: not in the baseline")
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = base.get(metric), case.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change < -threshold if higher_is_better else change > threshold
+            print(f"{name:>28} {metric:>17}: {old:>12} -> {new:>12} ({change:+.1%}){'  REGRESSION' if worse else ''}")
+            if worse:
+                regressions.append((name, metric, old, new, change))
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="AI Analyzer Program - benchmarks on synthetic data")
+    parser.add_argument('--model', default='stub',
+                        help="YOLOv8 model file (.pt), or 'stub' for the deterministic offline model (default)")
+    parser.add_argument('--backend', choices=('eager', 'torchscript', 'onnx', 'onnx-int8'), default='eager',
+                        help="Inference backend of the real model (default: eager)")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES), help="Pipelines to measure")
+    parser.add_argument('--sizes', nargs='+', type=parse_size, default=[parse_size(s) for s in DEFAULT_SIZES],
+                        help="Image and video sizes as WIDTHxHEIGHT (default: %s)" % " ".join(DEFAULT_SIZES))
+    parser.add_argument('--images', type=int, default=16, help="Images per synthetic folder (default: 16)")
+    parser.add_argument('--frames', type=int, default=60, help="Frames per synthetic video (default: 60)")
+    parser.add_argument('--boxes', type=int, default=5, help="Boxes per image returned by the stub model (default: 5)")
+    parser.add_argument('--masks', type=int, default=5, help="How many of those boxes have a mask (default: 5)")
+    parser.add_argument('--batch-size', type=int, default=1, help="Images per predict call (default: 1)")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per case; the fastest is kept (default: 1)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic data and stub model")
+    parser.add_argument('--work-dir', default=None, help="Folder for the synthetic data and outputs (default: temporary)")
+    parser.add_argument('--keep-data', action='store_true', help="Keep the temporary data folder")
+    parser.add_argument('--output', default='benchmark_results.json', help="Where to save the results")
+    parser.add_argument('--baseline', default=None, help="Compare against this results file")
+    parser.add_argument('--save-baseline', nargs='?', const='benchmark_baseline.json', default=None,
+                        help="Also save the results as the new baseline (default: benchmark_baseline.json)")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Relative slowdown, memory or output growth counted as a regression (default: 0.10)")
+    parser.add_argument('--verbose', action='store_true', help="Show the pipelines' own output")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    results = run_benchmark(args)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.save_baseline)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions above {args.threshold:.0%}")
+            return 1
+        print(f"No regressions above {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
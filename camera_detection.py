@@ -1,5 +1,12 @@
+import os
+import time
+import shutil
 import cv2
-from ultralytics import YOLO
+from ModelRegistry import model_lock, reset_tracker, TrackingModelSlot
+from CameraStream import LatestFrameGrabber, FpsMeter, draw_stream_overlay
+from ClipRecorder import ClipRecorder
+from Instrumentation import NULL_INSTRUMENTATION, INFERENCE, POSTPROCESS, DISK_WRITE, GUI_UPDATE, instrumentation_for
+from EventBus import EventBus, StageDoneEvent, ErrorEvent, StreamStartedEvent
 import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog
 import threading
@@ -8,14 +15,18 @@ class CameraDetection:
     def __init__(self, root, width=1920, height=1080, confidence_threshold=0.3):
         self.root = root
         self.model = None  # El modelo se cargará después
+        self.tracking_model = TrackingModelSlot()  # Modelo propio de la ventana, reutilizado entre selecciones
         self.width = width
         self.height = height
         self.confidence_threshold = confidence_threshold
 
-        # Variables de control para la grabación
+        # Variables de control para la grabación (el codificador corre en su propio hilo)
         self.recording = False
-        self.video_writer = None
+        self.recorder = None
         self.file_path = ""
+        self.preroll_seconds = tk.DoubleVar(value=5.0)  # Segundos guardados antes de pulsar grabar
+        self.record_source = tk.StringVar(value="Annotated")  # Grabar los frames con o sin detecciones
+        self.record_timings = tk.BooleanVar(value=False)  # Guardar los tiempos por tramo al cerrar el stream
 
         # Variables para mostrar en la GUI
         self.model_label_var = tk.StringVar(value="No model selected")
@@ -24,6 +35,14 @@ class CameraDetection:
         # Crear la ventana
         self.create_camera_detection_window()
 
+        # Canal de eventos: el hilo de la webcam no toca los widgets directamente
+        self.events = EventBus()
+        self.events.attach(self.window, {
+            StreamStartedEvent: self.on_stream_started_event,
+            StageDoneEvent: self.on_stage_done_event,
+            ErrorEvent: lambda event: messagebox.showerror("Error", event.message),
+        })
+
     def create_camera_detection_window(self):
         """Crea la interfaz para la detección de cámara."""
         self.window = tk.Toplevel(self.root)
@@ -58,6 +77,13 @@ class CameraDetection:
         self.threshold_entry.insert(0, str(self.confidence_threshold))
         self.threshold_entry.pack(pady=10)
 
+        # Opciones de grabación: buffer previo y frames con o sin anotaciones
+        tk.Label(self.window, text="Pre-roll (seconds)").pack(pady=5)
+        tk.Scale(self.window, from_=0, to=30, orient=tk.HORIZONTAL, resolution=1,
+                 variable=self.preroll_seconds).pack()
+        tk.OptionMenu(self.window, self.record_source, "Annotated", "Raw").pack(pady=5)
+        tk.Checkbutton(self.window, text="Record timings (JSON)", variable=self.record_timings).pack()
+
         # Botones de grabación (start/stop)
         self.start_button = tk.Button(self.window, text="Start Recording", command=self.start_recording, state=tk.DISABLED)
         self.start_button.pack(pady=5)
@@ -72,7 +98,7 @@ class CameraDetection:
             filetypes=[("PyTorch model files", "*.pt")]
         )
         if model_path:
-            self.model = YOLO(model_path)
+            self.model = self.tracking_model.get(model_path)
             model_name = model_path.split('/')[-1]  # Extraer solo el nombre del archivo
             self.model_label_var.set(f"Model loaded: {model_name}")  # Actualizar la etiqueta en la GUI
         else:
@@ -104,36 +130,89 @@ class CameraDetection:
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
 
+        reset_tracker(self.model)  # Cada stream empieza sin los tracks del anterior
+
+        # Grabador en segundo plano, con los FPS que anuncia la cámara hasta medir los reales
+        self.recorder = ClipRecorder(fps=self.cap.get(cv2.CAP_PROP_FPS), preroll_seconds=self.preroll_seconds.get())
+        record_raw = self.record_source.get() == "Raw"
+        timings = instrumentation_for(self.record_timings.get())
+
         # Crear un hilo para la webcam para evitar bloquear la GUI
-        self.webcam_thread = threading.Thread(target=self.webcam_stream, args=(confidence_threshold,))
+        self.webcam_thread = threading.Thread(target=self.webcam_stream,
+                                              args=(confidence_threshold, record_raw, timings))
         self.webcam_thread.start()
 
-    def webcam_stream(self, confidence_threshold):
+    def webcam_stream(self, confidence_threshold, record_raw=False, timings=None):
         """Hilo que maneja el stream de la webcam y la detección en tiempo real."""
-        self.start_button.config(state=tk.NORMAL)  # Activar botón de grabación después de iniciar el streaming
-
-        while self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if not ret:
-                break
-
-            # Realizar la detección
-            results = self.model.track(frame, conf=confidence_threshold, persist=True)
-            frame_ = results[0].plot()
-
-            # Mostrar la imagen en una ventana OpenCV
-            cv2.imshow('Webcam Live', frame_)
-
-            # Grabar si está habilitado
-            if self.recording and self.video_writer is not None:
-                self.video_writer.write(frame)
-
-            # Salir al presionar 'q'
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+        timings = timings if timings is not None else NULL_INSTRUMENTATION
+        grabber = None
+        latency_ms = 0.0
 
-        self.cap.release()
-        cv2.destroyAllWindows()
+        try:
+            # Un hilo lee la cámara sin parar y solo guarda el último frame, así la latencia no crece
+            grabber = LatestFrameGrabber(self.cap)
+            fps_meter = FpsMeter()
+            self.events.publish(StreamStartedEvent('webcam'))  # La interfaz activa el botón de grabación
+
+            while True:
+                ret, frame, captured_at = grabber.read()
+                if not ret:
+                    break
+
+                # Realizar la detección sobre el frame más reciente
+                with model_lock(self.model), timings.span(INFERENCE):
+                    results = self.model.track(frame, conf=confidence_threshold, persist=True)
+                with timings.span(POSTPROCESS):
+                    frame_ = results[0].plot()
+
+                    # Latencia desde la captura hasta mostrarlo y FPS efectivos del bucle
+                    fps = fps_meter.tick()
+                    latency_ms = (time.perf_counter() - captured_at) * 1000
+                    draw_stream_overlay(frame_, [f"Latency: {latency_ms:.0f} ms",
+                                                 f"FPS: {fps:.1f} (camera {grabber.capture_fps():.1f})",
+                                                 f"Dropped: {grabber.dropped}"])
+
+                # Mostrar la imagen en una ventana OpenCV
+                with timings.span(GUI_UPDATE):
+                    cv2.imshow('Webcam Live', frame_)
+                    key = cv2.waitKey(1)
+
+                # El grabador recibe todos los frames: los guarda en el clip o en el buffer previo
+                # (aquí solo se mide el encolado; la codificación va en el hilo del grabador)
+                if self.recording or self.recorder.preroll is not None:
+                    with timings.span(DISK_WRITE):
+                        self.recorder.push(frame if record_raw else frame_, captured_at)
+
+                # Salir al presionar 'q'
+                if key & 0xFF == ord('q'):
+                    break
+        except Exception as e:
+            print(f"Webcam stream error: {e}")
+            self.events.publish(ErrorEvent('webcam', f"Webcam stream stopped: {e}"))
+        finally:
+            # Liberar la cámara, el grabador y las ventanas aunque el bucle haya fallado
+            if grabber is not None:
+                grabber.release()
+            else:
+                self.cap.release()
+            self.recorder.close()
+            cv2.destroyAllWindows()
+
+            captured, dropped = (grabber.captured, grabber.dropped) if grabber is not None else (0, 0)
+            print(f"Webcam stream stopped: {captured} frames captured, {dropped} dropped, "
+                  f"last latency {latency_ms:.0f} ms")
+            # Junto a la última grabación guardada o, si no hay, en la carpeta actual
+            timings.write_summary(os.path.splitext(self.file_path)[0] + '_timings.json' if self.file_path
+                                  else 'webcam_timings.json', frames=captured, dropped=dropped)
+
+    def on_stream_started_event(self, event):
+        """Activar el botón de grabación una vez que el stream está en marcha (hilo de Tk)."""
+        self.start_button.config(state=tk.NORMAL)
+
+    def on_stage_done_event(self, event):
+        """Recoger el clip cuando el grabador termina de escribirlo (hilo de Tk)."""
+        if event.stage == 'recording':
+            self.save_recording(event.info['path'])
 
     def set_resolution(self):
         """Establece una resolución predeterminada o personalizada para la webcam."""
@@ -186,7 +265,8 @@ class CameraDetection:
     def start_recording(self):
         """Inicia la grabación de video."""
         if not self.recording:
-            # Iniciar la grabación sin pedir el nombre del archivo
+            # Iniciar la grabación sin pedir el nombre del archivo; el clip empieza con el buffer previo
+            self.recorder.start()
             self.recording = True
             self.start_button.config(state=tk.DISABLED)  # Desactivar botón de grabar
             self.stop_button.config(state=tk.NORMAL)  # Activar botón de detener grabación
@@ -196,24 +276,33 @@ class CameraDetection:
         """Detiene la grabación de video."""
         if self.recording:
             self.recording = False
+            self.stop_button.config(state=tk.DISABLED)  # Desactivar botón de detener grabación
+
+            # El codificador cierra el clip en su hilo y avisa por el canal de eventos, sin bloquear la interfaz
+            self.recorder.stop_async(
+                lambda path: self.events.publish(StageDoneEvent('recording', {'path': path})))
 
-            # Pedir el nombre del archivo solo al detener la grabación
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # Codec para MP4
-            self.file_path = filedialog.asksaveasfilename(
-                title="Save Video",
-                defaultextension=".mp4",
-                filetypes=[("MP4 files", "*.mp4")])
-            if not self.file_path:
-                return  # Si el usuario cancela, no hacer nada
+    def save_recording(self, temp_path):
+        """Pide dónde guardar el clip ya cerrado y lo mueve allí (hilo de Tk)."""
+        self.start_button.config(state=tk.NORMAL)  # Activar botón de grabar
 
-            self.video_writer = cv2.VideoWriter(self.file_path, fourcc, 20.0, (self.width, self.height))
+        if not temp_path:
+            messagebox.showerror("Error", "No frames were recorded.")
+            return
+
+        # Pedir el nombre del archivo solo al detener la grabación
+        self.file_path = filedialog.asksaveasfilename(
+            title="Save Video",
+            defaultextension=".mp4",
+            filetypes=[("MP4 files", "*.mp4")])
+        if not self.file_path:
+            os.remove(temp_path)  # Si el usuario cancela, descartar el clip
+            return
 
-            # Mensaje de parada
-            messagebox.showinfo("Recording Stopped", f"Video recording has stopped. File saved as: {self.file_path}")
+        shutil.move(temp_path, self.file_path)
 
-            # Limpiar estado de botones
-            self.start_button.config(state=tk.NORMAL)  # Activar botón de grabar
-            self.stop_button.config(state=tk.DISABLED)  # Desactivar botón de detener grabación
+        # Mensaje de parada
+        messagebox.showinfo("Recording Stopped", f"Video recording has stopped. File saved as: {self.file_path}")
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Punto de entrada por línea de comandos, sin interfaz gráfica.
+
+Ejemplos:
+    python cli.py segment --model last.pt --input imagenes --output salida --progress stderr
+    python cli.py video --model last.pt --video puerto.mp4 --progress jsonl
+    python cli.py video --model last.pt --folder videos
+    python cli.py video --model last.pt --folder videos --workers 4
+    python cli.py video --model last.pt --video largo.mp4 --segments 4
+    python cli.py video --model last.pt --video puerto.mp4 --analysis-only --export parquet
+    python cli.py video --model last.pt --video puerto.mp4 --stride 5 --adaptive-stride
+    python cli.py --timings segment --model last.pt --input imagenes --output salida
+    python cli.py segment --model last.pt --input imagenes --output salida --sweep-batch-sizes 1 2 4 8
+    python cli.py --backend onnx --int8 video --model last.pt --video puerto.mp4
+"""
+
+import os
+import sys
+import argparse
+
+from ProgressSink import PROGRESS_SINKS
+
+
+def run_segmentation(args, progress):
+    """Detección, máscaras, cajas delimitadoras y fusión de CSV, como la ventana de segmentación."""
+    from SegmentationEngine import SegmentationEngine
+    from YOLOv8ObjectDetector import YOLOv8ObjectDetector
+    from ImageProcessor import ImageProcessor
+    from YOLOv8BBOX import YOLOv8BBOX
+    from MergeDF import MergeDF
+    from Instrumentation import instrumentation_for
+
+    os.makedirs(args.output, exist_ok=True)
+    engine = SegmentationEngine(args.model, args.input, progress, conf=args.conf, batch_size=args.batch_size,
+                                output_folder=None if args.no_resume else args.output,
+                                verbose=not args.quiet, instrumentation=instrumentation_for(args.timings))
+    if args.sweep_batch_sizes:
+        engine.choose_batch_size(args.sweep_batch_sizes)
+    views = [
+        YOLOv8ObjectDetector(args.model, args.input, args.output),
+        ImageProcessor(args.model, args.input, args.output, compute_polygons=args.polygons),
+        YOLOv8BBOX(args.model, args.input, args.output),
+    ]
+    engine.run(views)
+
+    merger = MergeDF(os.path.join(args.output, 'all_bbox_data.csv'),
+                     os.path.join(args.output, 'all_contour_areas.csv'),
+                     os.path.join(args.output, f'merged_dataframe.{args.merge_format}'))
+    rows = merger.merge_csv_files()
+    progress.stage_done('merge', rows=rows, output=merger.output_csv_path)
+
+
+def run_video(args, progress):
+    """Procesamiento de un video o de una carpeta de videos, sin ventana de OpenCV."""
+    from processing_videos import VideoProcessor
+
+    processor = VideoProcessor(model_path=args.model, confidence_threshold=args.conf,
+                               resize_factor=args.resize_factor, progress=progress, display=False,
+                               detect_stride=args.stride, adaptive_stride=args.adaptive_stride,
+                               max_stride=args.max_stride, imgsz=args.imgsz,
+                               roi=tuple(args.roi) if args.roi else None,
+                               export_detections=args.export is not None, export_format=args.export or 'parquet',
+                               analysis_only=args.analysis_only, record_timings=args.timings)
+    if args.video and args.segments > 1:
+        processor.process_video_segments(args.video, workers=args.segments, overlap=args.overlap,
+                                         torch_threads=args.torch_threads)
+    elif args.video:
+        processor.process_single_video(args.video)
+    elif args.workers > 1:
+        processor.process_videos_parallel(args.folder, workers=args.workers, torch_threads=args.torch_threads)
+    else:
+        processor.process_videos(args.folder)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="AI Analyzer Program - batch mode without GUI")
+    parser.add_argument('--progress', choices=sorted(PROGRESS_SINKS), default='stderr',
+                        help="Where progress is reported (default: stderr)")
+    parser.add_argument('--backend', choices=('eager', 'torchscript', 'onnx'), default='eager',
+                        help="Run the model as PyTorch (eager), or export it once to TorchScript/ONNX (default: eager)")
+    parser.add_argument('--int8', action='store_true', help="With --backend onnx, use dynamic int8 quantization")
+    parser.add_argument('--timings', action='store_true',
+                        help="Record per-stage timings (p50/p95/p99) and save them as JSON next to the outputs")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    segment = subparsers.add_parser('segment', help="Run detection, masks, bboxes and CSV merge on an image folder")
+    segment.add_argument('--model', required=True, help="YOLOv8 model file (.pt)")
+    segment.add_argument('--input', required=True, help="Folder with the input images")
+    segment.add_argument('--output', required=True, help="Folder for predictions, masks and CSVs")
+    segment.add_argument('--conf', type=float, default=0.3, help="Confidence threshold (default: 0.3)")
+    segment.add_argument('--batch-size', type=int, default=1, help="Images per predict call (default: 1)")
+    segment.add_argument('--sweep-batch-sizes', type=int, nargs='+', metavar='N', default=None,
+                         help="Benchmark these batch sizes on the input images and run with the fastest")
+    segment.add_argument('--no-resume', action='store_true', help="Ignore the run manifest and process every image")
+    segment.add_argument('--polygons', action='store_true', help="Also save mask contour polygons")
+    segment.add_argument('--merge-format', choices=('csv', 'parquet', 'feather'), default='csv',
+                         help="Format of the merged table (default: csv)")
+    segment.add_argument('--quiet', action='store_true', help="Hide the per-image ultralytics output")
+    segment.set_defaults(func=run_segmentation)
+
+    video = subparsers.add_parser('video', help="Run tracking on a video file or a folder of videos")
+    video.add_argument('--model', required=True, help="YOLOv8 model file (.pt)")
+    source = video.add_mutually_exclusive_group(required=True)
+    source.add_argument('--video', help="Video file to process")
+    source.add_argument('--folder', help="Folder with .mp4/.avi videos to process")
+    video.add_argument('--conf', type=float, default=0.3, help="Confidence threshold (default: 0.3)")
+    video.add_argument('--resize-factor', type=int, default=1, help="Divide the output size by this factor")
+    video.add_argument('--imgsz', type=int, default=None,
+                       help="Longest side of the frame given to the model, independent of the output size")
+    video.add_argument('--roi', type=int, nargs=4, metavar=('X', 'Y', 'W', 'H'), default=None,
+                       help="Only process and save this region of the video (pixels)")
+    video.add_argument('--stride', type=int, default=1,
+                       help="Run detection on every Nth frame and interpolate tracked boxes in between (default: 1)")
+    video.add_argument('--adaptive-stride', action='store_true',
+                       help="Shrink the stride on motion or track changes and grow it on static scenes")
+    video.add_argument('--max-stride', type=int, default=None, help="Upper bound for the adaptive stride")
+    video.add_argument('--workers', type=int, default=1,
+                       help="With --folder, process this many videos at once, one process each (default: 1)")
+    video.add_argument('--torch-threads', type=int, default=None,
+                       help="Torch/OpenCV threads per worker process (default: cores / workers)")
+    video.add_argument('--segments', type=int, default=1,
+                       help="With --video, split it into this many frame ranges processed in parallel (default: 1)")
+    video.add_argument('--overlap', type=int, default=30,
+                       help="Warm-up frames before each segment, used to stitch track ids (default: 30)")
+    video.add_argument('--export', choices=('parquet', 'csv'), default=None,
+                       help="Also write per-frame detections to <video>_detections.<format>")
+    video.add_argument('--analysis-only', action='store_true',
+                       help="Only export detections: no plotting, resizing or video encoding")
+    video.set_defaults(func=run_video)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.backend != 'eager' or args.int8:
+        from ModelRegistry import model_registry
+        try:
+            model_registry.set_backend(args.backend, int8=args.int8)
+        except ValueError as e:
+            parser.error(str(e))
+    progress = PROGRESS_SINKS[args.progress]()
+    args.func(args, progress)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
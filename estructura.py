@@ -8,14 +8,33 @@ Created on Sat Sep 28 17:08:27 2024
 """yolo_app/
 │
 ├── main.py                   # Archivo principal que ejecuta la aplicación
+├── cli.py                    # Ejecución por línea de comandos, sin interfaz gráfica
+├── benchmark.py              # Banco de pruebas con datos sintéticos, modelo simulado y línea base
+├── ProgressSink.py           # Destinos de progreso (nulo, stderr, JSON lines, Tkinter)
+├── EventBus.py               # Eventos de los hilos de trabajo hacia la interfaz
 ├── gui.py                    # Manejo de la interfaz gráfica (Tkinter)
 ├── segmentation_window.py
+    ├── PreviewSurface.py         # Vista previa con límite de FPS, dibujada desde el bucle de Tk
+    ├── SegmentationEngine.py     # Inferencia de una sola pasada compartida por los pasos
+    ├── ImageLoader.py            # Decodificación y redimensionado con prelectura en hilos
+    ├── ImageWriter.py            # Escritura de PNG en segundo plano
+    ├── RunManifest.py            # Manifiesto para reanudar y saltar imágenes sin cambios
+├── ModelRegistry.py          # Caché de modelos compartida (LRU)
+    ├── InferenceBackend.py       # Exportación a TorchScript/ONNX (int8 opcional) con caché en disco
+├── Instrumentation.py        # Tiempos por tramo (p50/p95/p99) y resumen JSON de cada ejecución
     ├── YOLOv8ObjectDetector.py    
     ├── ImageProcessor.py         # Funciones relacionadas con el procesamiento de imágenes
     ├── YOLOv8BBOX.py             
     ├── MergeDF.py                # Newly created file
 ├──processing_videos.py
+    ├── VideoPipeline.py          # Decodificación / inferencia / codificación en hilos con colas acotadas
+    ├── TrackInterpolation.py     # Detección cada N frames con cajas interpoladas por track
+    ├── DetectionExporter.py      # Detecciones por frame en Parquet/CSV, escritas por bloques
 ├──camera_detection.py
+    ├── CameraStream.py           # Captura en hilo propio que solo conserva el último frame
+    ├── ClipRecorder.py           # Grabación en segundo plano con buffer previo en JPEG
+├──multi_camera_detection.py
+    ├── MultiStreamInference.py   # Varias cámaras, un modelo: inferencia por lotes y un tracker por cámara
 
 """
 #main.py 
@@ -15,7 +15,9 @@ from matplotlib.figure import Figure
 # Importar ventanas adicionales y módulos de procesamiento
 from segmentation_window import SegmentationWindow
 from camera_detection import CameraDetection
+from multi_camera_detection import MultiCameraDetection
 from processing_videos import VideoProcessorApp  # Cambiado para usar la nueva clase VideoProcessorApp
+from ModelRegistry import model_registry
 
 class MainWindow:
     def __init__(self, master):
@@ -24,6 +26,11 @@ class MainWindow:
         self.master.maxsize(width=1000, height=600)
         self.master.title('AI - ANALIZER PROGRAM')
 
+        # Backend de inferencia de los modelos que se carguen (ver InferenceBackend)
+        self.backend_var = tk.StringVar(value="eager")
+        # Imágenes por llamada a predict en la segmentación ('auto' = medir y usar el más rápido)
+        self.batch_size_var = tk.StringVar(value="1")
+
         # Barra de progreso
         #self.progress_var = tk.DoubleVar()
         #self.progress_bar = ttk.Progressbar(self.master, variable=self.progress_var, mode='determinate')
@@ -57,14 +64,39 @@ class MainWindow:
         image_menu.add_cascade(label="Detection", menu=detection_menu)
         detection_menu.add_command(label="Video file", command=self.open_file_detection_window)
         detection_menu.add_command(label="Video camera", command=self.process_camera_detection)
+        detection_menu.add_command(label="Multiple cameras", command=self.process_multi_camera_detection)
 
         # Opción de segmentación
         image_menu.add_command(label="Segmentation", command=self.open_segmentation_window)
 
+        # Menú Settings: formato en el que se ejecuta el modelo (solo CPU)
+        settings_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Settings", menu=settings_menu)
+        backend_menu = tk.Menu(settings_menu, tearoff=0)
+        settings_menu.add_cascade(label="Inference backend", menu=backend_menu)
+        for label, value in (("PyTorch (.pt)", "eager"), ("TorchScript", "torchscript"),
+                             ("ONNX Runtime", "onnx"), ("ONNX Runtime int8", "onnx-int8")):
+            backend_menu.add_radiobutton(label=label, value=value, variable=self.backend_var,
+                                         command=self.set_inference_backend)
+        batch_menu = tk.Menu(settings_menu, tearoff=0)
+        settings_menu.add_cascade(label="Segmentation batch size", menu=batch_menu)
+        for value in ("1", "2", "4", "8"):
+            batch_menu.add_radiobutton(label=value, value=value, variable=self.batch_size_var)
+        batch_menu.add_radiobutton(label="Auto (benchmark 1/2/4/8)", value="auto", variable=self.batch_size_var)
+
         help_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Help", menu=help_menu)
         help_menu.add_command(label="About", command=self.about)
 
+    def set_inference_backend(self):
+        """Aplicar el backend elegido a los modelos que se carguen a partir de ahora."""
+        value = self.backend_var.get()
+        model_registry.set_backend(value.replace('-int8', ''), int8=value.endswith('-int8'))
+        if value != "eager":
+            messagebox.showinfo("Inference backend",
+                                "Models selected from now on will be exported once and cached on disk.\n"
+                                "If the export fails, the PyTorch model is used instead.")
+
     def close_program(self):
         """Función para cerrar el programa."""
         self.master.destroy()
@@ -76,7 +108,8 @@ class MainWindow:
     def open_segmentation_window(self):
         """Abrir la ventana de segmentación en una nueva ventana."""
         new_window = tk.Toplevel(self.master)
-        SegmentationWindow(new_window)
+        batch_size = self.batch_size_var.get()
+        SegmentationWindow(new_window, batch_size=batch_size if batch_size == "auto" else int(batch_size))
 
     def open_file_detection_window(self):
         """Abrir una nueva ventana para la detección basada en archivo de video."""
@@ -91,6 +124,9 @@ class MainWindow:
         """Abre la ventana de detección de cámara."""
         CameraDetection(self.master)  # Se pasa la ventana principal como root
 
+    def process_multi_camera_detection(self):
+        """Abre la ventana de detección con varias cámaras y un único modelo."""
+        MultiCameraDetection(self.master)
 
     def about(self):
         """Mostrar información del programa."""
@@ -0,0 +1,133 @@
+import tkinter as tk
+from tkinter import filedialog, messagebox
+from ModelRegistry import get_model
+from InferenceBackend import model_backend
+from MultiStreamInference import MultiStreamInference
+from EventBus import EventBus, ErrorEvent
+
+
+class MultiCameraDetection:
+    """Ventana para detectar con varias cámaras a la vez, compartiendo un único modelo."""
+
+    def __init__(self, root, confidence_threshold=0.3):
+        self.root = root
+        self.model = None  # El modelo se cargará después
+        self.backend = None  # Backend con el que se cargó el modelo (no el que esté elegido al arrancar)
+        self.engine = None
+        self.confidence_threshold = confidence_threshold
+        self.model_label_var = tk.StringVar(value="No model selected")
+        self.stats_var = tk.StringVar(value="No cameras running")
+        self.create_window()
+
+        # Canal de eventos: el hilo de inferencia avisa de sus errores sin tocar los widgets
+        self.events = EventBus()
+        self.events.attach(self.window, {ErrorEvent: lambda event: messagebox.showerror("Error", event.message)})
+
+    def create_window(self):
+        """Crea la interfaz de la detección con varias cámaras."""
+        self.window = tk.Toplevel(self.root)
+        self.window.title("Multi-Camera AI Detection")
+        self.window.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        tk.Button(self.window, text="Select Model (.pt) File", command=self.select_model_file).pack(pady=10)
+        tk.Label(self.window, textvariable=self.model_label_var).pack(pady=5)
+
+        # Cámaras separadas por comas: índices USB o URLs (rtsp://...)
+        tk.Label(self.window, text="Cameras (comma-separated indexes or URLs)").pack(pady=5)
+        self.sources_entry = tk.Entry(self.window, width=50)
+        self.sources_entry.insert(0, "0, 1")
+        self.sources_entry.pack(pady=5)
+
+        tk.Label(self.window, text="Confidence Threshold").pack(pady=5)
+        self.threshold_entry = tk.Entry(self.window)
+        self.threshold_entry.insert(0, str(self.confidence_threshold))
+        self.threshold_entry.pack(pady=5)
+
+        self.start_button = tk.Button(self.window, text="Start Cameras", command=self.start_streams)
+        self.start_button.pack(pady=5)
+        self.stop_button = tk.Button(self.window, text="Stop Cameras", command=self.stop_streams, state=tk.DISABLED)
+        self.stop_button.pack(pady=5)
+
+        # FPS y latencia de cada cámara
+        tk.Label(self.window, textvariable=self.stats_var, justify=tk.LEFT, font=("Courier", 10)).pack(pady=10)
+
+    def select_model_file(self):
+        """Selecciona el archivo del modelo .pt."""
+        model_path = filedialog.askopenfilename(title="Select a model file",
+                                                filetypes=[("PyTorch model files", "*.pt")])
+        if model_path:
+            self.model = get_model(model_path, purpose='predict')
+            self.backend = model_backend(self.model)
+            self.model_label_var.set(f"Model loaded: {model_path.split('/')[-1]}")
+        else:
+            self.model_label_var.set("No model selected")
+
+    @staticmethod
+    def parse_sources(text):
+        """Convierte '0, 1, rtsp://...' en {nombre: fuente}; los números son índices USB."""
+        sources = {}
+        for item in (part.strip() for part in text.split(',')):
+            if item:
+                sources[item] = int(item) if item.isdigit() else item
+        return sources
+
+    def start_streams(self):
+        """Abre las cámaras e inicia la inferencia compartida."""
+        if not self.model:
+            messagebox.showerror("Error", "Please select a model file first.")
+            return
+
+        sources = self.parse_sources(self.sources_entry.get())
+        if not sources:
+            messagebox.showerror("Error", "Please enter at least one camera.")
+            return
+
+        try:
+            confidence_threshold = float(self.threshold_entry.get())
+            if not (0 <= confidence_threshold <= 1):
+                raise ValueError("Threshold must be between 0 and 1")
+        except ValueError:
+            messagebox.showerror("Error", "Invalid confidence threshold.")
+            return
+
+        self.engine = MultiStreamInference(self.model, sources, conf=confidence_threshold, events=self.events,
+                                           backend=self.backend)
+        try:
+            self.engine.start()
+        except Exception as e:
+            self.engine = None
+            messagebox.showerror("Error", str(e))
+            return
+
+        self.start_button.config(state=tk.DISABLED)
+        self.stop_button.config(state=tk.NORMAL)
+        self.window.after(500, self.refresh_stats)
+
+    def refresh_stats(self):
+        """Muestra los FPS y la latencia de cada cámara (hilo de Tk)."""
+        if self.engine is None:
+            return
+        stats = self.engine.stats()
+        batch = stats.pop('batch')
+        lines = [f"{name:>12}: {s['fps']:5.1f} fps  {s['latency_ms']:6.0f} ms  "
+                 f"{s['tracks']:3d} tracks  {s['dropped']} dropped" for name, s in stats.items()]
+        lines.append(f"Mean batch size: {batch['mean_size']}")
+        self.stats_var.set("\n".join(lines))
+
+        if self.engine.is_running():
+            self.window.after(500, self.refresh_stats)
+        else:
+            self.stop_streams()
+
+    def stop_streams(self):
+        """Detiene las cámaras."""
+        if self.engine is not None:
+            self.engine.stop()
+            self.engine = None
+        self.start_button.config(state=tk.NORMAL)
+        self.stop_button.config(state=tk.DISABLED)
+
+    def on_close(self):
+        self.stop_streams()
+        self.events.detach()
+        self.window.destroy()
@@ -7,22 +7,54 @@ Created on Wed Oct 23 09:27:18 2024
 """
 
 import os
+import time
+import queue
+import shutil
+import tempfile
+import subprocess
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import cv2
-from ultralytics import YOLO
-import tkinter as tk
-from tkinter import filedialog, messagebox
+import numpy as np
+from ModelRegistry import get_model, model_lock, model_registry, reset_tracker, TrackingModelSlot
+from ProgressSink import NullProgress, QueueProgress, replay_progress
+from VideoPipeline import VideoPipeline, FrameRange
+from DetectionExporter import DetectionExporter
+from Instrumentation import (NULL_INSTRUMENTATION, RESIZE, INFERENCE, POSTPROCESS, DISK_WRITE, GUI_UPDATE,
+                             instrumentation_for)
+from TrackInterpolation import (StrideTracker, detections_from_result, draw_detections, stitch_track_ids,
+                                remap_track_ids)
+try:
+    import tkinter as tk
+    from tkinter import filedialog, messagebox
+except ImportError:  # Python sin Tk: VideoProcessor (cli.py) funciona igual, solo VideoProcessorApp necesita Tk
+    tk = filedialog = messagebox = None
+
+# Región de interés y tamaños (ancho, alto) de un video; ver VideoProcessor._frame_geometry
+FrameGeometry = namedtuple('FrameGeometry', ['roi', 'source_size', 'output_size', 'inference_size', 'box_scale',
+                                             'interpolating', 'render_output'])
 
 class VideoProcessorApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Video File AI Detection")
-        self.root.geometry("400x500")
+        self.root.geometry("400x810")
 
         # Variables para almacenar las rutas seleccionadas
         self.video_path = None
         self.model_path = None
         self.confidence_threshold = tk.DoubleVar(value=0.3)  # Valor por defecto
         self.resize_factor = tk.IntVar(value=1)  # Valor por defecto de resize
+        self.detect_stride = tk.IntVar(value=1)  # Detectar en todos los frames por defecto
+        self.adaptive_stride = tk.BooleanVar(value=False)
+        self.inference_size = tk.StringVar(value="Auto")  # Lado mayor del frame que recibe el modelo
+        self.roi = None  # Región de interés (x, y, w, h) en píxeles del video, o None para el frame completo
+        self.workers = tk.IntVar(value=1)  # Procesos para una carpeta de videos (1 = uno tras otro)
+        self.export_detections = tk.BooleanVar(value=False)  # Guardar las detecciones de cada frame
+        self.analysis_only = tk.BooleanVar(value=False)  # Solo las detecciones, sin video de salida
+        self.record_timings = tk.BooleanVar(value=False)  # Guardar los tiempos por tramo de cada video
+        self.tracking_model = TrackingModelSlot()  # Modelo propio de la ventana, reutilizado entre pulsaciones
 
         # Crear interfaz
         self.create_widgets()
@@ -51,6 +83,32 @@ class VideoProcessorApp:
                                        variable=self.resize_factor)
         self.resize_slider.pack()
 
+        # Slider para detectar solo en uno de cada N frames (el resto se interpola)
+        tk.Label(self.root, text="Detection Stride:").pack(pady=10)
+        self.stride_slider = tk.Scale(self.root, from_=1, to=10, orient=tk.HORIZONTAL, resolution=1,
+                                      variable=self.detect_stride)
+        self.stride_slider.pack()
+        tk.Checkbutton(self.root, text="Adaptive stride", variable=self.adaptive_stride).pack()
+
+        # Tamaño de inferencia, independiente del tamaño de salida
+        tk.Label(self.root, text="Inference Size:").pack(pady=10)
+        tk.OptionMenu(self.root, self.inference_size, "Auto", "320", "480", "640", "960", "1280").pack()
+
+        # Región de interés opcional, elegida sobre el primer frame del video
+        tk.Button(self.root, text="Select ROI", command=self.select_roi).pack(pady=10)
+        self.roi_label = tk.Label(self.root, text="ROI: full frame")
+        self.roi_label.pack()
+
+        # Slider para procesar varios videos a la vez, cada uno en su propio proceso
+        tk.Label(self.root, text="Parallel Workers (folder):").pack(pady=10)
+        tk.Scale(self.root, from_=1, to=max(1, os.cpu_count() or 1), orient=tk.HORIZONTAL, resolution=1,
+                 variable=self.workers).pack()
+
+        # Exportación de detecciones por frame y modo de solo análisis
+        tk.Checkbutton(self.root, text="Export detections (Parquet/CSV)", variable=self.export_detections).pack()
+        tk.Checkbutton(self.root, text="Analysis only (no output video)", variable=self.analysis_only).pack()
+        tk.Checkbutton(self.root, text="Record timings (JSON)", variable=self.record_timings).pack()
+
         # Botón para procesar un único video
         tk.Button(self.root, text="Process Single Video", command=self.process_single_video).pack(pady=10)
 
@@ -92,14 +150,47 @@ class VideoProcessorApp:
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {e}")
 
+    def select_roi(self):
+        """Elegir la región de interés sobre el primer frame del video seleccionado."""
+        if not self.video_path:
+            messagebox.showerror("Error", "Please select a video file first.")
+            return
+
+        cap = cv2.VideoCapture(self.video_path)
+        ret, frame = cap.read()
+        cap.release()
+        if not ret:
+            messagebox.showerror("Error", "Could not read the first frame of the video.")
+            return
+
+        x, y, w, h = cv2.selectROI("Select ROI (Enter to confirm, c to cancel)", frame)
+        cv2.destroyAllWindows()
+        if w and h:
+            self.roi = (int(x), int(y), int(w), int(h))
+            self.roi_label.config(text=f"ROI: x={x} y={y} w={w} h={h}")
+        else:
+            self.roi = None
+            self.roi_label.config(text="ROI: full frame")
+
+    def create_processor(self):
+        """Crear el VideoProcessor con los valores actuales de la interfaz."""
+        imgsz = self.inference_size.get()
+        imgsz = None if imgsz == "Auto" else int(imgsz)
+        model = self.tracking_model.get(self.model_path, imgsz=imgsz)
+        return VideoProcessor(model_path=self.model_path, model=model, backend=self.tracking_model.backend, confidence_threshold=self.confidence_threshold.get(),
+                              resize_factor=self.resize_factor.get(), output_label=self.output_label, root=self.root,
+                              detect_stride=self.detect_stride.get(), adaptive_stride=self.adaptive_stride.get(),
+                              imgsz=imgsz, roi=self.roi,
+                              export_detections=self.export_detections.get(),
+                              analysis_only=self.analysis_only.get(), record_timings=self.record_timings.get())
+
     def process_single_video(self):
         """Procesar un único video."""
         if not self.video_path or not self.model_path:
             messagebox.showerror("Error", "Please select both a video file and a model file.")
             return
 
-        processor = VideoProcessor(model_path=self.model_path, confidence_threshold=self.confidence_threshold.get(),
-                                   resize_factor=self.resize_factor.get(), output_label=self.output_label, root=self.root)
+        processor = self.create_processor()
         processor.process_single_video(self.video_path)
 
     def process_multiple_videos(self):
@@ -109,35 +200,212 @@ class VideoProcessorApp:
             messagebox.showerror("Error", "Please select both a folder with videos and a model file.")
             return
 
-        processor = VideoProcessor(model_path=self.model_path, confidence_threshold=self.confidence_threshold.get(),
-                                   resize_factor=self.resize_factor.get(), output_label=self.output_label, root=self.root)
-        processor.process_videos(video_directory)
+        processor = self.create_processor()
+        if self.workers.get() > 1:
+            processor.process_videos_parallel(video_directory, workers=self.workers.get())
+        else:
+            processor.process_videos(video_directory)
 
 class VideoProcessor:
-    def __init__(self, model_path, confidence_threshold=0.3, resize_factor=1, output_label=None, root=None):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path, confidence_threshold=0.3, resize_factor=1, output_label=None, root=None,
+                 progress=None, display=True, display_fps=30, queue_size=8, detect_stride=1,
+                 adaptive_stride=False, max_stride=None, imgsz=None, roi=None, export_detections=False,
+                 export_format='parquet', analysis_only=False, record_timings=False, backend=None, model=None):
+        """
+        Procesador de videos con seguimiento YOLO.
+
+        Args:
+            model_path (str): Ruta al archivo del modelo (.pt).
+            confidence_threshold (float): Umbral de confianza.
+            resize_factor (int): Divisor del tamaño de salida (respecto al frame o a la región de interés).
+            output_label (tk.Label): Etiqueta donde se muestra la ruta de salida (opcional).
+            root (tk.Tk): Ventana principal; None para ejecutar sin interfaz (los avisos van a la consola).
+            progress: Destino del progreso por frame (ver ProgressSink); nulo por defecto.
+            display (bool): Mostrar los frames procesados en una ventana de OpenCV.
+            display_fps (float): Máximo de frames por segundo mostrados; el resto se procesa sin mostrar.
+            queue_size (int): Frames en cola entre decodificación, inferencia y codificación.
+            detect_stride (int): Detectar en uno de cada N frames e interpolar las cajas en el resto.
+            adaptive_stride (bool): Reducir el paso cuando hay movimiento o cambian los tracks, y ampliarlo si no.
+            max_stride (int): Paso máximo en modo adaptativo (por defecto, el doble de `detect_stride`).
+            imgsz (int): Lado mayor del frame que recibe el modelo; el frame se reduce antes de la
+                inferencia y ultralytics lo rellena (letterbox). None usa el tamaño por defecto del modelo.
+            roi (tuple): Región de interés (x, y, w, h) en píxeles del video; solo se procesa y guarda esa zona.
+            export_detections (bool): Guardar las detecciones de cada frame en `<video>_detections.<formato>`.
+            export_format (str): 'parquet' (si pyarrow está instalado) o 'csv'.
+            analysis_only (bool): Solo exportar las detecciones: sin plot(), redimensionado, video ni ventana.
+            record_timings (bool): Medir los tramos de cada video (ver Instrumentation) y guardar el
+                resumen en `<video>_timings.json`.
+            backend (BackendOptions): Backend de inferencia (ver InferenceBackend); por defecto el
+                elegido en `model_registry`. El modelo exportado usa `imgsz` como tamaño de entrada.
+            model: Modelo de seguimiento ya cargado y propio de quien lo pasa (ver TrackingModelSlot),
+                cargado con `backend` e `imgsz`; None para cargar uno nuevo.
+        """
+        self.model_path = model_path
+        self.backend = backend if backend is not None else model_registry.backend
+        self.model = model if model is not None else get_model(model_path, purpose='track', backend=self.backend,
+                                                                  imgsz=imgsz)
         self.confidence_threshold = confidence_threshold
         self.resize_factor = resize_factor
         self.output_label = output_label  # Para actualizar la ruta de salida en la interfaz
         self.stop_processing = False  # Variable para parar el procesamiento en múltiples videos
         self.skip_current_video = False  # Variable para saltar al siguiente video
         self.root = root  # Referencia a la ventana principal de tkinter
+        self.progress = progress if progress is not None else NullProgress()
+        self.display = display
+        self.display_fps = display_fps
+        self.queue_size = queue_size
+        self.detect_stride = detect_stride
+        self.adaptive_stride = adaptive_stride
+        self.max_stride = max_stride if max_stride is not None else max(2, detect_stride * 2)
+        self.imgsz = imgsz
+        self.roi = roi
+        self.analysis_only = analysis_only
+        self.export_detections = export_detections or analysis_only
+        self.export_format = export_format
+        self.record_timings = record_timings
+
+    def _notify(self, kind, title, message):
+        """Mostrar un aviso en un messagebox o, sin interfaz, en la consola."""
+        if self.root is None:
+            print(f"{title}: {message}")
+        elif kind == 'error':
+            messagebox.showerror(title, message)
+        elif kind == 'warning':
+            messagebox.showwarning(title, message)
+        else:
+            messagebox.showinfo(title, message)
+
+    def _clip_roi(self, width, height):
+        """Recortar la región de interés a los límites del frame (None si no hay región)."""
+        if self.roi is None:
+            return None
+        x, y, w, h = (int(v) for v in self.roi)
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(width, x + w), min(height, y + h)
+        if x2 <= x1 or y2 <= y1:
+            raise ValueError(f"ROI {self.roi} is outside the {width}x{height} frame.")
+        return x1, y1, x2 - x1, y2 - y1
+
+    def _worker_options(self):
+        """Opciones con las que cada proceso de `process_videos_parallel` crea su VideoProcessor."""
+        return {'confidence_threshold': self.confidence_threshold, 'resize_factor': self.resize_factor,
+                'queue_size': self.queue_size, 'detect_stride': self.detect_stride,
+                'adaptive_stride': self.adaptive_stride, 'max_stride': self.max_stride,
+                'imgsz': self.imgsz, 'roi': self.roi, 'export_detections': self.export_detections,
+                'export_format': self.export_format, 'analysis_only': self.analysis_only,
+                'record_timings': self.record_timings, 'backend': self.backend}
+
+    def _reset_tracker(self):
+        """
+        Descartar el estado del tracker antes de un video nuevo.
+
+        Con `persist=True` ultralytics conserva los trackers en el predictor del
+        modelo, que se reutiliza entre videos y entre pulsaciones de la ventana
+        (es solo de este consumidor, ver TrackingModelSlot), así que sin esto
+        los tracks y sus ids pasarían de un archivo al siguiente.
+        """
+        reset_tracker(self.model)
+
+    def _frame_geometry(self, width, height):
+        """
+        Calcular la región de interés y los tamaños de inferencia y de salida de un video.
+
+        Sin interpolación, tamaño de inferencia ni región de interés se dibuja con
+        plot() a resolución completa, como siempre (`render_output` False). Si no,
+        el frame se recorta y reduce antes de la inferencia y las cajas se dibujan
+        directamente sobre el frame de salida.
+
+        Args:
+            width (int): Ancho del video original.
+            height (int): Alto del video original.
+
+        Returns:
+            FrameGeometry: Geometría del video.
+        """
+        roi = self._clip_roi(width, height)
+        source_size = (roi[2], roi[3]) if roi else (width, height)
+        output_size = (max(1, source_size[0] // self.resize_factor), max(1, source_size[1] // self.resize_factor))
+
+        # Frame que recibe el modelo: la región (o el frame) reducida a imgsz en su lado mayor
+        inference_scale = min(1.0, self.imgsz / max(source_size)) if self.imgsz else 1.0
+        inference_size = (max(1, round(source_size[0] * inference_scale)),
+                          max(1, round(source_size[1] * inference_scale)))
+        # Las detecciones siempre quedan en coordenadas del video de salida
+        box_scale = np.array([output_size[0] / inference_size[0], output_size[1] / inference_size[1]] * 2,
+                             dtype=np.float32)
+
+        interpolating = self.detect_stride > 1 or self.adaptive_stride
+        render_output = interpolating or self.imgsz is not None or roi is not None
+        return FrameGeometry(roi, source_size, output_size, inference_size, box_scale, interpolating, render_output)
+
+    @staticmethod
+    def _crop(frame, geometry):
+        if not geometry.roi:
+            return frame
+        x, y, w, h = geometry.roi
+        return frame[y:y + h, x:x + w]
+
+    def _output_frame(self, frame, geometry):
+        """Recortar la región de interés y llevar el frame al tamaño de salida."""
+        frame = self._crop(frame, geometry)
+        if geometry.output_size != geometry.source_size:
+            return cv2.resize(frame, geometry.output_size, interpolation=cv2.INTER_AREA)
+        return frame
+
+    def _inference_frame(self, frame, geometry):
+        """Recortar la región de interés y llevar el frame al tamaño de inferencia."""
+        frame = self._crop(frame, geometry)
+        if geometry.inference_size != geometry.source_size:
+            return cv2.resize(frame, geometry.inference_size, interpolation=cv2.INTER_AREA)
+        return np.ascontiguousarray(frame)
+
+    def _stride_tracker(self, geometry, instrumentation=NULL_INSTRUMENTATION):
+        """Crear el StrideTracker que detecta con el modelo y deja las cajas en coordenadas de salida."""
+        track_args = {'conf': self.confidence_threshold, 'persist': True}
+        if self.imgsz:
+            track_args['imgsz'] = self.imgsz
+
+        def detect(frame):
+            # Un solo hilo de inferencia, así el tracker recibe los frames en orden
+            with model_lock(self.model), instrumentation.span(INFERENCE):
+                results = self.model.track(frame, **track_args)
+            detections = detections_from_result(results[0])
+            detections[:, :4] *= geometry.box_scale
+            return detections, results[0]
+
+        return StrideTracker(detect, stride=self.detect_stride, adaptive=self.adaptive_stride,
+                             max_stride=self.max_stride)
+
+    def _open_exporter(self, video_path, fps):
+        """Abrir el archivo de detecciones del video, si se exportan."""
+        if not self.export_detections:
+            return None
+        return DetectionExporter(os.path.splitext(video_path)[0] + '_detections', fps=fps,
+                                 output_format=self.export_format)
+
+    def _set_output_label(self, text):
+        """Actualizar la etiqueta de salida, si hay interfaz."""
+        if self.output_label is not None:
+            self.output_label.config(text=text)
+        if self.root is not None:
+            self.root.update()  # Forzar actualización de tkinter
 
     def process_single_video(self, video_path):
         """Procesar un único video."""
         if not video_path:
-            messagebox.showerror("Error", "Please select a video file first")
+            self._notify('error', "Error", "Please select a video file first")
             return
         output_path = self._process_video(video_path, single_video=True)
         if output_path:
-            messagebox.showinfo("Done", f"Video processing complete. Output saved at:\n{output_path}")
-            self.output_label.config(text=f"Output saved at: {output_path}")
+            self._notify('info', "Done", f"Video processing complete. Output saved at:\n{output_path}")
+            self._set_output_label(f"Output saved at: {output_path}")
+        return output_path
 
     def process_videos(self, video_directory):
         """Procesar múltiples videos desde una carpeta."""
         video_files = [f for f in os.listdir(video_directory) if f.endswith(('.mp4', '.avi'))]
         if not video_files:
-            messagebox.showerror("Error", "No video files found in the selected directory")
+            self._notify('error', "Error", "No video files found in the selected directory")
             return
 
         for video_file in video_files:
@@ -146,81 +414,475 @@ class VideoProcessor:
             video_path = os.path.join(video_directory, video_file)
             output_path = self._process_video(video_path, single_video=False)
             if output_path:
-                self.output_label.config(text=f"Output saved at: {output_path}")
-                self.root.update()  # Forzar actualización de tkinter
-        
+                self._set_output_label(f"Output saved at: {output_path}")
+
         if not self.stop_processing:
-            messagebox.showinfo("Done", f"Video processing complete. Outputs saved in: {video_directory}")
+            self._notify('info', "Done", f"Video processing complete. Outputs saved in: {video_directory}")
         else:
-            messagebox.showwarning("Processing Stopped", "Video processing was stopped manually.")
+            self._notify('warning', "Processing Stopped", "Video processing was stopped manually.")
 
         # Restablecer el texto de la etiqueta a "Output Path" después de detener el procesamiento
-        self.output_label.config(text="Output Path")
-        self.root.update()  # Forzar actualización de tkinter
+        self._set_output_label("Output Path")
+
+    def process_videos_parallel(self, video_directory, workers=2, torch_threads=None):
+        """
+        Procesar los videos de una carpeta en varios procesos a la vez.
+
+        Cada proceso carga su propio modelo y procesa videos completos, sin
+        ventana de OpenCV; el progreso llega a `self.progress` a través de una
+        cola. Mientras tanto la interfaz (si la hay) se sigue actualizando.
+
+        Args:
+            video_directory (str): Carpeta con los videos (.mp4/.avi).
+            workers (int): Número de procesos.
+            torch_threads (int): Hilos de torch y OpenCV por proceso; por defecto se reparten
+                los núcleos entre los procesos para no sobresuscribirlos.
+
+        Returns:
+            list: Rutas de los videos de salida generados.
+        """
+        video_files = [f for f in os.listdir(video_directory) if f.endswith(('.mp4', '.avi'))]
+        if not video_files:
+            self._notify('error', "Error", "No video files found in the selected directory")
+            return []
+
+        workers = max(1, min(workers, len(video_files)))
+        if torch_threads is None:
+            torch_threads = max(1, (os.cpu_count() or 1) // workers)
+
+        outputs = []
+        # 'spawn' para no heredar el estado de torch ni de Tk del proceso padre
+        context = multiprocessing.get_context('spawn')
+        with context.Manager() as manager:
+            messages = manager.Queue()
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_video_worker,
+                                     initargs=(self.model_path, self._worker_options(), torch_threads,
+                                               messages)) as pool:
+                futures = {pool.submit(_process_video_in_worker, os.path.join(video_directory, f)): f
+                           for f in video_files}
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                    self._replay_worker_messages(messages)
+                    for future in done:
+                        try:
+                            output_path = future.result()
+                        except Exception as e:
+                            print(f"Error processing {futures[future]}: {e}")
+                            continue
+                        if output_path:
+                            outputs.append(output_path)
+                            self._set_output_label(f"Output saved at: {output_path}")
+                    if self.root is not None:
+                        self.root.update()  # Mantener la interfaz viva mientras trabajan los procesos
+                    if self.stop_processing:
+                        for future in pending:
+                            future.cancel()
+                self._replay_worker_messages(messages)
+
+        if not self.stop_processing:
+            self._notify('info', "Done", f"Video processing complete. Outputs saved in: {video_directory}")
+        else:
+            self._notify('warning', "Processing Stopped", "Video processing was stopped manually.")
+        self._set_output_label("Output Path")
+        return outputs
+
+    def process_video_segments(self, video_path, workers=2, overlap=30, torch_threads=None):
+        """
+        Procesar un único video largo dividiéndolo en tramos que se procesan en paralelo.
+
+        Cada tramo [inicio, fin) se sigue en su propio proceso empezando
+        `overlap` frames antes (calentamiento del tracker). Los frames de
+        solapamiento, que también procesa el tramo anterior, sirven para
+        traducir los ids de track de cada tramo a ids globales. Después cada
+        proceso dibuja su tramo con los ids ya traducidos y los tramos se unen
+        en el `_output.avi` final con `ffmpeg -c copy`, sin recodificar (o con
+        OpenCV si ffmpeg no está disponible). Las cajas se dibujan siempre con
+        `draw_detections`, sin máscaras. Las detecciones exportadas llevan ya
+        los ids globales; en modo de solo análisis no se dibuja ningún tramo.
+
+        Args:
+            video_path (str): Ruta del video.
+            workers (int): Número de procesos y de tramos.
+            overlap (int): Frames de calentamiento antes de cada tramo.
+            torch_threads (int): Hilos de torch y OpenCV por proceso (por defecto, núcleos / procesos).
+
+        Returns:
+            str: Ruta del video de salida.
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            self._notify('error', "Error", "Could not open video file.")
+            return
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self._clip_roi(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+
+        if workers <= 1 or total_frames < workers * max(2 * overlap, 1):
+            print("Video too short to split into segments, processing it in a single pass.")
+            return self.process_single_video(video_path)
+
+        if torch_threads is None:
+            torch_threads = max(1, (os.cpu_count() or 1) // workers)
+        bounds = np.linspace(0, total_frames, workers + 1).astype(int)
+        # (primer frame con calentamiento, primer frame del tramo, fin del tramo)
+        ranges = [(max(0, int(bounds[i]) - overlap) if i else 0, int(bounds[i]), int(bounds[i + 1]))
+                  for i in range(workers)]
+
+        output_file = os.path.splitext(video_path)[0] + '_output.avi'
+        stage = os.path.basename(video_path)
+        segment_dir = tempfile.mkdtemp(prefix='.segments_', dir=os.path.dirname(os.path.abspath(output_file)))
+        context = multiprocessing.get_context('spawn')
+        try:
+            with context.Manager() as manager:
+                messages = manager.Queue()
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_video_worker,
+                                         initargs=(self.model_path, self._worker_options(), torch_threads,
+                                                   messages)) as pool:
+                    # 1) Seguimiento de cada tramo, con su calentamiento
+                    futures = [pool.submit(_track_segment_in_worker, video_path, warm_start, stop,
+                                           f"{stage} [track {i + 1}/{workers}]")
+                               for i, (warm_start, start, stop) in enumerate(ranges)]
+                    tracks = self._wait_for_workers(futures, messages)
+
+                    # 2) Ids globales a partir de los frames de solapamiento
+                    segment_detections = self._stitch_segments(tracks, ranges)
+                    frames = sum(len(detections) for detections in segment_detections)
+                    exporter = self._open_exporter(video_path, fps)
+                    if exporter is not None:
+                        with exporter:
+                            for (_, start, _), detections in zip(ranges, segment_detections):
+                                for offset, frame_detections in enumerate(detections):
+                                    exporter.add(start + offset, frame_detections)
+                        if self.analysis_only:
+                            output_file = exporter.output_path
+                            segment_paths = None
+
+                    # 3) Dibujo y codificación de cada tramo con los ids traducidos
+                    if not self.analysis_only:
+                        segment_paths = [os.path.join(segment_dir, f"segment_{i:03d}.avi") for i in range(workers)]
+                        futures = [pool.submit(_render_segment_in_worker, video_path, start, stop, detections,
+                                               path, f"{stage} [render {i + 1}/{workers}]")
+                                   for i, ((_, start, stop), detections, path)
+                                   in enumerate(zip(ranges, segment_detections, segment_paths))]
+                        frames = sum(self._wait_for_workers(futures, messages))
+
+            if segment_paths:
+                self._concat_segments(segment_paths, output_file, fps)
+        finally:
+            shutil.rmtree(segment_dir, ignore_errors=True)
+
+        self.progress.stage_done(stage, frames=frames, output=output_file, segments=workers)
+        self._notify('info', "Done", f"Video processing complete. Output saved at:\n{output_file}")
+        self._set_output_label(f"Output saved at: {output_file}")
+        return output_file
+
+    def _stitch_segments(self, tracks, ranges):
+        """
+        Traducir los ids de cada tramo a ids globales y quitar los frames de calentamiento.
+
+        Args:
+            tracks (list): Por tramo, detecciones (N, 7) de cada frame desde su primer frame con calentamiento.
+            ranges (list): Por tramo, (primer frame con calentamiento, primer frame, fin).
+
+        Returns:
+            list: Por tramo, detecciones de sus frames [inicio, fin) con ids globales.
+        """
+        stitched = []
+        previous, previous_start = None, 0
+        next_id = 1
+        for detections, (warm_start, start, stop) in zip(tracks, ranges):
+            local_ids = {int(i) for frame in detections for i in frame[:, 4] if i >= 0}
+            if previous is None:
+                mapping = {i: i for i in local_ids}
+                next_id = max(local_ids, default=0) + 1
+            else:
+                overlap_previous, overlap_current = [], []
+                for frame_index in range(warm_start, start):
+                    i, j = frame_index - previous_start, frame_index - warm_start
+                    if 0 <= i < len(previous) and j < len(detections):
+                        overlap_previous.append(previous[i])
+                        overlap_current.append(detections[j])
+                mapping, next_id = stitch_track_ids(overlap_previous, overlap_current, local_ids, next_id)
+
+            remapped = [remap_track_ids(frame, mapping) for frame in detections]
+            stitched.append(remapped[start - warm_start:])
+            previous, previous_start = remapped, warm_start
+        return stitched
+
+    def _track_segment(self, video_path, start, stop, stage):
+        """
+        Seguir los frames [start, stop) de un video con un tracker nuevo, sin codificar nada.
+
+        Returns:
+            list: Detecciones (N, 7) de cada frame, en coordenadas de salida.
+        """
+        self._reset_tracker()
+        reader = FrameRange(video_path, start, stop)
+        geometry = self._frame_geometry(int(reader.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                                        int(reader.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        stride_tracker = self._stride_tracker(geometry)
+        detections = []
+
+        def infer(frame_index, frame):
+            return stride_tracker.push(frame_index, None, source=self._inference_frame(frame, geometry))
+
+        def encode(item):
+            detections.append(item[2])
+            self.progress.update(stage, len(detections), stop - start)
+
+        try:
+            VideoPipeline(reader, infer, encode, queue_size=self.queue_size, finish=stride_tracker.flush).run()
+        finally:
+            reader.release()
+        return detections
+
+    def _render_segment(self, video_path, start, stop, detections, segment_path, stage):
+        """
+        Dibujar las detecciones ya calculadas sobre los frames [start, stop) y guardarlos en `segment_path`.
+
+        Returns:
+            int: Frames escritos.
+        """
+        reader = FrameRange(video_path, start, stop)
+        geometry = self._frame_geometry(int(reader.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                                        int(reader.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        fps = reader.cap.get(cv2.CAP_PROP_FPS) or 30.0  # Los FPS del video original (30 si no los declara)
+        out = cv2.VideoWriter(segment_path, cv2.VideoWriter_fourcc(*'XVID'), fps, geometry.output_size)
+        names = self.model.names
+        state = {'frames': 0}
+
+        def infer(frame_index, frame):
+            return [(frame_index, self._output_frame(frame, geometry))]
+
+        def encode(item):
+            frame_index, frame = item
+            frame = np.ascontiguousarray(frame)
+            if frame_index < len(detections):
+                draw_detections(frame, detections[frame_index], names)
+            out.write(frame)
+            state['frames'] += 1
+            self.progress.update(stage, state['frames'], stop - start)
+
+        try:
+            VideoPipeline(reader, infer, encode, queue_size=self.queue_size).run()
+        finally:
+            reader.release()
+            out.release()
+        return state['frames']
+
+    @staticmethod
+    def _concat_segments(segment_paths, output_file, fps):
+        """Unir los tramos con ffmpeg sin recodificar o, si no se puede, recodificándolos con OpenCV a `fps`."""
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg:
+            list_path = os.path.join(os.path.dirname(segment_paths[0]), 'segments.txt')
+            with open(list_path, 'w', encoding='utf-8') as f:
+                for path in segment_paths:
+                    escaped = path.replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+            try:
+                subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                                '-i', list_path, '-c', 'copy', output_file], check=True)
+                return
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"ffmpeg concat failed ({e}), re-encoding the segments with OpenCV...")
+
+        out = None
+        try:
+            for path in segment_paths:
+                cap = cv2.VideoCapture(path)
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    if out is None:
+                        out = cv2.VideoWriter(output_file, cv2.VideoWriter_fourcc(*'XVID'), fps or 30.0,
+                                              (frame.shape[1], frame.shape[0]))
+                    out.write(frame)
+                cap.release()
+        finally:
+            if out is not None:
+                out.release()
+
+    def _wait_for_workers(self, futures, messages):
+        """Esperar a los procesos entregando su progreso; devuelve sus resultados en orden."""
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            self._replay_worker_messages(messages)
+            if self.root is not None:
+                self.root.update()  # Mantener la interfaz viva mientras trabajan los procesos
+        self._replay_worker_messages(messages)
+        return [future.result() for future in futures]
+
+    def _replay_worker_messages(self, messages):
+        """Entregar a `self.progress` todo el progreso recibido de los procesos."""
+        while True:
+            try:
+                message = messages.get_nowait()
+            except queue.Empty:
+                return
+            replay_progress(message, self.progress)
 
     def _process_video(self, video_path, single_video=False):
         """Procesar el video con el modelo YOLO."""
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
-            messagebox.showerror("Error", "Could not open video file.")
+            self._notify('error', "Error", "Could not open video file.")
             return
 
+        # Cada video empieza con un tracker nuevo
+        self._reset_tracker()
+
         # Obtener dimensiones del video original
         original_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         original_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
 
-        # Redimensionar el tamaño de salida
-        output_width = original_width // self.resize_factor
-        output_height = original_height // self.resize_factor
-
-        output_file = os.path.splitext(video_path)[0] + '_output.avi'
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        out = cv2.VideoWriter(output_file, fourcc, 30.0, (output_width, output_height))
-
-        ret = True
-        while ret:
-            ret, frame = cap.read()
-            if ret:
-                # Detectar con YOLO en cada frame
-                results = self.model.track(frame, conf=self.confidence_threshold, persist=True)
-                frame_ = results[0].plot()
-
-                # Redimensionar si es necesario
-                frame_resized = cv2.resize(frame_, (output_width, output_height))
+        # Región de interés, tamaño de inferencia y tamaño de salida
+        geometry = self._frame_geometry(original_width, original_height)
+        output_width, output_height = geometry.output_size
 
-                # Guardar frame procesado
+        exporter = self._open_exporter(video_path, fps)
+        if self.analysis_only:
+            output_file, out = exporter.output_path, None
+        else:
+            output_file = os.path.splitext(video_path)[0] + '_output.avi'
+            fourcc = cv2.VideoWriter_fourcc(*'XVID')
+            out = cv2.VideoWriter(output_file, fourcc, fps or 30.0, (output_width, output_height))
+
+        stage = os.path.basename(video_path)
+        state = {'frames': 0, 'last_display': 0.0}
+        names = self.model.names
+        timings = instrumentation_for(self.record_timings)
+        stride_tracker = self._stride_tracker(geometry, timings)
+
+        def infer(frame_index, frame):
+            if self.analysis_only:
+                # Solo hace falta el frame del modelo; no se retiene ningún frame para codificar
+                with timings.span(RESIZE):
+                    source = self._inference_frame(frame, geometry)
+                return stride_tracker.push(frame_index, None, source=source)
+            if not geometry.render_output:
+                return stride_tracker.push(frame_index, frame)
+            with timings.span(RESIZE):
+                output_frame = self._output_frame(frame, geometry)
+                source = self._inference_frame(frame, geometry)
+            return stride_tracker.push(frame_index, output_frame, source=source)
+
+        def encode(item):
+            frame_index, frame, detections, result = item
+            if exporter is not None:
+                with timings.span(DISK_WRITE):
+                    exporter.add(frame_index, detections)
+            if self.analysis_only:
+                state['frames'] += 1
+                with timings.span(GUI_UPDATE):
+                    self.progress.update(stage, state['frames'], total_frames)
+                return True
+
+            with timings.span(POSTPROCESS):
+                if geometry.render_output:
+                    polygons = None
+                    if not geometry.interpolating and result is not None and result.masks is not None:
+                        polygons = [polygon * geometry.box_scale[:2] for polygon in result.masks.xy]
+                    frame_resized = draw_detections(np.ascontiguousarray(frame), detections, names,
+                                                    polygons=polygons)
+                else:
+                    # Redimensionar si es necesario
+                    frame_resized = cv2.resize(result.plot(), (output_width, output_height))
+
+            # Guardar frame procesado
+            with timings.span(DISK_WRITE):
                 out.write(frame_resized)
-
-                # Mostrar el frame procesado
+            state['frames'] += 1
+            with timings.span(GUI_UPDATE):
+                self.progress.update(stage, state['frames'], total_frames)
+
+            if not self.display:
+                return True
+
+            # Mostrar el frame procesado sin frenar el pipeline: como mucho display_fps veces por segundo
+            now = time.perf_counter()
+            if now - state['last_display'] < 1.0 / self.display_fps:
+                return True
+            state['last_display'] = now
+            with timings.span(GUI_UPDATE):
                 cv2.imshow('Processed Video', frame_resized)
 
                 # Revisar si se presiona la tecla para parar o saltar el procesamiento
-                key = cv2.waitKey(25)
-                if key == ord('q'):  # Se presiona 'q'
-                    if single_video:
-                        print(f"Tecla 'q' presionada, deteniendo el procesamiento del video actual...")
-                        # Mostrar el path de salida al detener el video actual
-                        self.output_label.config(text=f"Output saved at: {output_file}")
-                        self.root.update()  # Forzar la actualización de la ventana
-                        break  # Si es un solo video, salir del bucle
-                    else:
-                        print(f"Tecla 'q' presionada, pasando al siguiente video...")
-                        # Mostrar el path de salida al detener el video actual
-                        self.output_label.config(text=f"Output saved at: {output_file}")
-                        self.root.update()  # Forzar la actualización de la ventana
-                        self.skip_current_video = True  # En múltiples videos, saltar al siguiente
-                        break
-                elif key == ord('e'):  # Se presiona 'e' para detener todo el procesamiento
-                    print(f"Tecla 'e' presionada, deteniendo todo el procesamiento de múltiples videos...")
-                    self.stop_processing = True  # Detener todos los videos
-                    break
+                key = cv2.waitKey(1)
+            if key == ord('q'):  # Se presiona 'q'
+                if single_video:
+                    print(f"Tecla 'q' presionada, deteniendo el procesamiento del video actual...")
+                else:
+                    print(f"Tecla 'q' presionada, pasando al siguiente video...")
+                    self.skip_current_video = True  # En múltiples videos, saltar al siguiente
+                # Mostrar el path de salida al detener el video actual
+                self._set_output_label(f"Output saved at: {output_file}")
+                return False
+            elif key == ord('e'):  # Se presiona 'e' para detener todo el procesamiento
+                print(f"Tecla 'e' presionada, deteniendo todo el procesamiento de múltiples videos...")
+                self.stop_processing = True  # Detener todos los videos
+                return False
+            return True
+
+        # Decodificación, inferencia y codificación/visualización en paralelo, unidas por colas acotadas
+        pipeline = VideoPipeline(cap, infer, encode, queue_size=self.queue_size,
+                                 finish=stride_tracker.flush, instrumentation=timings)
+        try:
+            stage_stats = pipeline.run()
+        finally:
+            cap.release()
+            if out is not None:
+                out.release()
+            if exporter is not None:
+                exporter.close()
+            if self.display and not self.analysis_only:
+                cv2.destroyAllWindows()
+        info = {'frames': state['frames'], 'output': output_file, 'stages': stage_stats,
+                'detections_run': stride_tracker.detections_run}
+        if exporter is not None:
+            info.update(detections=exporter.output_path, detection_rows=exporter.rows)
+        timings_path = timings.write_summary(os.path.splitext(video_path)[0] + '_timings.json', video=video_path,
+                                             frames=state['frames'], detections_run=stride_tracker.detections_run)
+        if timings_path:
+            info['timings'] = timings_path
+        self.progress.stage_done(stage, **info)
 
-        cap.release()
-        out.release()
-        cv2.destroyAllWindows()
-        
         return output_file  # Retornar la ruta del archivo de salida
 
+_worker_processor = None  # VideoProcessor de cada proceso de process_videos_parallel
+
+
+def _init_video_worker(model_path, options, torch_threads, messages):
+    """Inicializa un proceso de trabajo: límite de hilos y su propio modelo."""
+    global _worker_processor
+    import torch
+
+    torch.set_num_threads(torch_threads)
+    cv2.setNumThreads(torch_threads)
+    _worker_processor = VideoProcessor(model_path, progress=QueueProgress(messages), display=False, **options)
+
+
+def _process_video_in_worker(video_path):
+    """Procesa un video completo en un proceso de trabajo y devuelve la ruta de salida."""
+    return _worker_processor._process_video(video_path)
+
+
+def _track_segment_in_worker(video_path, start, stop, stage):
+    """Sigue un tramo de un video en un proceso de trabajo (ver VideoProcessor.process_video_segments)."""
+    return _worker_processor._track_segment(video_path, start, stop, stage)
+
+
+def _render_segment_in_worker(video_path, start, stop, detections, segment_path, stage):
+    """Dibuja y codifica un tramo de un video en un proceso de trabajo."""
+    return _worker_processor._render_segment(video_path, start, stop, detections, segment_path, stage)
+
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = VideoProcessorApp(root)
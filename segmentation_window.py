@@ -1,5 +1,8 @@
 import os
 import sys
+import shutil
+import tempfile
+from collections import deque
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from tkinter.scrolledtext import ScrolledText
@@ -8,34 +11,100 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 
 # Importar módulos personalizados
+from SegmentationEngine import SegmentationEngine
+from ProgressSink import BusProgress
+from Instrumentation import Instrumentation
+from EventBus import EventBus, ProgressEvent, PreviewEvent, LogEvent, StageDoneEvent, ErrorEvent
+from PreviewSurface import PreviewSurface
 from YOLOv8ObjectDetector import YOLOv8ObjectDetector
 from ImageProcessor import ImageProcessor
 from YOLOv8BBOX import YOLOv8BBOX
 from MergeDF import MergeDF
 
 
-class ConsoleRedirector:
-    def __init__(self, text_widget):
+class ConsoleLogSink:
+    """
+    Destino de la consola (stdout/stderr) con memoria acotada.
+
+    `write` solo guarda el texto, así que puede llamarse desde cualquier hilo
+    sin tocar Tk. Las líneas completas esperan en un buffer circular de
+    `max_lines` y el bucle principal de Tk las vuelca al widget en bloque cada
+    `flush_interval_ms`; el widget tampoco pasa de `max_lines` líneas. El log
+    completo se escribe en un archivo temporal, desde el que se exporta.
+    """
+
+    def __init__(self, master, text_widget, max_lines=2000, flush_interval_ms=200):
+        self.master = master
         self.text_widget = text_widget
-        self.console_output = ""
+        self.max_lines = max_lines
+        self.flush_interval_ms = flush_interval_ms
+        self.lock = threading.Lock()
+        self.pending = deque(maxlen=max_lines)  # Buffer circular de líneas aún no mostradas
+        self.partial = ""  # Línea en curso, sin salto de línea todavía
+        self.omitted = 0  # Líneas que no llegaron a mostrarse por superar el límite
+        self.spill = tempfile.NamedTemporaryFile(mode='w+', encoding='utf-8', prefix='console_',
+                                                 suffix='.log', delete=False)
+        self.after_id = self.master.after(self.flush_interval_ms, self._flush_to_widget)
 
     def write(self, message):
-        self.console_output += message
-        self.text_widget.insert(tk.END, message)
-        self.text_widget.see(tk.END)
-        self.text_widget.update_idletasks()
+        with self.lock:
+            self.spill.write(message)
+            lines = (self.partial + message).split("\n")
+            self.partial = lines.pop()
+            overflow = len(self.pending) + len(lines) - self.max_lines
+            if overflow > 0:
+                self.omitted += overflow
+            self.pending.extend(lines)
 
     def flush(self):
-        pass
+        with self.lock:
+            self.spill.flush()
+
+    def _flush_to_widget(self):
+        with self.lock:
+            lines = list(self.pending)
+            self.pending.clear()
+            omitted, self.omitted = self.omitted, 0
+
+        if lines:
+            if omitted:
+                self.text_widget.insert(tk.END, f"... {omitted} lines omitted (see exported log) ...\n")
+            self.text_widget.insert(tk.END, "\n".join(lines) + "\n")
+
+            # Recortar el widget a las últimas max_lines líneas
+            line_count = int(self.text_widget.index('end-1c').split('.')[0])
+            if line_count > self.max_lines:
+                self.text_widget.delete('1.0', f"{line_count - self.max_lines + 1}.0")
+            self.text_widget.see(tk.END)
+
+        self.after_id = self.master.after(self.flush_interval_ms, self._flush_to_widget)
+
+    def clear(self):
+        """Vaciar el widget y las líneas pendientes (el log exportable se conserva)."""
+        with self.lock:
+            self.pending.clear()
+            self.omitted = 0
+        self.text_widget.delete(1.0, tk.END)
 
     def export_to_txt(self, output_path):
         """Guardar la consola en un archivo de texto."""
-        with open(output_path, 'w') as f:
-            f.write(self.console_output)
+        with self.lock:
+            self.spill.flush()
+            with open(self.spill.name, 'r', encoding='utf-8') as src, open(output_path, 'w', encoding='utf-8') as dst:
+                shutil.copyfileobj(src, dst)
+
+    def close(self):
+        """Detener el volcado periódico y borrar el archivo temporal."""
+        if self.after_id is not None:
+            self.master.after_cancel(self.after_id)
+            self.after_id = None
+        with self.lock:
+            self.spill.close()
+            os.remove(self.spill.name)
 
 
 class SegmentationWindow:
-    def __init__(self, master):
+    def __init__(self, master, batch_size=1):
         self.master = master
         self.master.minsize(width=1000, height=600)
         self.master.maxsize(width=1000, height=600)
@@ -54,15 +123,32 @@ class SegmentationWindow:
         self.fig = Figure(figsize=(5, 4), dpi=100)
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.master)
         self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        # Vista previa con un único artista, redibujada desde el bucle de Tk como mucho a preview_fps
+        self.preview_fps = 5
+        self.preview = PreviewSurface(self.master, self.fig, self.canvas, max_fps=self.preview_fps)
 
         # Redireccionar salida de consola a Tkinter
         self.redirect_console_to_tkinter()
 
+        # Canal de eventos: el hilo de trabajo nunca toca los widgets, la interfaz lo vacía con after()
+        self.events = EventBus()
+        self.events.attach(self.master, {
+            ProgressEvent: self.on_progress_event,
+            PreviewEvent: lambda event: self.preview.submit(event.image),
+            LogEvent: lambda event: print(event.message),
+            StageDoneEvent: self.on_stage_done_event,
+            ErrorEvent: self.on_error_event,
+        })
+
         # Variables para rutas de archivo
         self.model_path = None
         self.input_folder = None
         self.output_folder = None
 
+        # Imágenes por llamada a predict; 'auto' mide varios tamaños y usa el más rápido
+        # (ver SegmentationEngine.choose_batch_size)
+        self.batch_size = batch_size
+
         # Variable para el hilo de ejecución
         self.process_thread = None
         self.stop_thread = False  # Variable para detener el hilo
@@ -74,16 +160,27 @@ class SegmentationWindow:
         self.master.after(100, self.start_process)
 
     def redirect_console_to_tkinter(self):
-        self.console_redirector = ConsoleRedirector(self.console_text)
-        sys.stdout = self.console_redirector
-        sys.stderr = self.console_redirector
+        self.console_log = ConsoleLogSink(self.master, self.console_text)
+        sys.stdout = self.console_log
+        sys.stderr = self.console_log
+
+    def close_window(self):
+        """Liberar la vista previa, los eventos y la consola y cerrar la ventana."""
+        self.events.detach()
+        self.preview.close()
+        if sys.stdout is self.console_log:
+            sys.stdout = sys.__stdout__
+        if sys.stderr is self.console_log:
+            sys.stderr = sys.__stderr__
+        self.console_log.close()
+        self.master.destroy()
 
     def on_close(self):
         """Función que se llama cuando el usuario cierra la ventana."""
         if self.process_thread and self.process_thread.is_alive():
             messagebox.showwarning("Proceso activo", "El proceso está en ejecución. Espera a que termine antes de cerrar.")
         else:
-            self.master.destroy()
+            self.close_window()
 
     def common_file_input(self):
         """Método para seleccionar archivos y carpetas."""
@@ -102,62 +199,53 @@ class SegmentationWindow:
         return self.model_path, self.input_folder, self.output_folder
 
     def display_image_on_canvas(self, img):
-        """Función para mostrar una imagen en el canvas de matplotlib."""
-        self.fig.clear()
-        new_ax = self.fig.add_subplot(111)
-        new_ax.imshow(img)
-        self.canvas.draw()
-
-    def run_all_functions(self):
-        """Función que ejecuta todas las tareas en secuencia."""
-        model_path, input_folder, output_folder = self.common_file_input()
-        if model_path is None:
+        """Función para mostrar una imagen en el canvas de matplotlib (segura desde el hilo de trabajo)."""
+        self.preview.submit(img)
+
+    def run_all_functions(self, model_path, input_folder, output_folder):
+        """Función que ejecuta todas las tareas en secuencia (en el hilo de trabajo)."""
+        try:
+            # Detección, máscaras y cajas delimitadoras en una sola pasada del modelo
+            if not self.stop_thread:
+                # Los tiempos por tramo quedan en timings.json, junto a las salidas
+                auto_batch = self.batch_size == 'auto'
+                engine = SegmentationEngine(model_path, input_folder, BusProgress(self.events),
+                                            batch_size=1 if auto_batch else self.batch_size,
+                                            output_folder=output_folder, instrumentation=Instrumentation())
+                if auto_batch:
+                    engine.choose_batch_size()
+                detector = YOLOv8ObjectDetector(model_path, input_folder, output_folder)
+                image_processor = ImageProcessor(model_path, input_folder, output_folder)
+                bbox_predictor = YOLOv8BBOX(model_path, input_folder, output_folder)
+                engine.run([detector, image_processor, bbox_predictor])
+                self.events.publish(LogEvent("Predictions, masks and bounding boxes completed."))
+
+            # Fusionar archivos CSV
+            if not self.stop_thread:
+                bbox_csv_filename = 'all_bbox_data.csv'
+                masks_csv_filename = 'all_contour_areas.csv'
+                bbox_csv_path = os.path.join(output_folder, bbox_csv_filename)
+                masks_csv_path = os.path.join(output_folder, masks_csv_filename)
+                output_csv_path = os.path.join(output_folder, 'merged_dataframe.csv')
+
+                merger = MergeDF(bbox_csv_path, masks_csv_path, output_csv_path)
+                merger.merge_csv_files()
+                self.events.publish(LogEvent("CSV files merged successfully."))
+        except Exception as e:
+            self.events.publish(ErrorEvent('all', str(e)))
             return
 
-        total_steps = 4  # Progreso dividido en 4 pasos
-        current_step = 0
-
-        # Detección de objetos
-        if not self.stop_thread:
-            detector = YOLOv8ObjectDetector(model_path, input_folder, output_folder, self)
-            detector.predict_and_save(input_folder)
-            print("Predictions completed.", flush=True)
-            current_step += 1
-            self.progress_var.set((current_step / total_steps) * 100)
-            self.master.update_idletasks()
-
-        # Procesar imágenes para máscaras
-        if not self.stop_thread:
-            image_processor = ImageProcessor(model_path, input_folder, output_folder, self)
-            image_processor.process_images()
-            print("Masks processing completed.", flush=True)
-            current_step += 1
-            self.progress_var.set((current_step / total_steps) * 100)
-            self.master.update_idletasks()
-
-        # Detección de cajas delimitadoras
-        if not self.stop_thread:
-            bbox_predictor = YOLOv8BBOX(model_path, input_folder, output_folder, self)
-            bbox_predictor.predict_and_save_bbox(input_folder)
-            print("Bounding box predictions completed.", flush=True)
-            current_step += 1
-            self.progress_var.set((current_step / total_steps) * 100)
-            self.master.update_idletasks()
-
-        # Fusionar archivos CSV
-        if not self.stop_thread:
-            bbox_csv_filename = 'all_bbox_data.csv'
-            masks_csv_filename = 'all_contour_areas.csv'
-            bbox_csv_path = os.path.join(output_folder, bbox_csv_filename)
-            masks_csv_path = os.path.join(output_folder, masks_csv_filename)
-            output_csv_path = os.path.join(output_folder, 'merged_dataframe.csv')
-            
-            merger = MergeDF(bbox_csv_path, masks_csv_path, output_csv_path)
-            merged_df = merger.merge_csv_files()
-            print("CSV files merged successfully.", flush=True)
-            current_step += 1
-            self.progress_var.set((current_step / total_steps) * 100)
-            self.master.update_idletasks()
+        self.events.publish(StageDoneEvent('all', {}))
+
+    def on_progress_event(self, event):
+        """Actualizar la barra de progreso (hilo de Tk)."""
+        if event.total:
+            self.progress_var.set(event.done / event.total * 100)
+
+    def on_stage_done_event(self, event):
+        """Al terminar todo el proceso, avisar y preguntar por el log y el reinicio (hilo de Tk)."""
+        if event.stage != 'all':
+            return
 
         messagebox.showinfo("Finished", "All functions completed!")
 
@@ -167,13 +255,18 @@ class SegmentationWindow:
         # Preguntar si se desea reiniciar
         self.ask_restart()
 
+    def on_error_event(self, event):
+        """Mostrar el error del hilo de trabajo y ofrecer reiniciar (hilo de Tk)."""
+        messagebox.showerror("Error", f"The process failed: {event.message}")
+        self.ask_restart()
+
     def ask_export_log(self):
         """Preguntar si el usuario quiere exportar la consola a un archivo .txt."""
         save_log = messagebox.askyesno("Export Log", "¿Deseas exportar la salida de la consola a un archivo .txt?")
         if save_log:
             file_path = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text files", "*.txt")])
             if file_path:
-                self.console_redirector.export_to_txt(file_path)
+                self.console_log.export_to_txt(file_path)
                 messagebox.showinfo("Guardado", "La salida ha sido guardada exitosamente.")
 
     def ask_restart(self):
@@ -181,26 +274,32 @@ class SegmentationWindow:
         restart = messagebox.askyesno("Reiniciar", "¿Deseas reiniciar el proceso?")
         if restart:
             # Resetear la consola y las rutas
-            self.console_text.delete(1.0, tk.END)
+            self.console_log.clear()
             self.model_path = None
             self.input_folder = None
             self.output_folder = None
             
             #Limpiar el canvas
-            self.fig.clear()  # Limpia la figura actual
-            self.canvas.draw()  # Redibuja el canvas vacío
+            self.preview.clear()
             self.start_process()  # Reiniciar el proceso completo
         else:
-            self.master.destroy()
+            self.close_window()
 
     def run_all_functions_threaded(self):
-        """Iniciar `run_all_functions` en un hilo separado."""
+        """Pedir las rutas en el hilo de Tk e iniciar `run_all_functions` en un hilo separado."""
         if self.process_thread and self.process_thread.is_alive():
             messagebox.showinfo("Proceso en curso", "El proceso ya está en ejecución.")
-        else:
-            self.stop_thread = False  # Reiniciar el indicador de detención
-            self.process_thread = threading.Thread(target=self.run_all_functions)
-            self.process_thread.start()
+            return
+
+        model_path, input_folder, output_folder = self.common_file_input()
+        if model_path is None:
+            return
+
+        self.stop_thread = False  # Reiniciar el indicador de detención
+        self.progress_var.set(0)
+        self.process_thread = threading.Thread(target=self.run_all_functions,
+                                               args=(model_path, input_folder, output_folder))
+        self.process_thread.start()
 
     def start_process(self):
         """Iniciar el proceso de selección de archivos y ejecución en un hilo."""